@@ -123,6 +123,36 @@ else:
         }
     }
 
+# Caché
+# LocMem es por proceso: con varios workers conviene un backend compartido
+# (p. ej. DJANGO_CACHE_BACKEND=django.core.cache.backends.redis.RedisCache).
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('DJANGO_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('DJANGO_CACHE_LOCATION', 'orbat-default'),
+    }
+}
+# Segundos que vive el árbol ORBAT cacheado (acota la obsolescencia entre procesos)
+ORBAT_CACHE_TIMEOUT = int(os.getenv('ORBAT_CACHE_TIMEOUT', '300'))
+# Segundos que vive cada fragmento HTML por unidad (claves por contenido, no se invalidan)
+ORBAT_FRAGMENT_TIMEOUT = int(os.getenv('ORBAT_FRAGMENT_TIMEOUT', '3600'))
+# ORBAT colapsado por defecto: sólo regimientos y compañías, el resto bajo demanda
+ORBAT_COLLAPSED_DEFAULT = os.getenv('ORBAT_COLLAPSED_DEFAULT', 'False').lower() in ('1', 'true', 'yes')
+# Traslados individuales: 'optimista' (UPDATEs condicionados a version) o 'bloqueo' (select_for_update)
+ORBAT_TRANSFER_MODE = os.getenv('ORBAT_TRANSFER_MODE', 'optimista')
+# Segundos que se guardan las respuestas de peticiones con Idempotency-Key
+ORBAT_IDEMPOTENCY_TTL = int(os.getenv('ORBAT_IDEMPOTENCY_TTL', '86400'))
+# Segundos tras los que una petición con Idempotency-Key sin completar se da por abandonada
+ORBAT_IDEMPOTENCY_LEASE = int(os.getenv('ORBAT_IDEMPOTENCY_LEASE', '60'))
+# Listados (Personal, auditoría, usuarios) con conteo aproximado desde este tamaño de tabla
+ORBAT_APPROX_COUNT_THRESHOLD = int(os.getenv('ORBAT_APPROX_COUNT_THRESHOLD', '10000'))
+# Segundos que se reutiliza un conteo exacto cacheado (motores sin estimación, ej. SQLite)
+ORBAT_APPROX_COUNT_TTL = int(os.getenv('ORBAT_APPROX_COUNT_TTL', '60'))
+# Segundos que se reutiliza el tamaño de tabla que decide si el conteo es aproximado
+ORBAT_TABLE_SIZE_TTL = int(os.getenv('ORBAT_TABLE_SIZE_TTL', '3600'))
+# Vistas async del ORBAT, tablero, auditoría y traslados (servir con ASGI, ver README)
+ORBAT_ASYNC_VIEWS = os.getenv('ORBAT_ASYNC_VIEWS', 'False').lower() in ('1', 'true', 'yes')
+
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
     {'NAME': 'django.contrib.auth.password_validation.MinimumLengthValidator'},
@@ -223,7 +253,7 @@ JAZZMIN_SETTINGS = {
     "site_brand": "OPS CENTER",
     "welcome_sign": "Sistema de Gestión Clasificado",
     "copyright": "LatamSquad Engineering",
-    "search_model": "orbat.Miembro",
+    "search_model": ["orbat.Miembro", "orbat.Escuadra"],
     "user_avatar": None,
     
     "changeform_format": "single", 
@@ -1,8 +1,20 @@
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path
 from django.shortcuts import redirect
-from orbat.views import orbat_visual, transferir_personal, escuadras_dashboard
+from orbat.views import orbat_visual, orbat_subarbol, orbat_cache_status, transferir_personal, transferir_personal_lote, escuadras_dashboard
+from orbat.api_views import orbat_api, orbat_busqueda_api, orbat_strength_api
 from orbat.audit_views import audit_log_list, audit_log_detail
+
+if settings.ORBAT_ASYNC_VIEWS:
+    # Mismas URLs y nombres, vistas async (ver orbat/async_views.py)
+    from orbat.async_views import (  # noqa: F811
+        audit_log_list,
+        escuadras_dashboard,
+        orbat_visual,
+        transferir_personal,
+        transferir_personal_lote,
+    )
 from orbat.user_management_views import (
     user_list,
     user_create,
@@ -26,8 +38,14 @@ urlpatterns = [
     path('admin/usuarios/<int:user_id>/toggle-activo/', user_toggle_active, name='user_management_toggle_active'),
     # Ruta legacy redirige a la nueva (requiere staff)
     path('admin/user-tools/', lambda request: redirect('/admin/usuarios/') if request.user.is_authenticated and request.user.is_staff else redirect('/admin/login/?next=/admin/usuarios/'), name='admin_user_tools'),
+    path('admin/orbat-cache/', orbat_cache_status, name='orbat_cache_status'),
     path('admin/', admin.site.urls),
     path('orbat/', orbat_visual, name='orbat_visual'),
     path('orbat/board/', escuadras_dashboard, name='escuadras_dashboard'),
+    path('orbat/subarbol/<str:nivel>/<int:pk>/', orbat_subarbol, name='orbat_subarbol'),
+    path('api/orbat/', orbat_api, name='orbat_api'),
+    path('api/orbat/strength/', orbat_strength_api, name='orbat_strength_api'),
+    path('api/orbat/busqueda/', orbat_busqueda_api, name='orbat_busqueda_api'),
     path('api/transferir_personal/', transferir_personal, name='transferir_personal'),
+    path('api/transferir_personal/batch/', transferir_personal_lote, name='transferir_personal_lote'),
 ]
\ No newline at end of file
@@ -1,14 +1,22 @@
-from django.contrib import admin
+from django import forms
+from django.contrib import admin, messages
+from django.contrib.admin.helpers import ACTION_CHECKBOX_NAME
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import Group
 from django.contrib.auth.admin import UserAdmin as DefaultUserAdmin
 from django.contrib.auth.admin import GroupAdmin as DefaultGroupAdmin
-from django.contrib.admin.views.main import ChangeList
+from django.contrib.admin.views.main import ORDER_VAR, ChangeList
 from django.utils.html import format_html
-from django.http import HttpResponse
-import csv
+from django.template.response import TemplateResponse
+from django.db import transaction
 from django.db.models import Case, Count, IntegerField, Value, When
-from .models import Regimiento, Compania, Peloton, Escuadra, Miembro, Curso
+from .cache import bump_orbat_version, get_opciones_escuadras, get_strength_report
+from .strength import clave_unidad, efectivos_de
+from .busqueda import buscar
+from .exportacion import exportar_miembros
+from .paginacion import ConteoAproximadoAdminMixin
+from .transfers import reasignar
+from .models import NIVELES, Regimiento, Compania, Peloton, Escuadra, Miembro, Curso, MovimientoPersonal, EscuadraLlena
 
 User = get_user_model()
 
@@ -52,46 +60,58 @@ class PelotonInline(admin.TabularInline):
 
 # Paneles principales
 
+class EfectivosReporteMixin:
+    """Columnas del reporte de efectivos: una consulta agrupada (cacheada)
+    para toda la página, no una por fila."""
+
+    def efectivos_inactivos(self, obj):
+        return efectivos_de(get_strength_report(), clave_unidad(obj))['inactivos']
+    efectivos_inactivos.short_description = 'Inactivos'
+
+    def desglose_rangos(self, obj):
+        por_rango = efectivos_de(get_strength_report(), clave_unidad(obj))['por_rango']
+        return ' · '.join(f"{n['activos']} {rango}" for rango, n in por_rango.items() if n['activos']) or '-'
+    desglose_rangos.short_description = 'Activos por rango'
+
+
+class BusquedaChangeList(ChangeList):
+    """Con una búsqueda y sin orden elegido por columna, conserva el orden por
+    relevancia de `buscar` (Django lo dejaría detrás del `ordering` del admin)."""
+
+    def get_ordering(self, request, queryset):
+        if self.query and ORDER_VAR not in self.params:
+            return self._get_deterministic_ordering(list(queryset.query.order_by))
+        return super().get_ordering(request, queryset)
+
+
+class BusquedaIndexadaMixin:
+    """Búsqueda del changelist y de los autocompletar con `busqueda.buscar`
+    (índices de trigramas / FTS5) en lugar de icontains sobre search_fields."""
+
+    def get_search_results(self, request, queryset, search_term):
+        return buscar(queryset, search_term), False
+
+    def get_changelist(self, request, **kwargs):
+        return BusquedaChangeList
+
+
 @admin.register(Regimiento)
-class RegimientoAdmin(admin.ModelAdmin):
+class RegimientoAdmin(BusquedaIndexadaMixin, EfectivosReporteMixin, admin.ModelAdmin):
     # Miembros asignados directamente al regimiento
     inlines = [MiembroInline]
-    list_display = ('nombre', 'comandante', 'total_efectivos')
+    # Los efectivos son contadores mantenidos en la propia fila (sin agregaciones)
+    list_display = ('nombre', 'comandante', 'efectivos_activos', 'efectivos_inactivos', 'efectivos_total', 'desglose_rangos')
     search_fields = ('nombre', 'comandante')
     list_per_page = 20
     ordering = ('nombre',)
     list_display_links = ('nombre',)
     save_on_top = True
 
-    def get_queryset(self, request):
-        qs = super().get_queryset(request)
-        # Totales para mostrar en listado sin consultas por fila
-        qs = qs.annotate(
-            efectivos_hq=Count('miembro', distinct=True),
-            efectivos_cia=Count('companias__miembro', distinct=True),
-            efectivos_plt=Count('companias__pelotones__miembro', distinct=True),
-            efectivos_sqd=Count('companias__pelotones__escuadras__miembro', distinct=True),
-        )
-        return qs
-
-    def total_efectivos(self, obj):
-        # Miembros de HQ reg + HQ compañía + HQ pelotón + escuadra
-        try:
-            return (
-                (getattr(obj, 'efectivos_hq', 0) or 0)
-                + (getattr(obj, 'efectivos_cia', 0) or 0)
-                + (getattr(obj, 'efectivos_plt', 0) or 0)
-                + (getattr(obj, 'efectivos_sqd', 0) or 0)
-            )
-        except Exception:
-            return obj.total_efectivos()
-    total_efectivos.short_description = 'Efectivos'
-
 @admin.register(Compania)
-class CompaniaAdmin(admin.ModelAdmin):
+class CompaniaAdmin(BusquedaIndexadaMixin, EfectivosReporteMixin, admin.ModelAdmin):
     # Pelotones y miembros de HQ de compañía
     inlines = [PelotonInline, MiembroInline]
-    list_display = ('nombre', 'regimiento', 'logo_preview')
+    list_display = ('nombre', 'regimiento', 'efectivos_activos', 'efectivos_inactivos', 'efectivos_total', 'desglose_rangos', 'logo_preview')
     list_filter = ('regimiento',)
     list_display_links = ('nombre',)
     save_on_top = True
@@ -105,10 +125,10 @@ class CompaniaAdmin(admin.ModelAdmin):
     logo_preview.short_description = 'Logo'
 
 @admin.register(Peloton)
-class PelotonAdmin(admin.ModelAdmin):
+class PelotonAdmin(BusquedaIndexadaMixin, EfectivosReporteMixin, admin.ModelAdmin):
     # Escuadras y miembros de HQ de pelotón
     inlines = [EscuadraInline, MiembroInline]
-    list_display = ('nombre', 'compania', 'num_escuadras')
+    list_display = ('nombre', 'compania', 'num_escuadras', 'efectivos_activos', 'efectivos_inactivos', 'efectivos_total', 'desglose_rangos')
     list_filter = ('compania',)
     list_display_links = ('nombre',)
     save_on_top = True
@@ -124,29 +144,50 @@ class PelotonAdmin(admin.ModelAdmin):
     num_escuadras.short_description = 'Escuadras'
 
 @admin.register(Escuadra)
-class EscuadraAdmin(admin.ModelAdmin):
+class EscuadraAdmin(BusquedaIndexadaMixin, EfectivosReporteMixin, admin.ModelAdmin):
     # Miembros de la escuadra
     inlines = [MiembroInline]
-    list_display = ('nombre', 'peloton', 'indicativo_radio', 'get_efectivos')
+    list_display = ('nombre', 'peloton', 'indicativo_radio', 'capacidad', 'efectivos_activos', 'efectivos_inactivos', 'efectivos_total', 'desglose_rangos')
     list_filter = ('peloton',)
     list_display_links = ('nombre',)
     save_on_top = True
     search_fields = ('nombre', 'peloton__nombre')
     autocomplete_fields = ('peloton',)
 
-    def get_queryset(self, request):
-        qs = super().get_queryset(request)
-        return qs.annotate(_efectivos=Count('miembro'))
+class EscuadraListFilter(admin.RelatedFieldListFilter):
+    """Filtro por escuadra: opciones desde `etiqueta`, cacheadas por versión ORBAT."""
+
+    def field_choices(self, field, request, model_admin):
+        return get_opciones_escuadras()
+
+class ReasignarForm(forms.Form):
+    """Unidad destino de la acción "Reasignar a una unidad" ('R1', 'C3'... como en strength.py)."""
+    unidad = forms.ChoiceField(label='Unidad destino', widget=forms.Select(attrs={'class': 'form-control'}))
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['unidad'].choices = [
+            ('Plana mayor de regimiento', [(f"R{pk}", nombre) for pk, nombre in Regimiento.objects.values_list('pk', 'nombre')]),
+            ('HQ de compañía', [(f"C{pk}", f"Cía. {nombre}") for pk, nombre in Compania.objects.values_list('pk', 'nombre')]),
+            ('HQ de pelotón', [(f"P{pk}", etiqueta) for pk, etiqueta in Peloton.objects.values_list('pk', 'etiqueta')]),
+            ('Escuadra', [(f"E{pk}", etiqueta) for pk, etiqueta in get_opciones_escuadras()]),
+        ]
+
+    def clean_unidad(self):
+        valor = self.cleaned_data['unidad']
+        unidad = NIVELES[valor[0]].objects.filter(pk=int(valor[1:])).first()
+        if unidad is None:
+            raise forms.ValidationError('La unidad ya no existe.')
+        return unidad
 
-    def get_efectivos(self, obj):
-        return getattr(obj, '_efectivos', obj.miembro_set.count())
-    get_efectivos.short_description = "Efectivos"
 
 @admin.register(Miembro)
-class MiembroAdmin(admin.ModelAdmin):
-    list_display = ('rango', 'nombre_milsim', 'rol', 'get_unidad', 'activo', 'usuario_link')
-    list_filter = ('activo', 'rango', 'escuadra')
+class MiembroAdmin(BusquedaIndexadaMixin, ConteoAproximadoAdminMixin, admin.ModelAdmin):
+    list_display = ('get_rango', 'nombre_milsim', 'rol', 'get_unidad', 'activo', 'usuario_link')
+    list_filter = ('activo', 'rango', ('escuadra', EscuadraListFilter))
     list_editable = ('activo', 'rol')
+    # Lo que leen get_unidad y usuario_link: cantidad de consultas fija por página
+    list_select_related = ('usuario', 'compania', 'peloton', 'escuadra')
     list_display_links = ('nombre_milsim',)
     save_on_top = True
     list_per_page = 50
@@ -170,56 +211,70 @@ class MiembroAdmin(admin.ModelAdmin):
     readonly_fields = ('fecha_ingreso',)
     autocomplete_fields = ('regimiento', 'compania', 'peloton', 'escuadra', 'cursos')
 
+    def get_rango(self, obj):
+        return obj.get_rango_display()
+    get_rango.short_description = 'Rango'
+    # Ordenar la columna por antigüedad real, no por el código como texto
+    get_rango.admin_order_field = 'antiguedad'
+
     def export_members_csv(self, request, queryset):
-        """Exporta los miembros seleccionados como CSV"""
-        field_names = ['rango', 'nombre_milsim', 'rol', 'usuario', 'regimiento', 'compania', 'peloton', 'escuadra', 'activo']
-
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = 'attachment; filename=miembros.csv'
-
-        writer = csv.writer(response)
-        writer.writerow(field_names)
-        for obj in queryset.select_related('usuario', 'regimiento', 'compania', 'peloton', 'escuadra'):
-            writer.writerow([
-                obj.rango,
-                obj.nombre_milsim,
-                obj.rol,
-                obj.usuario.username if obj.usuario else '',
-                obj.regimiento.nombre if obj.regimiento else '',
-                obj.compania.nombre if obj.compania else '',
-                obj.peloton.nombre if obj.peloton else '',
-                obj.escuadra.nombre if obj.escuadra else '',
-                obj.activo,
-            ])
-        return response
+        """Exporta los miembros seleccionados como CSV (en streaming, ver exportacion.py)"""
+        return exportar_miembros(queryset)
     export_members_csv.short_description = 'Exportar miembros seleccionados a CSV'
 
-    actions = ('marcar_activo', 'marcar_inactivo', 'export_members_csv')
+    actions = ('marcar_activo', 'marcar_inactivo', 'export_members_csv', 'reasignar_unidad')
 
     def marcar_activo(self, request, queryset):
-        updated = queryset.update(activo=True)
+        updated = queryset.set_activo(True)
+        # update() no emite señales: invalidar la caché del ORBAT a mano
+        transaction.on_commit(bump_orbat_version)
         self.message_user(request, f"{updated} miembros activados.")
     marcar_activo.short_description = 'Marcar seleccionados como activos'
 
     def marcar_inactivo(self, request, queryset):
-        updated = queryset.update(activo=False)
+        updated = queryset.set_activo(False)
+        transaction.on_commit(bump_orbat_version)
         self.message_user(request, f"{updated} miembros desactivados.")
     marcar_inactivo.short_description = 'Marcar seleccionados como inactivos'
 
+    def reasignar_unidad(self, request, queryset):
+        """Pide la unidad destino y mueve a todos con `transfers.reasignar`."""
+        form = ReasignarForm(request.POST if 'aplicar' in request.POST else None)
+        if form.is_valid():
+            unidad = form.cleaned_data['unidad']
+            try:
+                movidos = reasignar(queryset, unidad, actor=request.user)
+            except EscuadraLlena:
+                self.message_user(request, f"{unidad} no tiene plazas para todos los seleccionados.", messages.ERROR)
+            else:
+                self.message_user(request, f"{movidos} miembros reasignados a {unidad}.")
+            return None
+        return TemplateResponse(request, 'admin/orbat/miembro/reasignar.html', {
+            **self.admin_site.each_context(request),
+            'title': 'Reasignar miembros',
+            'opts': self.model._meta,
+            'form': form,
+            'cantidad': queryset.count(),
+            'seleccionados': request.POST.getlist(ACTION_CHECKBOX_NAME),
+            'select_across': request.POST.get('select_across', '0'),
+            'action_checkbox_name': ACTION_CHECKBOX_NAME,
+        })
+    reasignar_unidad.short_description = 'Reasignar seleccionados a una unidad'
+
     def get_unidad(self, obj):
-        if obj.escuadra:
-            return obj.escuadra.nombre
-        if obj.peloton:
-            return f"HQ {obj.peloton.nombre}"
-        if obj.compania:
+        if obj.escuadra_id:
+            return obj.escuadra.etiqueta
+        if obj.peloton_id:
+            return f"HQ {obj.peloton.etiqueta}"
+        if obj.compania_id:
             return f"HQ {obj.compania.nombre}"
-        if obj.regimiento:
+        if obj.regimiento_id:
             return "Plana Mayor Regimiento"
         return "-"
     get_unidad.short_description = "Unidad"
 
     def usuario_link(self, obj):
-        if obj.usuario:
+        if obj.usuario_id:
             return obj.usuario.username
         return '-'
     usuario_link.short_description = 'Usuario'
@@ -233,6 +288,24 @@ class CursoAdmin(admin.ModelAdmin):
     list_display = ('sigla', 'nombre')
     search_fields = ('sigla', 'nombre')
 
+@admin.register(MovimientoPersonal)
+class MovimientoPersonalAdmin(admin.ModelAdmin):
+    # Historial de traslados: solo lectura
+    list_display = ('fecha', 'miembro', 'ruta_origen', 'ruta_destino', 'tipo', 'actor')
+    list_filter = ('tipo',)
+    list_select_related = ('miembro', 'actor')
+    date_hierarchy = 'fecha'
+    search_fields = ('miembro__nombre_milsim',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
 # Vincula el perfil Miembro en el admin de User
 class MiembroUserInline(admin.StackedInline):
     model = Miembro
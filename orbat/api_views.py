@@ -0,0 +1,223 @@
+"""
+API JSON de solo lectura sobre el ORBAT.
+
+Se sirve desde el árbol cacheado (ver cache.py) y lleva un ETag fuerte
+derivado de la versión ORBAT: los clientes que consultan periódicamente
+reciben 304 mientras nada cambie.
+"""
+
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import JsonResponse
+from django.urls import reverse
+from django.views.decorators.http import condition, require_GET
+
+from .busqueda import buscar
+from .cache import get_orbat_tree, get_orbat_version, get_strength_report
+from .models import Compania, Escuadra, Miembro, Peloton, Regimiento
+from .strength import efectivos_de
+from .tree import buscar_nodo
+
+NIVELES_API = ('regimiento', 'compania', 'peloton', 'escuadra')
+JSON_COMPACTO = {'separators': (',', ':'), 'ensure_ascii': False}
+
+
+def _incluir_inactivos(request):
+    return request.GET.get('inactivos', '').lower() in {'1', 'true', 'si', 'sí'}
+
+
+def _filtro_subarbol(request):
+    """Devuelve (nivel, id) del subárbol pedido, None si es el árbol completo.
+    Lanza ValueError si los parámetros no son válidos."""
+    pedidos = [(nivel, request.GET[nivel]) for nivel in NIVELES_API if nivel in request.GET]
+    if not pedidos:
+        return None
+    if len(pedidos) > 1:
+        raise ValueError('only_one_unit_filter')
+    nivel, valor = pedidos[0]
+    return nivel, int(valor)
+
+
+def _miembros(miembros, incluir_inactivos):
+    return [
+        {
+            'id': m.id,
+            'nombre_milsim': m.nombre_milsim,
+            'rango': m.rango,
+            'rol': m.rol,
+            'activo': m.activo,
+            'fecha_ingreso': m.fecha_ingreso,
+        }
+        for m in miembros
+        if incluir_inactivos or m.activo
+    ]
+
+
+def _escuadra(sqd, inactivos):
+    return {
+        'id': sqd.id,
+        'nombre': sqd.nombre,
+        'indicativo_radio': sqd.indicativo_radio,
+        'efectivos_activos': sqd.efectivos_activos,
+        'efectivos_total': sqd.efectivos_total,
+        'miembros': _miembros(sqd.miembros, inactivos),
+    }
+
+
+def _peloton(plt, inactivos):
+    return {
+        'id': plt.id,
+        'nombre': plt.nombre,
+        'efectivos_activos': plt.efectivos_activos,
+        'efectivos_total': plt.efectivos_total,
+        'hq': _miembros(plt.hq, inactivos),
+        'escuadras': [_escuadra(sqd, inactivos) for sqd in plt.escuadras],
+    }
+
+
+def _compania(cia, inactivos):
+    return {
+        'id': cia.id,
+        'nombre': cia.nombre,
+        'logo': cia.logo,
+        'efectivos_activos': cia.efectivos_activos,
+        'efectivos_total': cia.efectivos_total,
+        'hq': _miembros(cia.hq, inactivos),
+        'pelotones': [_peloton(plt, inactivos) for plt in cia.pelotones],
+    }
+
+
+def _regimiento(reg, inactivos):
+    return {
+        'id': reg.id,
+        'nombre': reg.nombre,
+        'comandante': reg.comandante,
+        'efectivos_activos': reg.efectivos_activos,
+        'efectivos_total': reg.efectivos_total,
+        'hq': _miembros(reg.hq, inactivos),
+        'companias': [_compania(cia, inactivos) for cia in reg.companias],
+    }
+
+
+SERIALIZADORES = {
+    'regimiento': _regimiento,
+    'compania': _compania,
+    'peloton': _peloton,
+    'escuadra': _escuadra,
+}
+
+
+def _orbat_etag(request, *args, **kwargs):
+    try:
+        filtro = _filtro_subarbol(request)
+    except ValueError:
+        return None
+    # Cada combinación de filtros es un recurso distinto con su propio ETag
+    partes = ['orbat', str(get_orbat_version()), 'all' if _incluir_inactivos(request) else 'act']
+    if filtro:
+        partes.append(f"{filtro[0]}{filtro[1]}")
+    return '-'.join(partes)
+
+
+@require_GET
+@condition(etag_func=_orbat_etag)
+def orbat_api(request):
+    """ORBAT completo (o un subárbol con ?regimiento=|compania=|peloton=|escuadra=<id>).
+
+    Por defecto sólo miembros activos; ``?inactivos=1`` incluye a todos.
+    """
+    try:
+        filtro = _filtro_subarbol(request)
+    except ValueError:
+        return JsonResponse({'error': 'invalid_unit_filter'}, status=400)
+
+    inactivos = _incluir_inactivos(request)
+    arbol = get_orbat_tree()
+    if filtro is None:
+        data = {'regimientos': [_regimiento(reg, inactivos) for reg in arbol]}
+    else:
+        nivel, pk = filtro
+        nodo = buscar_nodo(arbol, nivel, pk)
+        if nodo is None:
+            return JsonResponse({'error': f'{nivel}_not_found'}, status=404)
+        data = {nivel: SERIALIZADORES[nivel](nodo, inactivos)}
+
+    response = JsonResponse(data, json_dumps_params=JSON_COMPACTO)
+    # Siempre revalidar: el ETag hace que la respuesta repetida sea un 304 vacío
+    response['Cache-Control'] = 'no-cache'
+    return response
+
+
+def _efectivos_nodo(reporte, prefijo, nodo, **hijos):
+    return {'id': nodo.id, 'nombre': nodo.nombre, **efectivos_de(reporte, f"{prefijo}{nodo.id}"), **hijos}
+
+
+def _strength_etag(request, *args, **kwargs):
+    return f"efectivos-{get_orbat_version()}"
+
+
+@require_GET
+@condition(etag_func=_strength_etag)
+def orbat_strength_api(request):
+    """Efectivos activos/inactivos por regimiento, compañía, pelotón y
+    escuadra, con desglose por rango (ver strength.py). Los nombres salen del
+    árbol cacheado y los conteos del reporte cacheado."""
+    reporte = get_strength_report()
+    data = {
+        'total': reporte['total'],
+        'regimientos': [
+            _efectivos_nodo(reporte, 'R', reg, companias=[
+                _efectivos_nodo(reporte, 'C', cia, pelotones=[
+                    _efectivos_nodo(reporte, 'P', plt, escuadras=[
+                        _efectivos_nodo(reporte, 'E', sqd) for sqd in plt.escuadras
+                    ])
+                    for plt in cia.pelotones
+                ])
+                for cia in reg.companias
+            ])
+            for reg in get_orbat_tree()
+        ],
+    }
+    response = JsonResponse(data, json_dumps_params=JSON_COMPACTO)
+    response['Cache-Control'] = 'no-cache'
+    return response
+
+
+TIPOS_BUSQUEDA = {
+    'miembro': Miembro,
+    'regimiento': Regimiento,
+    'compania': Compania,
+    'peloton': Peloton,
+    'escuadra': Escuadra,
+}
+LIMITE_BUSQUEDA = 25
+
+
+@require_GET
+@staff_member_required
+def orbat_busqueda_api(request):
+    """Typeahead de personal y unidades: ``?q=<texto>[&tipo=miembro,escuadra][&limite=10]``.
+
+    Usa la búsqueda indexada de busqueda.py; cada tipo aporta hasta `limite`
+    resultados, ya ordenados por relevancia. Con menos de 2 caracteres no busca.
+    """
+    termino = request.GET.get('q', '').strip()
+    tipos = request.GET.get('tipo', ','.join(TIPOS_BUSQUEDA)).split(',')
+    try:
+        limite = min(int(request.GET.get('limite', 10)), LIMITE_BUSQUEDA)
+    except ValueError:
+        return JsonResponse({'error': 'invalid_limit'}, status=400)
+    if any(tipo not in TIPOS_BUSQUEDA for tipo in tipos):
+        return JsonResponse({'error': 'invalid_type'}, status=400)
+
+    resultados = []
+    if len(termino) >= 2 and limite > 0:
+        for tipo in tipos:
+            modelo = TIPOS_BUSQUEDA[tipo]
+            for obj in buscar(modelo.objects.all(), termino)[:limite]:
+                resultados.append({
+                    'tipo': tipo,
+                    'id': obj.pk,
+                    'texto': str(obj),
+                    'url': reverse(f'admin:orbat_{modelo._meta.model_name}_change', args=[obj.pk]),
+                })
+    return JsonResponse({'resultados': resultados}, json_dumps_params=JSON_COMPACTO)
@@ -0,0 +1,91 @@
+"""
+Vistas async para el modo ASGI (ORBAT_ASYNC_VIEWS=True, ver urls.py).
+
+Mismas URLs, plantillas y respuestas que las vistas sync. Las lecturas usan
+la caché y el ORM async. Lo que en Django 4.2 sólo existe en sync
+(transacciones, sesión del usuario) corre en un único salto a un hilo:
+
+- Los traslados ejecutan la vista sync completa (idempotencia incluida) con
+  ``thread_sensitive=False``. Con ``True`` todas las vistas sync del proceso
+  comparten un hilo y los traslados concurrentes se encolarían.
+- La auditoría comprueba el staff, cuenta (ver paginacion.py) y renderiza
+  el admin en un hilo; la consulta de la página es async.
+"""
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.views import redirect_to_login
+from django.db import close_old_connections
+from django.http import HttpResponseBadRequest
+from django.shortcuts import render
+from django.urls import reverse
+
+from . import audit_views, views
+from .cache import aget_orbat_tree
+from .paginacion import ConteoAproximadoPaginator
+
+
+async def orbat_visual(request):
+    """Versión async de `views.orbat_visual`."""
+    return render(request, 'orbat/visual_chart.html', {
+        'regimientos': await aget_orbat_tree(),
+        'fragment_timeout': settings.ORBAT_FRAGMENT_TIMEOUT,
+        'colapsado': views._modo_colapsado(request),
+    })
+
+
+async def escuadras_dashboard(request):
+    """Versión async de `views.escuadras_dashboard` (mismas dos consultas)."""
+    try:
+        escuadras, miembros = views._consultas_tablero(request.GET)
+    except ValueError:
+        return HttpResponseBadRequest('invalid_unit_filter')
+
+    return render(request, 'orbat/board.html', {
+        'escuadras': views._agrupar_tablero([e async for e in escuadras], [m async for m in miembros]),
+    })
+
+
+def _en_hilo_propio(view):
+    """Envuelve una vista sync de traslado para correrla fuera del hilo
+    compartido. Cierra la conexión del hilo al terminar, como haría
+    `request_finished` con una petición sync."""
+
+    def ejecutar(request):
+        try:
+            return view(request)
+        finally:
+            close_old_connections()
+
+    async def vista(request):
+        return await sync_to_async(ejecutar, thread_sensitive=False)(request)
+
+    # csrf_exempt de Django 4.2 no admite vistas async: se copia a mano
+    vista.csrf_exempt = getattr(view, 'csrf_exempt', False)
+    vista.__doc__ = view.__doc__
+    return vista
+
+
+transferir_personal = _en_hilo_propio(views.transferir_personal)
+transferir_personal_lote = _en_hilo_propio(views.transferir_personal_lote)
+
+
+def _es_staff(request):
+    return request.user.is_active and request.user.is_staff
+
+
+async def audit_log_list(request):
+    """Versión async de `audit_views.audit_log_list`."""
+    if not await sync_to_async(_es_staff)(request):
+        return redirect_to_login(request.get_full_path(), reverse('admin:login'))
+
+    entries, context = audit_views._filtrar(request)
+    if request.GET.get("export") == "csv":
+        return audit_views._exportar_csv_async(entries)
+
+    paginator = ConteoAproximadoPaginator(entries, audit_views.AUDIT_PAGE_SIZE)
+    # count y, con conteo aproximado, la página misma consultan la BD: en un hilo
+    page_obj = await sync_to_async(paginator.get_page)(request.GET.get("page", 1))
+    page_obj.object_list = await sync_to_async(list)(page_obj.object_list)
+    context["page_obj"] = page_obj
+    return await sync_to_async(render)(request, "admin/orbat/audit_log_list.html", context)
@@ -1,21 +1,36 @@
-import csv
-from datetime import timedelta
+from datetime import datetime, time, timedelta
 
 from django.contrib.admin.models import LogEntry
 from django.contrib.admin.views.decorators import staff_member_required
-from django.core.paginator import Paginator
 from django.db.models import Q
-from django.http import HttpResponse
 from django.shortcuts import get_object_or_404, render
 from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from .exportacion import CHUNK_FILAS, en_tandas, respuesta_csv
+from .paginacion import ConteoAproximadoPaginator
+
+
+AUDIT_PAGE_SIZE = 30
 
 
 def _base_queryset():
     return LogEntry.objects.select_related("user", "content_type").order_by("-action_time")
 
 
-@staff_member_required
-def audit_log_list(request):
+def _fecha(valor):
+    try:
+        return parse_date(valor)
+    except ValueError:
+        return None
+
+
+def _inicio_del_dia(fecha):
+    return timezone.make_aware(datetime.combine(fecha, time.min))
+
+
+def _filtrar(request):
+    """Aplica los filtros de la URL. Devuelve (entries, contexto de filtros)."""
     entries = _base_queryset()
 
     query = request.GET.get("q", "").strip()
@@ -52,39 +67,16 @@ def audit_log_list(request):
     if user_filter:
         entries = entries.filter(user__username__icontains=user_filter)
 
-    if date_from:
-        entries = entries.filter(action_time__date__gte=date_from)
+    # Rangos sobre action_time (no action_time__date): usan el índice de fecha
+    desde, hasta = _fecha(date_from), _fecha(date_to)
+    if desde:
+        entries = entries.filter(action_time__gte=_inicio_del_dia(desde))
 
-    if date_to:
-        entries = entries.filter(action_time__date__lte=date_to)
-
-    if request.GET.get("export") == "csv":
-        response = HttpResponse(content_type="text/csv")
-        response["Content-Disposition"] = "attachment; filename=auditoria_orbat.csv"
-        writer = csv.writer(response)
-        writer.writerow(["fecha_hora", "usuario", "accion", "modelo", "objeto", "detalle"])
-
-        action_map = {1: "Añadido", 2: "Modificado", 3: "Eliminado"}
-        for entry in entries:
-            writer.writerow(
-                [
-                    timezone.localtime(entry.action_time).strftime("%Y-%m-%d %H:%M:%S"),
-                    entry.user.username if entry.user else "-",
-                    action_map.get(entry.action_flag, "-"),
-                    entry.content_type.model if entry.content_type else "-",
-                    entry.object_repr,
-                    entry.change_message,
-                ]
-            )
-
-        return response
-
-    paginator = Paginator(entries, 30)
-    page_obj = paginator.get_page(request.GET.get("page", 1))
+    if hasta:
+        entries = entries.filter(action_time__lt=_inicio_del_dia(hasta + timedelta(days=1)))
 
     context = {
         "title": "Auditoría de cambios",
-        "page_obj": page_obj,
         "query": query,
         "action_flag": action_flag,
         "model_filter": model_filter,
@@ -93,6 +85,54 @@ def audit_log_list(request):
         "date_to": date_to,
         "preset": preset,
     }
+    return entries, context
+
+
+ENCABEZADO_CSV = ["fecha_hora", "usuario", "accion", "modelo", "objeto", "detalle"]
+ACCIONES_CSV = {1: "Añadido", 2: "Modificado", 3: "Eliminado"}
+
+
+def _filas_csv(entries):
+    return entries.values_list(
+        "action_time", "user__username", "action_flag", "content_type__model", "object_repr", "change_message"
+    )
+
+
+def _fila_csv(fila):
+    action_time, username, action_flag, modelo, object_repr, change_message = fila
+    return [
+        timezone.localtime(action_time).strftime("%Y-%m-%d %H:%M:%S"),
+        username or "-",
+        ACCIONES_CSV.get(action_flag, "-"),
+        modelo or "-",
+        object_repr,
+        change_message,
+    ]
+
+
+def _exportar_csv(entries):
+    filas = _filas_csv(entries).iterator(chunk_size=CHUNK_FILAS)
+    return respuesta_csv("auditoria_orbat.csv", ENCABEZADO_CSV, map(_fila_csv, filas))
+
+
+def _exportar_csv_async(entries):
+    """Igual que `_exportar_csv`, con filas async para las vistas ASGI."""
+    async def filas():
+        async for fila in en_tandas(_filas_csv(entries)):
+            yield _fila_csv(fila)
+
+    return respuesta_csv("auditoria_orbat.csv", ENCABEZADO_CSV, filas())
+
+
+@staff_member_required
+def audit_log_list(request):
+    entries, context = _filtrar(request)
+
+    if request.GET.get("export") == "csv":
+        return _exportar_csv(entries)
+
+    paginator = ConteoAproximadoPaginator(entries, AUDIT_PAGE_SIZE)
+    context["page_obj"] = paginator.get_page(request.GET.get("page", 1))
     return render(request, "admin/orbat/audit_log_list.html", context)
 
 
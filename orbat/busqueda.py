@@ -0,0 +1,178 @@
+"""
+Búsqueda indexada de personal y unidades.
+
+`icontains` sobre varias columnas (y columnas de tablas unidas) recorre la
+tabla entera. Esta búsqueda se apoya en índices por motor:
+
+- PostgreSQL: índices GIN de trigramas (pg_trgm) sobre ``UPPER(columna)``,
+  la misma expresión que genera ``icontains``; cada palabra se busca como
+  subcadena con el índice.
+- SQLite: una tabla FTS5 por modelo (``<tabla>_fts``, rowid = pk) con el
+  tokenizador ``trigram`` (SQLite 3.34+), mantenida por triggers; cada
+  palabra se busca como subcadena, igual que en PostgreSQL. El índice sólo
+  sirve para palabras de 3 o más caracteres: las más cortas van por
+  ``icontains``.
+- Otros motores (o SQLite sin FTS5 o anterior a 3.34): ``icontains`` por
+  palabra, sin índice.
+
+En todos los motores una palabra encuentra lo mismo que ``icontains``
+(subcadena; distingue tildes pero no mayúsculas), y el resultado se ordena
+igual: primero los nombres que empiezan por el término, luego los más cortos.
+
+Los índices los crea la migración 0017 con `crear_indices`.
+"""
+
+import functools
+
+from django.db import connections
+from django.db.models import Case, Q, Value, When
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Length
+
+# tabla: (columna del nombre, columnas buscadas)
+BUSCABLES = {
+    'orbat_regimiento': ('nombre', ('nombre', 'comandante')),
+    'orbat_compania': ('nombre', ('nombre',)),
+    # La etiqueta incluye compañía y pelotón: "Alpha | 1er Pelotón | S1"
+    'orbat_peloton': ('nombre', ('etiqueta',)),
+    'orbat_escuadra': ('nombre', ('etiqueta',)),
+    'orbat_miembro': ('nombre_milsim', ('nombre_milsim',)),
+}
+# Un miembro también se encuentra por los datos de su usuario
+CAMPOS_USUARIO = ('username', 'first_name', 'last_name')
+# Largo mínimo de palabra que puede usar el índice trigram de SQLite
+MIN_TRIGRAMA = 3
+
+
+def _texto(columnas, fila='NEW'):
+    return " || ' ' || ".join(f"COALESCE({fila}.{c}, '')" for c in columnas)
+
+
+def _texto_miembro(fila='NEW'):
+    usuario = _texto(CAMPOS_USUARIO, 'u')
+    return (
+        f"{_texto(BUSCABLES['orbat_miembro'][1], fila)} || ' ' || "
+        f"COALESCE((SELECT {usuario} FROM auth_user u WHERE u.id = {fila}.usuario_id), '')"
+    )
+
+
+def _sql_sqlite():
+    sentencias = []
+    for tabla, (_, columnas) in BUSCABLES.items():
+        fts = f'{tabla}_fts'
+        if tabla == 'orbat_miembro':
+            texto, disparan = _texto_miembro(), columnas + ('usuario_id',)
+        else:
+            texto, disparan = _texto(columnas), columnas
+        sentencias += [
+            f"CREATE VIRTUAL TABLE {fts} USING fts5(texto, tokenize='trigram case_sensitive 0')",
+            # El alias NEW deja usar la misma expresión que en los triggers
+            f"INSERT INTO {fts}(rowid, texto) SELECT NEW.id, {texto} FROM {tabla} AS NEW",
+            f"CREATE TRIGGER {fts}_ai AFTER INSERT ON {tabla} BEGIN "
+            f"INSERT INTO {fts}(rowid, texto) VALUES (NEW.id, {texto}); END",
+            f"CREATE TRIGGER {fts}_au AFTER UPDATE OF {', '.join(disparan)} ON {tabla} BEGIN "
+            f"DELETE FROM {fts} WHERE rowid = OLD.id; "
+            f"INSERT INTO {fts}(rowid, texto) VALUES (NEW.id, {texto}); END",
+            f"CREATE TRIGGER {fts}_ad AFTER DELETE ON {tabla} BEGIN "
+            f"DELETE FROM {fts} WHERE rowid = OLD.id; END",
+        ]
+    sentencias.append(
+        f"CREATE TRIGGER orbat_miembro_fts_usuario AFTER UPDATE OF {', '.join(CAMPOS_USUARIO)} ON auth_user BEGIN "
+        "DELETE FROM orbat_miembro_fts WHERE rowid IN (SELECT id FROM orbat_miembro WHERE usuario_id = NEW.id); "
+        f"INSERT INTO orbat_miembro_fts(rowid, texto) SELECT m.id, {_texto_miembro('m')} "
+        "FROM orbat_miembro m WHERE m.usuario_id = NEW.id; END"
+    )
+    return sentencias
+
+
+def _indices_postgres():
+    columnas = [(tabla, c) for tabla, (_, cs) in BUSCABLES.items() for c in cs]
+    columnas += [('auth_user', c) for c in CAMPOS_USUARIO]
+    return [(f'{tabla}_{c}_trgm', tabla, c) for tabla, c in columnas]
+
+
+def crear_indices(schema_editor):
+    conexion = schema_editor.connection
+    if conexion.vendor == 'postgresql':
+        schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        for nombre, tabla, columna in _indices_postgres():
+            schema_editor.execute(
+                f'CREATE INDEX IF NOT EXISTS {nombre} ON {tabla} USING gin ((UPPER({columna}::text)) gin_trgm_ops)'
+            )
+    elif conexion.vendor == 'sqlite':
+        with conexion.cursor() as cursor:
+            cursor.execute('PRAGMA compile_options')
+            if 'ENABLE_FTS5' not in {fila[0] for fila in cursor.fetchall()}:
+                return
+        # El tokenizador trigram llegó en SQLite 3.34
+        if conexion.Database.sqlite_version_info < (3, 34):
+            return
+        for sentencia in _sql_sqlite():
+            schema_editor.execute(sentencia)
+    _fts_disponible.cache_clear()
+
+
+def borrar_indices(schema_editor):
+    conexion = schema_editor.connection
+    if conexion.vendor == 'postgresql':
+        for nombre, _, _ in _indices_postgres():
+            schema_editor.execute(f'DROP INDEX IF EXISTS {nombre}')
+    elif conexion.vendor == 'sqlite':
+        schema_editor.execute('DROP TRIGGER IF EXISTS orbat_miembro_fts_usuario')
+        for tabla in BUSCABLES:
+            for sufijo in ('ai', 'au', 'ad'):
+                schema_editor.execute(f'DROP TRIGGER IF EXISTS {tabla}_fts_{sufijo}')
+            schema_editor.execute(f'DROP TABLE IF EXISTS {tabla}_fts')
+    _fts_disponible.cache_clear()
+
+
+@functools.lru_cache(maxsize=None)
+def _fts_disponible(alias):
+    conexion = connections[alias]
+    return conexion.vendor == 'sqlite' and 'orbat_miembro_fts' in conexion.introspection.table_names()
+
+
+def _filtro_fts(tabla, palabras):
+    # Cada palabra como frase entre comillas: subcadena literal
+    consulta = ' '.join('"{}"'.format(p.replace('"', '""')) for p in palabras)
+    return Q(pk__in=RawSQL(f'SELECT rowid FROM {tabla}_fts WHERE {tabla}_fts MATCH %s', [consulta]))
+
+
+def _alguna_contiene(columnas, palabra):
+    filtro = Q()
+    for columna in columnas:
+        filtro |= Q(**{f'{columna}__icontains': palabra})
+    return filtro
+
+
+def _filtro_icontains(modelo, columnas, palabra):
+    filtro = _alguna_contiene(columnas, palabra)
+    if modelo._meta.db_table == 'orbat_miembro':
+        # Subconsulta en vez de JOIN: cada lado del OR usa su propio índice
+        usuarios = modelo._meta.get_field('usuario').related_model.objects.filter(
+            _alguna_contiene(CAMPOS_USUARIO, palabra)
+        )
+        filtro |= Q(usuario__in=usuarios.values('pk'))
+    return filtro
+
+
+def buscar(queryset, termino):
+    """Filtra `queryset` (de un modelo de BUSCABLES) por `termino` y lo
+    ordena por relevancia: todas las palabras tienen que aparecer."""
+    termino = termino.strip()
+    if not termino:
+        return queryset
+    tabla = queryset.model._meta.db_table
+    nombre, columnas = BUSCABLES[tabla]
+    palabras = termino.split()
+    if _fts_disponible(queryset.db):
+        largas = [p for p in palabras if len(p) >= MIN_TRIGRAMA]
+        if largas:
+            queryset = queryset.filter(_filtro_fts(tabla, largas))
+        palabras = [p for p in palabras if len(p) < MIN_TRIGRAMA]
+    for palabra in palabras:
+        queryset = queryset.filter(_filtro_icontains(queryset.model, columnas, palabra))
+    return queryset.annotate(
+        prefijo_busqueda=Case(When(**{f'{nombre}__istartswith': termino}, then=Value(0)), default=Value(1)),
+        largo_busqueda=Length(nombre),
+    ).order_by('prefijo_busqueda', 'largo_busqueda', nombre)
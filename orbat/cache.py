@@ -0,0 +1,142 @@
+"""
+Caché del ORBAT público.
+
+El árbol ensamblado se guarda bajo una clave que incluye la "versión ORBAT"
+global. Cualquier cambio en la estructura o en el personal incrementa esa
+versión (ver ``signals.py`` y ``transferir_personal``), así que las entradas
+viejas dejan de leerse y expiran solas por TTL.
+
+Las variantes ``a*`` son para las vistas async (ver async_views.py): usan la
+API async de la caché y del ORM.
+"""
+
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Escuadra
+from .strength import build_strength_report
+from .tree import abuild_orbat_tree, build_orbat_tree
+
+VERSION_KEY = 'orbat:version'
+TREE_KEY = 'orbat:arbol:v{version}'
+STRENGTH_KEY = 'orbat:efectivos:v{version}'
+ESCUADRAS_KEY = 'orbat:opciones_escuadras:v{version}'
+HITS_KEY = 'orbat:stats:hits'
+MISSES_KEY = 'orbat:stats:misses'
+
+
+def _timeout():
+    return getattr(settings, 'ORBAT_CACHE_TIMEOUT', 300)
+
+
+def get_orbat_version():
+    """Devuelve la versión ORBAT actual, sembrándola si la caché está vacía."""
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        # Semilla basada en tiempo: tras un reinicio de la caché no se
+        # reutilizan números de versión que pudieran seguir en otra clave.
+        version = int(time.time() * 1000)
+        if not cache.add(VERSION_KEY, version, timeout=None):
+            version = cache.get(VERSION_KEY, version)
+    return version
+
+
+def bump_orbat_version():
+    """Invalida el árbol cacheado incrementando la versión global."""
+    try:
+        return cache.incr(VERSION_KEY)
+    except ValueError:
+        # La clave no existe (caché reiniciada): una semilla nueva ya invalida.
+        return get_orbat_version()
+
+
+def _count(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, 1, timeout=None):
+            cache.incr(key)
+
+
+def get_orbat_tree():
+    """Devuelve el árbol ORBAT completo, desde caché si la versión no cambió."""
+    key = TREE_KEY.format(version=get_orbat_version())
+    tree = cache.get(key)
+    if tree is not None:
+        _count(HITS_KEY)
+        return tree
+
+    _count(MISSES_KEY)
+    tree = build_orbat_tree()
+    cache.set(key, tree, _timeout())
+    return tree
+
+
+def get_strength_report():
+    """Reporte de efectivos (ver strength.py), cacheado con la misma versión."""
+    key = STRENGTH_KEY.format(version=get_orbat_version())
+    reporte = cache.get(key)
+    if reporte is None:
+        reporte = build_strength_report()
+        cache.set(key, reporte, _timeout())
+    return reporte
+
+
+def get_opciones_escuadras():
+    """[(pk, etiqueta)] de todas las escuadras, para filtros y selects del admin."""
+    key = ESCUADRAS_KEY.format(version=get_orbat_version())
+    opciones = cache.get(key)
+    if opciones is None:
+        opciones = list(Escuadra.objects.order_by('etiqueta').values_list('pk', 'etiqueta'))
+        cache.set(key, opciones, _timeout())
+    return opciones
+
+
+async def aget_orbat_version():
+    version = await cache.aget(VERSION_KEY)
+    if version is None:
+        version = int(time.time() * 1000)
+        if not await cache.aadd(VERSION_KEY, version, timeout=None):
+            version = await cache.aget(VERSION_KEY, version)
+    return version
+
+
+async def _acount(key):
+    try:
+        await cache.aincr(key)
+    except ValueError:
+        if not await cache.aadd(key, 1, timeout=None):
+            await cache.aincr(key)
+
+
+async def aget_orbat_tree():
+    key = TREE_KEY.format(version=await aget_orbat_version())
+    tree = await cache.aget(key)
+    if tree is not None:
+        await _acount(HITS_KEY)
+        return tree
+
+    await _acount(MISSES_KEY)
+    tree = await abuild_orbat_tree()
+    await cache.aset(key, tree, _timeout())
+    return tree
+
+
+def get_cache_stats():
+    """Aciertos, fallos y ratio de aciertos de la caché del ORBAT."""
+    values = cache.get_many([HITS_KEY, MISSES_KEY])
+    hits = values.get(HITS_KEY, 0)
+    misses = values.get(MISSES_KEY, 0)
+    total = hits + misses
+    return {
+        'version': get_orbat_version(),
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': round(hits / total, 4) if total else 0.0,
+    }
+
+
+def reset_cache_stats():
+    cache.delete_many([HITS_KEY, MISSES_KEY])
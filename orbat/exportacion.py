@@ -0,0 +1,111 @@
+"""
+Exportaciones CSV en streaming (Personal y auditoría).
+
+La respuesta se envía por bloques mientras se leen las filas: las filas
+salen de ``values_list()`` con ``iterator()``/``aiterator()`` por tandas
+(cursor del lado del servidor en PostgreSQL), así que la memoria no crece
+con el tamaño de la exportación y la primera línea sale antes de consultar.
+
+`respuesta_csv` acepta filas sync o async: bajo ASGI, Django 4.2 lee
+entero un iterador sync antes de enviarlo, así que las vistas async pasan
+un generador async (`en_tandas`).
+"""
+
+import csv
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from django.http import StreamingHttpResponse
+
+from .models import Compania, Escuadra, Peloton, Regimiento
+
+# Filas por tanda leída de la BD y líneas por bloque enviado
+CHUNK_FILAS = 2000
+LINEAS_POR_BLOQUE = 500
+
+
+class _Eco:
+    """Pseudo-archivo para csv.writer: devuelve la línea en lugar de guardarla."""
+
+    def write(self, valor):
+        return valor
+
+
+def _lineas(writer, encabezado, filas):
+    yield writer.writerow(encabezado)
+    bloque = []
+    for fila in filas:
+        bloque.append(writer.writerow(fila))
+        if len(bloque) >= LINEAS_POR_BLOQUE:
+            yield ''.join(bloque)
+            bloque = []
+    if bloque:
+        yield ''.join(bloque)
+
+
+async def _alineas(writer, encabezado, filas):
+    yield writer.writerow(encabezado)
+    bloque = []
+    async for fila in filas:
+        bloque.append(writer.writerow(fila))
+        if len(bloque) >= LINEAS_POR_BLOQUE:
+            yield ''.join(bloque)
+            bloque = []
+    if bloque:
+        yield ''.join(bloque)
+
+
+async def en_tandas(queryset):
+    """Filas de `queryset.iterator()` como generador async. El iterador avanza
+    por tandas en el hilo de la BD (``aiterator()`` de Django 4.2 ejecuta la
+    consulta en el bucle de eventos y falla)."""
+    filas = await sync_to_async(queryset.iterator)(chunk_size=CHUNK_FILAS)
+    siguiente_tanda = sync_to_async(lambda: list(islice(filas, CHUNK_FILAS)))
+    while tanda := await siguiente_tanda():
+        for fila in tanda:
+            yield fila
+
+
+def respuesta_csv(nombre_archivo, encabezado, filas):
+    """StreamingHttpResponse con el CSV de `filas` (iterable sync o async)."""
+    writer = csv.writer(_Eco())
+    if hasattr(filas, '__aiter__'):
+        contenido = _alineas(writer, encabezado, filas)
+    else:
+        contenido = _lineas(writer, encabezado, filas)
+    response = StreamingHttpResponse(contenido, content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename={nombre_archivo}'
+    return response
+
+
+# ── Personal ─────────────────────────────────────────────────────────
+
+ENCABEZADO_MIEMBROS = ['rango', 'nombre_milsim', 'rol', 'usuario', 'regimiento', 'compania', 'peloton', 'escuadra', 'activo']
+NIVELES = {'R': 0, 'C': 1, 'P': 2, 'E': 3}
+
+
+def _nombres_unidades():
+    """{'R1': 'nombre', 'C3': ...} de todas las unidades (tablas chicas)."""
+    nombres = {}
+    for modelo in (Regimiento, Compania, Peloton, Escuadra):
+        for pk, nombre in modelo.objects.order_by().values_list('pk', 'nombre').iterator():
+            nombres[f"{modelo.PREFIJO}{pk}"] = nombre
+    return nombres
+
+
+def filas_miembros(queryset):
+    """Filas del CSV de Personal: regimiento..escuadra salen de `ruta`."""
+    nombres = _nombres_unidades()
+    filas = queryset.values_list(
+        'rango', 'nombre_milsim', 'rol', 'usuario__username', 'ruta', 'activo',
+    ).iterator(chunk_size=CHUNK_FILAS)
+    for rango, nick, rol, username, ruta, activo in filas:
+        unidades = ['', '', '', '']
+        for token in ruta.split('/'):
+            if token:
+                unidades[NIVELES[token[0]]] = nombres.get(token, '')
+        yield [rango, nick, rol, username or '', *unidades, activo]
+
+
+def exportar_miembros(queryset):
+    return respuesta_csv('miembros.csv', ENCABEZADO_MIEMBROS, filas_miembros(queryset))
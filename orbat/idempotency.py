@@ -0,0 +1,149 @@
+"""
+Idempotencia para las APIs de traslado.
+
+Con la cabecera ``Idempotency-Key`` la primera petición reserva la clave
+(fila con status 0), ejecuta la vista y guarda la respuesta en la misma
+transacción que el traslado. Un reintento con la misma clave recibe la
+respuesta guardada sin tocar Miembro; si la original sigue en curso, 409.
+La clave es de quien la usó (usuario, o sesión si es anónimo): otro usuario
+con la misma clave hace su propia petición.
+
+Las respuestas 5xx y los 409 por una carrera perdida (`stale_version`,
+`concurrent_change`) no se guardan: el cliente puede reintentarlas con la
+misma clave. Una reserva sin completar más de ORBAT_IDEMPOTENCY_LEASE
+segundos (el proceso murió a mitad) la toma el siguiente reintento. Las
+claves vencen a los ORBAT_IDEMPOTENCY_TTL segundos.
+
+Si fallan las escrituras propias de la clave (BD bloqueada, deadlock) se
+responde el mismo 500 `db_error` que las vistas.
+"""
+
+import functools
+import hashlib
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError, IntegrityError, transaction
+from django.http import HttpResponse, JsonResponse
+from django.utils import timezone
+
+from .models import ClaveIdempotencia
+
+MAX_CLAVE = 255
+
+
+def _vencimiento():
+    return timezone.now() - timedelta(seconds=settings.ORBAT_IDEMPOTENCY_TTL)
+
+
+def purgar_claves_vencidas():
+    """Borra las claves vencidas. Devuelve cuántas se borraron."""
+    return ClaveIdempotencia.objects.filter(creada__lt=_vencimiento()).delete()[0]
+
+
+def _reproducir(registro):
+    response = HttpResponse(registro.respuesta, status=registro.status, content_type='application/json')
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+# Conflictos de concurrencia: un reintento puede salir bien
+ERRORES_TRANSITORIOS = {'stale_version', 'concurrent_change'}
+
+
+def _transitoria(response):
+    if response.status_code != 409:
+        return False
+    try:
+        datos = json.loads(response.content)
+    except ValueError:
+        return False
+    errores = {datos.get('error')} | {r.get('error') for r in datos.get('resultados') or ()}
+    return bool(errores & ERRORES_TRANSITORIOS)
+
+
+def _db_error(exc):
+    return JsonResponse({'error': 'db_error', 'details': str(exc)}, status=500)
+
+
+def _liberar(registro):
+    # Si tampoco se puede borrar, la reserva vence por el lease
+    try:
+        ClaveIdempotencia.objects.filter(pk=registro.pk).delete()
+    except DatabaseError:
+        pass
+
+
+def _titular(request):
+    if request.user.is_authenticated:
+        return f'u{request.user.pk}'
+    session = getattr(request, 'session', None)
+    return f's{session.session_key}' if session is not None and session.session_key else ''
+
+
+def _reservar(endpoint, titular, clave, huella):
+    """Devuelve (registro reservado, None) o (None, respuesta para el cliente)."""
+    claves = ClaveIdempotencia.objects.filter(endpoint=endpoint, titular=titular, clave=clave)
+    # Una clave vencida cuenta como nueva
+    claves.filter(creada__lt=_vencimiento()).delete()
+    try:
+        with transaction.atomic():
+            return ClaveIdempotencia.objects.create(endpoint=endpoint, titular=titular, clave=clave, huella=huella), None
+    except IntegrityError:
+        pass
+    registro = claves.first()
+    if registro is not None and registro.huella != huella:
+        return None, JsonResponse({'error': 'idempotency_key_reused'}, status=422)
+    if registro is not None and registro.status:
+        return None, _reproducir(registro)
+    if registro is not None:
+        abandonada = timezone.now() - timedelta(seconds=settings.ORBAT_IDEMPOTENCY_LEASE)
+        # Sólo un reintento gana el UPDATE condicionado a la `creada` leída
+        if registro.creada < abandonada and ClaveIdempotencia.objects.filter(
+            pk=registro.pk, status=0, creada=registro.creada,
+        ).update(creada=timezone.now()):
+            return registro, None
+    return None, JsonResponse({'error': 'request_in_progress'}, status=409)
+
+
+def idempotente(view):
+    """Decorador para vistas POST que devuelven JSON."""
+
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        clave = request.headers.get('Idempotency-Key')
+        if not clave:
+            return view(request, *args, **kwargs)
+        if len(clave) > MAX_CLAVE:
+            return JsonResponse({'error': 'invalid_idempotency_key'}, status=400)
+
+        huella = hashlib.blake2b(request.body, digest_size=16).hexdigest()
+        try:
+            registro, respuesta = _reservar(request.path, _titular(request), clave, huella)
+        except DatabaseError as exc:
+            return _db_error(exc)
+        if respuesta is not None:
+            return respuesta
+
+        try:
+            with transaction.atomic():
+                response = view(request, *args, **kwargs)
+                guardar = response.status_code < 500 and not _transitoria(response)
+                if guardar:
+                    ClaveIdempotencia.objects.filter(pk=registro.pk).update(
+                        status=response.status_code,
+                        respuesta=response.content.decode('utf-8'),
+                    )
+        except DatabaseError as exc:
+            # También deshizo el traslado: nada quedó aplicado
+            _liberar(registro)
+            return _db_error(exc)
+        except Exception:
+            _liberar(registro)
+            raise
+        if not guardar:
+            _liberar(registro)
+        return response
+
+    return wrapper
@@ -0,0 +1,103 @@
+"""
+Reconstrucción masiva de los datos derivados de la jerarquía ORBAT.
+
+`models.py` mantiene estos valores fila a fila en cada `save()`; aquí están
+las versiones en bloque para backfills, reparaciones y operaciones que usan
+`queryset.update()` y por lo tanto no pasan por `save()`.
+
+Las funciones reciben los modelos como argumentos para poder usarse también
+desde migraciones con los modelos históricos.
+"""
+
+from collections import defaultdict
+
+from django.db.models import CharField, Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Concat
+
+SEPARADOR_ETIQUETA = ' | '
+
+
+def segmentos_ruta(ruta):
+    """'R1/C3/P7/' -> [('R', 1), ('C', 3), ('P', 7)]"""
+    return [(token[0], int(token[1:])) for token in ruta.split('/') if token]
+
+
+def calcular_rutas(regimientos, companias, pelotones, escuadras, miembros):
+    """Calcula rutas a partir de filas (pk, padre_id) por nivel.
+
+    `miembros` son tuplas (pk, regimiento_id, compania_id, peloton_id, escuadra_id).
+    Devuelve un dict por nivel con {pk: ruta}.
+    """
+    rutas_reg = {pk: f"R{pk}/" for pk in regimientos}
+    rutas_cia = {pk: f"{rutas_reg.get(padre, '')}C{pk}/" for pk, padre in companias}
+    rutas_plt = {pk: f"{rutas_cia.get(padre, '')}P{pk}/" for pk, padre in pelotones}
+    rutas_sqd = {pk: f"{rutas_plt.get(padre, '')}E{pk}/" for pk, padre in escuadras}
+    rutas_miembros = {}
+    for pk, reg_id, cia_id, plt_id, sqd_id in miembros:
+        # Misma precedencia que Miembro.unidad: la asignación más específica
+        rutas_miembros[pk] = (
+            rutas_sqd.get(sqd_id) or rutas_plt.get(plt_id)
+            or rutas_cia.get(cia_id) or rutas_reg.get(reg_id) or ''
+        )
+    return rutas_reg, rutas_cia, rutas_plt, rutas_sqd, rutas_miembros
+
+
+def reconstruir_rutas(Regimiento, Compania, Peloton, Escuadra, Miembro):
+    """Recalcula y guarda `ruta` en todas las tablas. Devuelve filas corregidas."""
+    rutas = calcular_rutas(
+        Regimiento.objects.values_list('pk', flat=True),
+        Compania.objects.values_list('pk', 'regimiento_id'),
+        Peloton.objects.values_list('pk', 'compania_id'),
+        Escuadra.objects.values_list('pk', 'peloton_id'),
+        Miembro.objects.values_list('pk', 'regimiento_id', 'compania_id', 'peloton_id', 'escuadra_id'),
+    )
+    corregidas = 0
+    for model, nuevas in zip((Regimiento, Compania, Peloton, Escuadra, Miembro), rutas):
+        actuales = dict(model.objects.values_list('pk', 'ruta'))
+        cambios = [model(pk=pk, ruta=ruta) for pk, ruta in nuevas.items() if actuales.get(pk) != ruta]
+        model.objects.bulk_update(cambios, ['ruta'], batch_size=500)
+        corregidas += len(cambios)
+    return corregidas
+
+
+def recalcular_contadores(Regimiento, Compania, Peloton, Escuadra, Miembro):
+    """Recalcula `efectivos_activos`/`efectivos_total` de todas las unidades
+    con una sola consulta agrupada sobre Miembro. Devuelve filas corregidas."""
+    conteos = defaultdict(lambda: [0, 0])
+    filas = (
+        Miembro.objects.order_by()
+        .values('ruta', 'activo')
+        .annotate(n=Count('pk'))
+        .values_list('ruta', 'activo', 'n')
+    )
+    for ruta, activo, n in filas:
+        for clave in segmentos_ruta(ruta):
+            conteo = conteos[clave]
+            conteo[0] += n if activo else 0
+            conteo[1] += n
+
+    corregidas = 0
+    for prefijo, model in (('R', Regimiento), ('C', Compania), ('P', Peloton), ('E', Escuadra)):
+        cambios = []
+        for pk, activos, total in model.objects.values_list('pk', 'efectivos_activos', 'efectivos_total'):
+            esperado = conteos.get((prefijo, pk), [0, 0])
+            if [activos, total] != esperado:
+                cambios.append(model(pk=pk, efectivos_activos=esperado[0], efectivos_total=esperado[1]))
+        model.objects.bulk_update(cambios, ['efectivos_activos', 'efectivos_total'], batch_size=500)
+        corregidas += len(cambios)
+    return corregidas
+
+
+def refrescar_etiquetas(Compania, Peloton, Escuadra, ruta=''):
+    """Recalcula `etiqueta` de los pelotones y escuadras bajo `ruta` ('' = todos)
+    con dos UPDATEs: pelotones desde su compañía y escuadras desde su pelotón."""
+    filtro = {'ruta__startswith': ruta} if ruta else {}
+    separador = Value(SEPARADOR_ETIQUETA)
+    Peloton.objects.filter(**filtro).update(etiqueta=Concat(
+        Subquery(Compania.objects.filter(pk=OuterRef('compania_id')).values('nombre')[:1]),
+        separador, F('nombre'), output_field=CharField(),
+    ))
+    Escuadra.objects.filter(**filtro).update(etiqueta=Concat(
+        Subquery(Peloton.objects.filter(pk=OuterRef('peloton_id')).values('etiqueta')[:1]),
+        separador, F('nombre'), output_field=CharField(),
+    ))
@@ -0,0 +1,160 @@
+"""
+Management command: benchmark_csv_export
+========================================
+Mide las exportaciones CSV de Personal y de auditoría: tiempo hasta el
+primer bloque (TTFB), tiempo total, tamaño y pico de memoria residente.
+
+Cada medición corre en un proceso propio (``--medir exportacion:modo``) para
+que el pico de RSS sea sólo de esa exportación:
+
+- streaming: la respuesta tal cual se sirve, leída bloque a bloque.
+- buffer: el mismo CSV juntado en un HttpResponse, como una respuesta sin
+  streaming (referencia de memoria).
+
+Con ``--crear N`` inserta N miembros y N entradas de auditoría de prueba
+antes de medir y las borra al terminar.
+
+    python manage.py benchmark_csv_export [--crear 200000]
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.contrib.admin.models import CHANGE, LogEntry
+from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.models import ContentType
+from django.core.management.base import BaseCommand, CommandError
+from django.http import HttpResponse
+
+from orbat.audit_views import _base_queryset, _exportar_csv
+from orbat.exportacion import exportar_miembros
+from orbat.models import Miembro
+
+EXPORTACIONES = {
+    'miembros': lambda: exportar_miembros(Miembro.objects.all()),
+    'auditoria': lambda: _exportar_csv(_base_queryset()),
+}
+MODOS = ('streaming', 'buffer')
+PREFIJO_PRUEBA = 'bench-csv-'
+
+
+def _memoria_mb(campo):
+    """VmRSS (actual) o VmHWM (pico) del proceso, en MB. Se leen de /proc y
+    no de ``ru_maxrss``: en Linux ese pico se hereda del proceso padre."""
+    try:
+        with open('/proc/self/status') as status:
+            for linea in status:
+                if linea.startswith(f'{campo}:'):
+                    return int(linea.split()[1]) / 1024
+    except OSError:
+        pass
+    # Sin /proc: ru_maxrss (KB en Linux, bytes en macOS)
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def medir(exportacion, modo):
+    """Corre una exportación en este proceso y devuelve sus métricas."""
+    rss_inicio = _memoria_mb('VmRSS')
+    try:
+        # Reinicia VmHWM al RSS actual
+        with open('/proc/self/clear_refs', 'w') as clear_refs:
+            clear_refs.write('5')
+    except OSError:
+        pass
+    inicio = time.perf_counter()
+    response = EXPORTACIONES[exportacion]()
+    ttfb = None
+    total_bytes = 0
+    if modo == 'buffer':
+        response = HttpResponse(b''.join(response.streaming_content), content_type='text/csv')
+        ttfb = time.perf_counter() - inicio
+        total_bytes = len(response.content)
+    else:
+        for bloque in response.streaming_content:
+            if ttfb is None:
+                ttfb = time.perf_counter() - inicio
+            total_bytes += len(bloque)
+    return {
+        'exportacion': exportacion,
+        'modo': modo,
+        'ttfb_ms': round(ttfb * 1000, 1),
+        'total_ms': round((time.perf_counter() - inicio) * 1000, 1),
+        'bytes': total_bytes,
+        'rss_pico_mb': round(_memoria_mb('VmHWM'), 1),
+        'rss_extra_mb': round(_memoria_mb('VmHWM') - rss_inicio, 1),
+    }
+
+
+class Command(BaseCommand):
+    help = "TTFB y pico de RSS de las exportaciones CSV (streaming contra buffer)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--crear', type=int, default=0,
+                            help='Miembros y entradas de auditoría de prueba a insertar (se borran al final).')
+        # Uso interno: una medición en este proceso (ver _en_proceso_propio)
+        parser.add_argument('--medir', default=None, help=argparse.SUPPRESS)
+
+    def handle(self, *args, **options):
+        if options['medir']:
+            exportacion, _, modo = options['medir'].partition(':')
+            if exportacion not in EXPORTACIONES or modo not in MODOS:
+                raise CommandError(f"--medir inválido: {options['medir']}")
+            self.stdout.write(json.dumps(medir(exportacion, modo)))
+            return
+
+        try:
+            if options['crear']:
+                self._crear(options['crear'])
+            self.stdout.write(f"{'exportación':<11} {'modo':<10} {'TTFB ms':>9} {'total ms':>9} {'MB':>8} {'RSS extra MB':>13}")
+            for exportacion in EXPORTACIONES:
+                for modo in MODOS:
+                    m = self._en_proceso_propio(exportacion, modo)
+                    self.stdout.write(
+                        f"{exportacion:<11} {modo:<10} {m['ttfb_ms']:>9} {m['total_ms']:>9} "
+                        f"{m['bytes'] / 2**20:>8.1f} {m['rss_extra_mb']:>13}"
+                    )
+        finally:
+            if options['crear']:
+                self._borrar()
+
+    def _en_proceso_propio(self, exportacion, modo):
+        resultado = subprocess.run(
+            [sys.executable, os.path.join(settings.BASE_DIR, 'manage.py'), 'benchmark_csv_export',
+             '--medir', f'{exportacion}:{modo}'],
+            capture_output=True, text=True, env=os.environ,
+        )
+        if resultado.returncode:
+            raise CommandError(resultado.stderr.strip())
+        return json.loads(resultado.stdout.strip().splitlines()[-1])
+
+    def _crear(self, n):
+        usuario, _ = get_user_model().objects.get_or_create(username=f'{PREFIJO_PRUEBA}usuario')
+        tipo = ContentType.objects.get_for_model(Miembro)
+        lote = 5000
+        for desde in range(0, n, lote):
+            hasta = min(desde + lote, n)
+            Miembro.objects.bulk_create(
+                Miembro(nombre_milsim=f'{PREFIJO_PRUEBA}{i}') for i in range(desde, hasta)
+            )
+            LogEntry.objects.bulk_create(
+                LogEntry(user=usuario, content_type=tipo, object_id=str(i), object_repr=f'{PREFIJO_PRUEBA}{i}',
+                         action_flag=CHANGE, change_message='Carga de prueba para benchmark_csv_export')
+                for i in range(desde, hasta)
+            )
+        self.stdout.write(f"Creados {n} miembros y {n} entradas de auditoría de prueba.")
+
+    def _borrar(self):
+        # Borrado directo (sin señales): la auditoría real no se puede borrar
+        # y los miembros de prueba no tienen unidad, cursos ni movimientos
+        usuarios = get_user_model().objects.filter(username=f'{PREFIJO_PRUEBA}usuario')
+        entradas = LogEntry.objects.filter(user__in=usuarios)
+        entradas._raw_delete(entradas.db)
+        miembros = Miembro.objects.filter(nombre_milsim__startswith=PREFIJO_PRUEBA)
+        miembros._raw_delete(miembros.db)
+        usuarios.delete()
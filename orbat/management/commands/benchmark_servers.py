@@ -0,0 +1,86 @@
+"""
+Management command: benchmark_servers
+=====================================
+Compara los dos modos de despliegue con la misma carga:
+
+- wsgi: ``gunicorn gestion_milsim.wsgi:application`` con workers sync.
+- asgi: ``uvicorn gestion_milsim.asgi:application`` con ORBAT_ASYNC_VIEWS=True.
+
+Levanta cada servidor como subproceso en un puerto local, espera a que
+responda y corre ``load_test_transfers --base-url`` contra él (traslados
+más lecturas del ORBAT y del tablero). Los servidores heredan el entorno,
+así que usan la misma base de datos que este comando.
+
+Requiere gunicorn y uvicorn instalados (ver requirements.txt).
+"""
+
+import os
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+
+SERVIDORES = {
+    'wsgi': lambda puerto, workers: [
+        sys.executable, '-m', 'gunicorn', 'gestion_milsim.wsgi:application',
+        '--bind', f'127.0.0.1:{puerto}', '--workers', str(workers), '--log-level', 'warning',
+    ],
+    'asgi': lambda puerto, workers: [
+        sys.executable, '-m', 'uvicorn', 'gestion_milsim.asgi:application',
+        '--host', '127.0.0.1', '--port', str(puerto), '--workers', str(workers), '--log-level', 'warning',
+    ],
+}
+
+
+class Command(BaseCommand):
+    help = "Compara gunicorn (WSGI, workers sync) contra uvicorn (ASGI, vistas async)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--servidor', choices=['wsgi', 'asgi', 'ambos'], default='ambos')
+        parser.add_argument('--server-workers', type=int, default=4, help='Procesos de cada servidor.')
+        parser.add_argument('--puerto', type=int, default=8765)
+        parser.add_argument('--workers', type=int, default=30, help='Clientes concurrentes.')
+        parser.add_argument('--peticiones', type=int, default=20, help='Peticiones por cliente.')
+        parser.add_argument('--lecturas', type=float, default=0.5, help='Fracción de lecturas (0-1).')
+        parser.add_argument('--seed', type=int, default=None)
+
+    def handle(self, *args, **options):
+        servidores = list(SERVIDORES) if options['servidor'] == 'ambos' else [options['servidor']]
+        base_url = f"http://127.0.0.1:{options['puerto']}"
+        for nombre in servidores:
+            entorno = {**os.environ, 'ORBAT_ASYNC_VIEWS': 'True' if nombre == 'asgi' else 'False'}
+            proceso = subprocess.Popen(SERVIDORES[nombre](options['puerto'], options['server_workers']), env=entorno)
+            try:
+                self._esperar(proceso, base_url)
+                self.stdout.write(self.style.MIGRATE_HEADING(f"== {nombre} ({options['server_workers']} workers)"))
+                call_command(
+                    'load_test_transfers',
+                    base_url=base_url,
+                    workers=options['workers'],
+                    peticiones=options['peticiones'],
+                    lecturas=options['lecturas'],
+                    seed=options['seed'],
+                    stdout=self.stdout,
+                )
+            finally:
+                proceso.terminate()
+                proceso.wait(timeout=30)
+
+    def _esperar(self, proceso, base_url, timeout=30):
+        limite = time.monotonic() + timeout
+        while time.monotonic() < limite:
+            if proceso.poll() is not None:
+                raise CommandError(f"El servidor terminó al arrancar (código {proceso.returncode}).")
+            try:
+                urllib.request.urlopen(base_url + reverse('orbat_visual'), timeout=2).close()
+                return
+            except urllib.error.HTTPError:
+                return
+            except OSError:
+                time.sleep(0.2)
+        raise CommandError(f"El servidor no respondió en {timeout}s.")
@@ -0,0 +1,118 @@
+"""
+Management command: benchmark_transfers
+=======================================
+Mide la contención de traslados concurrentes en los dos modos:
+
+- bloqueo: `transferir_lote` con `select_for_update` (orden de pk).
+- optimista: `transferir_optimista` con UPDATEs condicionados a `version`.
+
+Crea un regimiento temporal con escuadras casi llenas y lanza hilos que
+mueven e intercambian miembros entre pares de escuadras en ambos sentidos.
+Reporta operaciones/s, aplicados, conflictos (409), otros rechazos, errores de BD
+(deadlocks, "database is locked") y latencias p50/p95. Al final borra los
+datos temporales, salvo el historial de traslados (`MovimientoPersonal`),
+que es de solo inserción y queda en la base.
+
+En SQLite los escritores concurrentes se serializan a nivel de archivo:
+los números relevantes son los de PostgreSQL.
+"""
+
+import random
+import statistics
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, connection
+
+from orbat.management.sintetico import OrbatSintetico, percentil
+from orbat.models import Miembro
+from orbat.transfers import LoteRechazado, transferir_lote, transferir_optimista
+
+MODOS = {
+    'bloqueo': lambda mov: transferir_lote([mov]),
+    'optimista': transferir_optimista,
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara traslados con bloqueo vs. concurrencia optimista bajo contención. "
+        "Los movimientos de personal que genera quedan en el historial: usar una base de pruebas."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--modo', choices=['bloqueo', 'optimista', 'ambos'], default='ambos')
+        parser.add_argument('--workers', type=int, default=8, help='Hilos concurrentes.')
+        parser.add_argument('--traslados', type=int, default=50, help='Traslados por hilo.')
+        parser.add_argument('--escuadras', type=int, default=4, help='Escuadras del regimiento temporal.')
+        parser.add_argument('--seed', type=int, default=None)
+
+    def handle(self, *args, **options):
+        random.seed(options['seed'])
+        modos = list(MODOS) if options['modo'] == 'ambos' else [options['modo']]
+        # Una plaza libre por escuadra: hay traslados simples e intercambios
+        orbat = OrbatSintetico(options['escuadras'], 4)
+        escuadras, miembros = orbat.escuadras, orbat.miembros
+        try:
+            for modo in modos:
+                stats = self._correr(MODOS[modo], escuadras, miembros, options['workers'], options['traslados'])
+                latencias = stats['latencias']
+                self.stdout.write(
+                    f"{modo:<10} ops/s={len(latencias) / stats['duracion']:<8.1f} ok={stats['ok']:<5} "
+                    f"409={stats['conflictos']:<5} otros={stats['rechazos']:<4} errores_bd={stats['errores']:<4} "
+                    f"p50={percentil(latencias, 0.50) * 1000:.1f}ms "
+                    f"p95={percentil(latencias, 0.95) * 1000:.1f}ms "
+                    f"media={statistics.fmean(latencias) * 1000 if latencias else 0:.1f}ms"
+                )
+        finally:
+            orbat.borrar()
+        self.stdout.write(self.style.SUCCESS("Listo."))
+
+    def _correr(self, transferir, escuadras, miembros, workers, traslados):
+        stats = {'ok': 0, 'conflictos': 0, 'rechazos': 0, 'errores': 0, 'latencias': []}
+        candado = threading.Lock()
+
+        def trabajador():
+            for _ in range(traslados):
+                persona = random.choice(miembros)
+                destino = random.choice(escuadras)
+                try:
+                    ocupantes = list(Miembro.objects.filter(escuadra_id=destino).values_list('pk', flat=True))
+                except DatabaseError:
+                    with candado:
+                        stats['errores'] += 1
+                    continue
+                mov = {'persona_id': persona, 'escuadra_destino_id': destino}
+                if ocupantes:
+                    mov['persona_a_reemplazar_id'] = random.choice(ocupantes)
+                inicio = time.perf_counter()
+                try:
+                    transferir(mov)
+                    clave = 'ok'
+                except LoteRechazado as exc:
+                    clave = 'conflictos' if exc.status == 409 else 'rechazos'
+                except DatabaseError:
+                    clave = 'errores'
+                with candado:
+                    stats[clave] += 1
+                    stats['latencias'].append(time.perf_counter() - inicio)
+
+        def en_hilo():
+            try:
+                trabajador()
+            finally:
+                connection.close()
+
+        inicio = time.perf_counter()
+        if workers == 1:
+            # Sin hilos, en la conexión actual (útil en pruebas)
+            trabajador()
+        else:
+            hilos = [threading.Thread(target=en_hilo) for _ in range(workers)]
+            for hilo in hilos:
+                hilo.start()
+            for hilo in hilos:
+                hilo.join()
+        stats['duracion'] = time.perf_counter() - inicio
+        return stats
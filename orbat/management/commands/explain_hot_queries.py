@@ -0,0 +1,100 @@
+"""
+Management command: explain_hot_queries
+=======================================
+Corre EXPLAIN sobre las consultas de las vistas más usadas (ORBAT, tablero,
+traslados, efectivos por unidad y auditoría) en la base de datos actual y
+marca las que recorren una tabla completa.
+
+Los valores de ejemplo (escuadra, pelotón, usuario...) se toman de la
+propia BD, así que conviene correrlo contra una copia con datos de
+producción: con tablas chicas el planificador elige recorridos secuenciales
+aunque exista el índice.
+
+    python manage.py explain_hot_queries [--analyze] [--verbose] [--strict]
+"""
+
+import re
+from datetime import timedelta
+
+from django.contrib.admin.models import LogEntry
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from orbat.models import Compania, Escuadra, Miembro, Peloton, Regimiento
+from orbat.tree import _consultas
+from orbat.views import _consultas_tablero
+
+# Recorridos completos por motor: SQLite "SCAN tabla" sin índice, PostgreSQL
+# "Seq Scan on tabla", MySQL type=ALL
+SECUENCIALES = {
+    'sqlite': re.compile(r'\bSCAN (\w+)(?! USING (?:COVERING )?INDEX)(?!\w)'),
+    'postgresql': re.compile(r'Seq Scan on (\w+)'),
+    'mysql': re.compile(r'\btype\W+ALL\b.*?\btable\W+(\w+)|\btable\W+(\w+).*?\btype\W+ALL\b'),
+}
+
+
+def escaneos_secuenciales(vendor, plan):
+    """Tablas recorridas completas según el plan de EXPLAIN."""
+    patron = SECUENCIALES.get(vendor)
+    if patron is None:
+        return []
+    return sorted({next(g for g in m.groups() if g) for m in patron.finditer(plan)})
+
+
+def _primero(model):
+    return model.objects.order_by('pk').values_list('pk', flat=True).first() or 0
+
+
+def consultas_calientes():
+    """(nombre, queryset, recorrido completo esperado)."""
+    escuadra, peloton = _primero(Escuadra), _primero(Peloton)
+    compania, regimiento = _primero(Compania), _primero(Regimiento)
+    usuario = LogEntry.objects.values_list('user_id', flat=True).first() or 0
+    semana = timezone.now() - timedelta(days=7)
+    tablero_escuadras, tablero_miembros = _consultas_tablero({'peloton': peloton})
+    return [
+        # El ORBAT completo lee todo el personal: el recorrido es lo esperado
+        ('orbat: miembros (árbol completo)', _consultas()[4], True),
+        ('tablero: escuadras del pelotón', tablero_escuadras, False),
+        ('tablero: miembros activos', tablero_miembros, False),
+        ('traslado: ocupantes del destino', Miembro.objects.filter(escuadra_id=escuadra).values('id', 'nombre_milsim', 'rango'), False),
+        ('efectivos: activos de la escuadra', Miembro.objects.filter(escuadra_id=escuadra, activo=True).values('pk'), False),
+        ('efectivos: HQ activo del pelotón', Miembro.objects.filter(peloton_id=peloton, activo=True).values('pk'), False),
+        ('efectivos: HQ activo de la compañía', Miembro.objects.filter(compania_id=compania, activo=True).values('pk'), False),
+        ('efectivos: HQ activo del regimiento', Miembro.objects.filter(regimiento_id=regimiento, activo=True).values('pk'), False),
+        ('personal: lista por antigüedad', Miembro.objects.values('pk', 'nombre_milsim')[:50], False),
+        ('auditoría: últimos 7 días', LogEntry.objects.filter(action_time__gte=semana).order_by('-action_time')[:30], False),
+        ('auditoría: usuario + 7 días', LogEntry.objects.filter(user_id=usuario, action_time__gte=semana).order_by('-action_time')[:30], False),
+    ]
+
+
+class Command(BaseCommand):
+    help = "EXPLAIN de las consultas calientes; marca recorridos secuenciales."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--analyze', action='store_true', help='EXPLAIN ANALYZE (sólo PostgreSQL).')
+        parser.add_argument('--verbose', action='store_true', help='Imprime el plan completo.')
+        parser.add_argument('--strict', action='store_true',
+                            help='Termina con error si alguna consulta no esperada recorre una tabla completa.')
+
+    def handle(self, *args, **options):
+        vendor = connection.vendor
+        opciones = {'analyze': True} if options['analyze'] and vendor == 'postgresql' else {}
+        self.stdout.write(f"BD: {vendor}")
+        marcadas = []
+        for nombre, queryset, esperado in consultas_calientes():
+            plan = queryset.explain(**opciones)
+            tablas = escaneos_secuenciales(vendor, plan)
+            if not tablas:
+                self.stdout.write(self.style.SUCCESS(f"OK    {nombre}"))
+            elif esperado:
+                self.stdout.write(f"INFO  {nombre}: recorrido completo esperado ({', '.join(tablas)})")
+            else:
+                marcadas.append(nombre)
+                self.stdout.write(self.style.WARNING(f"SCAN  {nombre}: {', '.join(tablas)}"))
+            if options['verbose'] or (tablas and not esperado):
+                self.stdout.write('      ' + plan.replace('\n', '\n      '))
+        if marcadas and options['strict']:
+            raise CommandError(f"{len(marcadas)} consultas con recorrido secuencial.")
+        self.stdout.write(self.style.SUCCESS("Listo."))
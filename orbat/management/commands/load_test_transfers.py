@@ -0,0 +1,209 @@
+"""
+Management command: load_test_transfers
+=======================================
+Prueba de carga de `/api/transferir_personal/`: arma un ORBAT sintético y
+lanza traslados e intercambios concurrentes desde N hilos ("30 oficiales
+reorganizando el tablero a la vez").
+
+Por defecto las peticiones pasan por el cliente de pruebas de Django (en
+proceso, misma BD). Con ``--base-url http://127.0.0.1:8000`` van por HTTP a
+un servidor local que use la misma base de datos.
+
+Con ``--lecturas 0.5`` la mitad de las peticiones son lecturas (``/orbat/``
+y el tablero), para comparar despliegues WSGI y ASGI (ver
+benchmark_servers).
+
+Reporta throughput, latencias p50/p95/p99 (por tipo si hay lecturas),
+tasas de 409 (por código) y 500, y cuántos 500 fueron deadlocks,
+"database is locked" o excepciones no controladas.
+
+Corre contra la BD configurada: SQLite en desarrollo, o PostgreSQL local con
+``DATABASE_URL=postgres://... DEV_USE_SQLITE=False``. Al terminar borra el
+ORBAT sintético y sus claves de idempotencia, pero los movimientos de
+personal que generó quedan en el historial (solo inserción): usar una base
+de pruebas.
+"""
+
+import json
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, connection
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from orbat.management.sintetico import OrbatSintetico, percentil
+from orbat.models import Miembro
+
+
+class Command(BaseCommand):
+    help = (
+        "Prueba de carga concurrente de traslados e intercambios. "
+        "Los movimientos de personal que genera quedan en el historial: usar una base de pruebas."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=30, help='Hilos concurrentes (oficiales).')
+        parser.add_argument('--peticiones', type=int, default=20, help='Peticiones por hilo.')
+        parser.add_argument('--escuadras', type=int, default=24, help='Escuadras del ORBAT sintético.')
+        parser.add_argument('--por-escuadra', type=int, default=4, help='Miembros por escuadra.')
+        parser.add_argument('--intercambios', type=float, default=0.3,
+                            help='Fracción de peticiones que piden intercambio (0-1).')
+        parser.add_argument('--lecturas', type=float, default=0.0,
+                            help='Fracción de peticiones GET al ORBAT y al tablero (0-1).')
+        parser.add_argument('--modo', choices=['optimista', 'bloqueo'], default=None,
+                            help='ORBAT_TRANSFER_MODE (sólo con el cliente de pruebas).')
+        parser.add_argument('--base-url', default=None, help='Servidor local, ej: http://127.0.0.1:8000')
+        parser.add_argument('--keep', action='store_true', help='No borrar el ORBAT sintético.')
+        parser.add_argument('--seed', type=int, default=None)
+
+    def handle(self, *args, **options):
+        random.seed(options['seed'])
+        orbat = OrbatSintetico(options['escuadras'], options['por_escuadra'])
+        self.stdout.write(
+            f"ORBAT sintético {orbat.sufijo}: {len(orbat.escuadras)} escuadras, {len(orbat.miembros)} miembros. "
+            f"BD: {connection.vendor}. Destino: {options['base_url'] or 'cliente de pruebas'}."
+        )
+        ajustes = {}
+        if not options['base_url']:
+            # El cliente de pruebas usa el host 'testserver'
+            ajustes['ALLOWED_HOSTS'] = [*settings.ALLOWED_HOSTS, 'testserver']
+            if options['modo']:
+                ajustes['ORBAT_TRANSFER_MODE'] = options['modo']
+        try:
+            with override_settings(**ajustes):
+                registros, errores_bd, duracion = self._correr(orbat, options)
+        finally:
+            if not options['keep']:
+                orbat.borrar()
+        self._reportar(registros, errores_bd, duracion)
+
+    def _http(self, peticion):
+        try:
+            with urllib.request.urlopen(peticion, timeout=30) as resp:
+                return resp.status, resp.read()
+        except urllib.error.HTTPError as exc:
+            return exc.code, exc.read()
+
+    def _leer(self, base_url, client, url):
+        """GET de una página; devuelve (status, {})."""
+        if base_url is None:
+            return client.get(url).status_code, {}
+        return self._http(urllib.request.Request(base_url.rstrip('/') + url))[0], {}
+
+    def _enviar(self, base_url, client, payload, clave):
+        """Devuelve (status, cuerpo JSON)."""
+        cuerpo = json.dumps(payload)
+        if base_url is None:
+            resp = client.post(
+                reverse('transferir_personal'), cuerpo,
+                content_type='application/json', HTTP_IDEMPOTENCY_KEY=clave,
+            )
+            status, contenido = resp.status_code, resp.content
+        else:
+            status, contenido = self._http(urllib.request.Request(
+                base_url.rstrip('/') + reverse('transferir_personal'),
+                data=cuerpo.encode(), method='POST',
+                headers={'Content-Type': 'application/json', 'Idempotency-Key': clave},
+            ))
+        try:
+            return status, json.loads(contenido or b'{}')
+        except ValueError:
+            return status, {}
+
+    def _correr(self, orbat, options):
+        registros = []
+        # Fallos de las consultas propias de la prueba (no de la vista)
+        errores_bd = Counter()
+        candado = threading.Lock()
+
+        lecturas = [reverse('orbat_visual'), reverse('escuadras_dashboard')]
+
+        def oficial():
+            client = Client(raise_request_exception=False)
+            try:
+                for _ in range(options['peticiones']):
+                    if random.random() < options['lecturas']:
+                        inicio = time.perf_counter()
+                        status, _ = self._leer(options['base_url'], client, random.choice(lecturas))
+                        latencia = time.perf_counter() - inicio
+                        with candado:
+                            registros.append(('lectura', status, '', '', latencia))
+                        continue
+                    persona = random.choice(orbat.miembros)
+                    destino = random.choice(orbat.escuadras)
+                    payload = {'persona_id': persona, 'escuadra_destino_id': destino}
+                    if random.random() < options['intercambios']:
+                        try:
+                            ocupante = Miembro.objects.filter(escuadra_id=destino).values_list('pk', flat=True).first()
+                        except DatabaseError:
+                            with candado:
+                                errores_bd['ocupante'] += 1
+                            continue
+                        if ocupante:
+                            payload['persona_a_reemplazar_id'] = ocupante
+                    inicio = time.perf_counter()
+                    status, data = self._enviar(options['base_url'], client, payload, orbat.clave_idempotencia())
+                    latencia = time.perf_counter() - inicio
+                    with candado:
+                        registros.append(('traslado', status, data.get('error', ''), str(data.get('details', '')), latencia))
+            finally:
+                connection.close()
+
+        hilos = [threading.Thread(target=oficial) for _ in range(options['workers'])]
+        inicio = time.perf_counter()
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        return registros, sum(errores_bd.values()), time.perf_counter() - inicio
+
+    def _reportar(self, registros, errores_bd, duracion):
+        total = len(registros)
+        if not total:
+            self.stdout.write(self.style.WARNING("Sin peticiones."))
+            return
+        latencias = [r[4] for r in registros]
+        por_status = Counter(r[1] for r in registros)
+        conflictos = Counter(r[2] for r in registros if r[1] == 409)
+        detalles = [r[3].lower() for r in registros if r[1] >= 500]
+        deadlocks = sum('deadlock' in d for d in detalles)
+        bloqueada = sum('locked' in d for d in detalles)
+        # 500 sin JSON: la excepción escapó de la vista
+        no_controlados = sum(not d for d in detalles)
+        errores_5xx = sum(n for status, n in por_status.items() if status >= 500)
+
+        def pct(n):
+            return f"{n} ({n * 100 / total:.1f}%)"
+
+        def latencia(valores):
+            return (
+                f"p50={percentil(valores, 0.50) * 1000:.1f}ms "
+                f"p95={percentil(valores, 0.95) * 1000:.1f}ms "
+                f"p99={percentil(valores, 0.99) * 1000:.1f}ms"
+            )
+
+        self.stdout.write(f"Peticiones: {total} en {duracion:.2f}s -> {total / duracion:.1f} req/s")
+        self.stdout.write(f"Latencia: {latencia(latencias)}")
+        tipos = Counter(r[0] for r in registros)
+        if len(tipos) > 1:
+            for tipo in sorted(tipos):
+                self.stdout.write(f"  {tipo}: {tipos[tipo]} {latencia([r[4] for r in registros if r[0] == tipo])}")
+        self.stdout.write(f"200: {pct(por_status.get(200, 0))}")
+        self.stdout.write(
+            f"409: {pct(por_status.get(409, 0))} "
+            + ' '.join(f"{codigo}={n}" for codigo, n in conflictos.most_common())
+        )
+        self.stdout.write(f"5xx: {pct(errores_5xx)} deadlocks={deadlocks} database_locked={bloqueada} no_controlados={no_controlados}")
+        if errores_bd:
+            self.stdout.write(self.style.WARNING(f"errores_bd (consultas de la prueba, no enviadas): {errores_bd}"))
+        otros = {status: n for status, n in por_status.items() if status not in (200, 409) and status < 500}
+        if otros:
+            self.stdout.write(f"Otros: {otros}")
+        self.stdout.write(self.style.SUCCESS("Listo."))
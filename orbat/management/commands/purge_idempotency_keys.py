@@ -0,0 +1,18 @@
+"""
+Management command: purge_idempotency_keys
+==========================================
+Borra las claves de idempotencia vencidas (más viejas que
+ORBAT_IDEMPOTENCY_TTL). Pensado para correr periódicamente (cron / scheduler).
+"""
+
+from django.core.management.base import BaseCommand
+
+from orbat.idempotency import purgar_claves_vencidas
+
+
+class Command(BaseCommand):
+    help = "Borra las claves de idempotencia vencidas de las APIs de traslado."
+
+    def handle(self, *args, **options):
+        borradas = purgar_claves_vencidas()
+        self.stdout.write(self.style.SUCCESS(f"Listo. Claves borradas: {borradas}."))
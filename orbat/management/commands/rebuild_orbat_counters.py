@@ -0,0 +1,28 @@
+"""
+Management command: rebuild_orbat_counters
+=========================================
+Recalcula en bloque los efectivos (activos y totales) de cada unidad con
+una sola consulta agrupada sobre Miembro. Repara contadores desalineados
+por importaciones o cambios hechos fuera del ORM.
+"""
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from orbat.cache import bump_orbat_version
+from orbat.jerarquia import recalcular_contadores
+from orbat.models import Compania, Escuadra, Miembro, Peloton, Regimiento
+
+
+class Command(BaseCommand):
+    help = "Recalcula los contadores de efectivos de todas las unidades."
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            # Bloquea escrituras concurrentes de personal mientras se recalcula
+            list(Miembro.objects.select_for_update().values_list('pk', flat=True))
+            corregidas = recalcular_contadores(Regimiento, Compania, Peloton, Escuadra, Miembro)
+            if corregidas:
+                transaction.on_commit(bump_orbat_version)
+
+        self.stdout.write(self.style.SUCCESS(f"Listo. Unidades corregidas: {corregidas}."))
@@ -0,0 +1,25 @@
+"""
+Management command: rebuild_orbat_paths
+======================================
+Recalcula la ruta materializada (`ruta`) de todas las unidades y miembros.
+Útil tras importaciones masivas o cambios hechos fuera del ORM.
+"""
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from orbat.cache import bump_orbat_version
+from orbat.jerarquia import reconstruir_rutas
+from orbat.models import Compania, Escuadra, Miembro, Peloton, Regimiento
+
+
+class Command(BaseCommand):
+    help = "Recalcula la ruta jerárquica de unidades y miembros."
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            corregidas = reconstruir_rutas(Regimiento, Compania, Peloton, Escuadra, Miembro)
+            if corregidas:
+                transaction.on_commit(bump_orbat_version)
+
+        self.stdout.write(self.style.SUCCESS(f"Listo. Rutas corregidas: {corregidas}."))
@@ -0,0 +1,50 @@
+"""
+Utilidades compartidas por los comandos de carga y benchmark: un ORBAT
+sintético con nombres únicos y el cálculo de percentiles.
+"""
+
+import uuid
+
+from orbat.models import ClaveIdempotencia, Compania, Escuadra, Miembro, Peloton, Regimiento
+
+
+def percentil(valores, p):
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * p))]
+
+
+class OrbatSintetico:
+    """Regimiento temporal "BENCH <sufijo>" con `escuadras` escuadras de
+    `por_escuadra` miembros, repartidas en pelotones de 4 escuadras y
+    compañías de 3 pelotones.
+
+    `borrar()` elimina las unidades, los miembros y las claves de
+    idempotencia que empiecen por `prefijo_claves`. Los `MovimientoPersonal`
+    de la corrida no se borran: el historial es de solo inserción."""
+
+    def __init__(self, escuadras, por_escuadra):
+        self.sufijo = uuid.uuid4().hex[:8]
+        self.prefijo_claves = f"bench-{self.sufijo}-"
+        self.regimiento = Regimiento.objects.create(nombre=f"BENCH {self.sufijo}")
+        self.escuadras, self.miembros = [], []
+        compania = peloton = None
+        for i in range(escuadras):
+            if i % 12 == 0:
+                compania = Compania.objects.create(nombre=f"BENCH {self.sufijo} C{i // 12}", regimiento=self.regimiento)
+            if i % 4 == 0:
+                peloton = Peloton.objects.create(nombre=f"BENCH P{i // 4}", compania=compania)
+            escuadra = Escuadra.objects.create(nombre=f"BENCH {i}", peloton=peloton)
+            self.escuadras.append(escuadra.pk)
+            for j in range(por_escuadra):
+                miembro = Miembro.objects.create(nombre_milsim=f"bench-{self.sufijo}-{i}-{j}", escuadra=escuadra)
+                self.miembros.append(miembro.pk)
+
+    def clave_idempotencia(self):
+        return f"{self.prefijo_claves}{uuid.uuid4().hex}"
+
+    def borrar(self):
+        ClaveIdempotencia.objects.filter(clave__startswith=self.prefijo_claves).delete()
+        Miembro.objects.filter(pk__in=self.miembros).delete()
+        self.regimiento.delete()
@@ -1,20 +1,39 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
 from django.contrib import messages
 from django.shortcuts import redirect
 from django.urls import reverse
 
 
 class BlockAdminCredentialChangesMiddleware:
-    """Bloquea cambios de credenciales desde el admin para cualquier usuario autenticado."""
+    """Bloquea cambios de credenciales desde el admin para cualquier usuario autenticado.
+
+    Sirve tanto bajo WSGI como bajo ASGI: en modo async sólo consulta la
+    sesión (en un hilo) cuando la ruta es la de cambio de contraseña."""
+
+    sync_capable = True
+    async_capable = True
 
     def __init__(self, get_response):
         self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
 
-    def __call__(self, request):
-        if request.user.is_authenticated:
-            admin_password_change_path = reverse('admin:password_change')
-            admin_password_change_done_path = reverse('admin:password_change_done')
-            if request.path in {admin_password_change_path, admin_password_change_done_path}:
-                messages.error(request, 'El cambio de contraseña desde esta interfaz está deshabilitado.')
-                return redirect('admin:index')
+    def _es_cambio_de_clave(self, request):
+        return request.path in {reverse('admin:password_change'), reverse('admin:password_change_done')}
 
+    def _bloquear(self, request):
+        messages.error(request, 'El cambio de contraseña desde esta interfaz está deshabilitado.')
+        return redirect('admin:index')
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if self._es_cambio_de_clave(request) and request.user.is_authenticated:
+            return self._bloquear(request)
         return self.get_response(request)
+
+    async def __acall__(self, request):
+        if self._es_cambio_de_clave(request):
+            if await sync_to_async(lambda: request.user.is_authenticated)():
+                return await sync_to_async(self._bloquear)(request)
+        return await self.get_response(request)
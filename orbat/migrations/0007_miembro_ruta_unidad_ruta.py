@@ -0,0 +1,51 @@
+# Generated by Django 4.2.28 on 2026-10-17 02:55
+
+from django.db import migrations, models
+
+from orbat.jerarquia import reconstruir_rutas
+
+
+def backfill_rutas(apps, schema_editor):
+    reconstruir_rutas(
+        apps.get_model('orbat', 'Regimiento'),
+        apps.get_model('orbat', 'Compania'),
+        apps.get_model('orbat', 'Peloton'),
+        apps.get_model('orbat', 'Escuadra'),
+        apps.get_model('orbat', 'Miembro'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orbat', '0006_fix_miembro_duplicates_unique_nick'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='compania',
+            name='ruta',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='escuadra',
+            name='ruta',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='miembro',
+            name='ruta',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='peloton',
+            name='ruta',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='regimiento',
+            name='ruta',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=100),
+        ),
+        migrations.RunPython(backfill_rutas, migrations.RunPython.noop),
+    ]
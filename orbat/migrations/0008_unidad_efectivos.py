@@ -0,0 +1,66 @@
+# Generated by Django 4.2.28 on 2026-10-17 02:57
+
+from django.db import migrations, models
+
+from orbat.jerarquia import recalcular_contadores
+
+
+def backfill_efectivos(apps, schema_editor):
+    recalcular_contadores(
+        apps.get_model('orbat', 'Regimiento'),
+        apps.get_model('orbat', 'Compania'),
+        apps.get_model('orbat', 'Peloton'),
+        apps.get_model('orbat', 'Escuadra'),
+        apps.get_model('orbat', 'Miembro'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orbat', '0007_miembro_ruta_unidad_ruta'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='compania',
+            name='efectivos_activos',
+            field=models.IntegerField(default=0, editable=False, verbose_name='Efectivos activos'),
+        ),
+        migrations.AddField(
+            model_name='compania',
+            name='efectivos_total',
+            field=models.IntegerField(default=0, editable=False, verbose_name='Efectivos totales'),
+        ),
+        migrations.AddField(
+            model_name='escuadra',
+            name='efectivos_activos',
+            field=models.IntegerField(default=0, editable=False, verbose_name='Efectivos activos'),
+        ),
+        migrations.AddField(
+            model_name='escuadra',
+            name='efectivos_total',
+            field=models.IntegerField(default=0, editable=False, verbose_name='Efectivos totales'),
+        ),
+        migrations.AddField(
+            model_name='peloton',
+            name='efectivos_activos',
+            field=models.IntegerField(default=0, editable=False, verbose_name='Efectivos activos'),
+        ),
+        migrations.AddField(
+            model_name='peloton',
+            name='efectivos_total',
+            field=models.IntegerField(default=0, editable=False, verbose_name='Efectivos totales'),
+        ),
+        migrations.AddField(
+            model_name='regimiento',
+            name='efectivos_activos',
+            field=models.IntegerField(default=0, editable=False, verbose_name='Efectivos activos'),
+        ),
+        migrations.AddField(
+            model_name='regimiento',
+            name='efectivos_total',
+            field=models.IntegerField(default=0, editable=False, verbose_name='Efectivos totales'),
+        ),
+        migrations.RunPython(backfill_efectivos, migrations.RunPython.noop),
+    ]
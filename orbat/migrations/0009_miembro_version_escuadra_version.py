@@ -0,0 +1,23 @@
+# Generated by Django 4.2.28 on 2026-10-17 03:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orbat', '0008_unidad_efectivos'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='escuadra',
+            name='version',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='miembro',
+            name='version',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
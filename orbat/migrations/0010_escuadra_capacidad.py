@@ -0,0 +1,18 @@
+# Generated by Django 4.2.28 on 2026-10-17 03:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orbat', '0009_miembro_version_escuadra_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='escuadra',
+            name='capacidad',
+            field=models.PositiveSmallIntegerField(default=5, help_text='Plazas de la escuadra (ej: 4 para un fireteam, 3 para una tripulación)'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.28 on 2026-10-17 03:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orbat', '0010_escuadra_capacidad'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClaveIdempotencia',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('clave', models.CharField(max_length=255)),
+                ('endpoint', models.CharField(max_length=100)),
+                ('huella', models.CharField(max_length=32)),
+                ('status', models.PositiveSmallIntegerField(default=0)),
+                ('respuesta', models.TextField(blank=True, default='')),
+                ('creada', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+            options={
+                'verbose_name': 'Clave de idempotencia',
+                'verbose_name_plural': 'Claves de idempotencia',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='claveidempotencia',
+            constraint=models.UniqueConstraint(fields=('endpoint', 'clave'), name='orbat_idempotencia_unica'),
+        ),
+    ]
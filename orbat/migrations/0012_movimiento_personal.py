@@ -0,0 +1,34 @@
+# Generated by Django 4.2.28 on 2026-10-17 03:12
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('orbat', '0011_clave_idempotencia'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MovimientoPersonal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ruta_origen', models.CharField(blank=True, default='', max_length=100)),
+                ('ruta_destino', models.CharField(blank=True, default='', max_length=100)),
+                ('tipo', models.CharField(choices=[('traslado', 'Traslado'), ('intercambio', 'Intercambio')], default='traslado', max_length=12)),
+                ('fecha', models.DateTimeField(default=django.utils.timezone.now)),
+                ('actor', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+                ('miembro', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='movimientos', to='orbat.miembro')),
+            ],
+            options={
+                'verbose_name': 'Movimiento de personal',
+                'verbose_name_plural': 'Movimientos de personal',
+                'indexes': [models.Index(fields=['miembro', '-fecha'], name='orbat_mov_miembro_fecha'), models.Index(fields=['ruta_destino', 'fecha'], name='orbat_mov_destino_fecha', opclasses=['varchar_pattern_ops', 'timestamptz_ops'])],
+            },
+        ),
+    ]
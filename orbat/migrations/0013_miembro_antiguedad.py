@@ -0,0 +1,45 @@
+# Generated by Django 4.2.28 on 2026-10-17 03:20
+
+from django.db import migrations, models
+from django.db.models import Case, Value, When
+
+# Copia congelada de ANTIGUEDAD_RANGO al escribir la migración: si el
+# modelo cambia sus rangos, esta migración no debe cambiar con él.
+ANTIGUEDAD_RANGO = {
+    'COL': 23, 'LTC': 22, 'MAJ': 21, 'CPT': 20, '1LT': 19, '2LT': 18,
+    'CW5': 17, 'CW4': 16, 'CW3': 15, 'CW2': 14, 'WO1': 13, 'CSM': 12,
+    'SGM': 11, '1SG': 10, 'MSG': 9, 'SFC': 8, 'SSG': 7, 'SGT': 6,
+    'CPL': 5, 'SPC': 4, 'PFC': 3, 'PV2': 2, 'PV1': 1,
+}
+
+
+def backfill_antiguedad(apps, schema_editor):
+    apps.get_model('orbat', 'Miembro').objects.update(antiguedad=Case(
+        *(When(rango=codigo, then=Value(orden)) for codigo, orden in ANTIGUEDAD_RANGO.items()),
+        default=Value(0),
+        output_field=models.PositiveSmallIntegerField(),
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orbat', '0012_movimiento_personal'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='miembro',
+            options={'ordering': ['-antiguedad', 'nombre_milsim'], 'verbose_name': 'Operador', 'verbose_name_plural': '5. Personal'},
+        ),
+        migrations.AddField(
+            model_name='miembro',
+            name='antiguedad',
+            field=models.PositiveSmallIntegerField(default=1, editable=False),
+        ),
+        migrations.RunPython(backfill_antiguedad, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='miembro',
+            index=models.Index(fields=['-antiguedad', 'nombre_milsim'], name='orbat_miembro_antig_nombre'),
+        ),
+    ]
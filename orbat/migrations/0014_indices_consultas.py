@@ -0,0 +1,44 @@
+# Generated by Django 4.2.28 on 2026-10-17 03:22
+
+from django.db import migrations, models
+
+# LogEntry es de django.contrib.admin: sus índices van en SQL (válido en
+# SQLite y PostgreSQL). Auditoría: rango de fechas, solo o con usuario/modelo.
+INDICES_AUDITORIA = [
+    ('orbat_log_fecha', 'action_time'),
+    ('orbat_log_user_fecha', 'user_id, action_time'),
+    ('orbat_log_ct_fecha', 'content_type_id, action_time'),
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orbat', '0013_miembro_antiguedad'),
+        ('admin', '0003_logentry_add_action_flag_choices'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='miembro',
+            index=models.Index(fields=['escuadra', 'activo'], name='orbat_miembro_sqd_activo'),
+        ),
+        migrations.AddIndex(
+            model_name='miembro',
+            index=models.Index(fields=['peloton', 'activo'], name='orbat_miembro_plt_activo'),
+        ),
+        migrations.AddIndex(
+            model_name='miembro',
+            index=models.Index(fields=['compania', 'activo'], name='orbat_miembro_cia_activo'),
+        ),
+        migrations.AddIndex(
+            model_name='miembro',
+            index=models.Index(fields=['regimiento', 'activo'], name='orbat_miembro_reg_activo'),
+        ),
+    ] + [
+        migrations.RunSQL(
+            f'CREATE INDEX IF NOT EXISTS {nombre} ON django_admin_log ({columnas})',
+            f'DROP INDEX IF EXISTS {nombre}',
+        )
+        for nombre, columnas in INDICES_AUDITORIA
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 4.2.28 on 2026-10-17 03:24
+
+from django.db import migrations, models
+
+
+def normalizar_asignaciones(apps, schema_editor):
+    # Conserva sólo la FK más específica (la misma precedencia que `ruta`)
+    Miembro = apps.get_model('orbat', 'Miembro')
+    Miembro.objects.filter(escuadra__isnull=False).update(peloton=None, compania=None, regimiento=None)
+    Miembro.objects.filter(peloton__isnull=False).update(compania=None, regimiento=None)
+    Miembro.objects.filter(compania__isnull=False).update(regimiento=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orbat', '0014_indices_consultas'),
+    ]
+
+    operations = [
+        migrations.RunPython(normalizar_asignaciones, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='miembro',
+            constraint=models.CheckConstraint(check=models.Q(models.Q(('compania__isnull', True), ('escuadra__isnull', True), ('peloton__isnull', True), ('regimiento__isnull', True)), models.Q(('compania__isnull', True), ('escuadra__isnull', True), ('peloton__isnull', True), ('regimiento__isnull', False)), models.Q(('compania__isnull', False), ('escuadra__isnull', True), ('peloton__isnull', True), ('regimiento__isnull', True)), models.Q(('compania__isnull', True), ('escuadra__isnull', True), ('peloton__isnull', False), ('regimiento__isnull', True)), models.Q(('compania__isnull', True), ('escuadra__isnull', False), ('peloton__isnull', True), ('regimiento__isnull', True)), _connector='OR'), name='orbat_miembro_una_unidad', violation_error_message='Un miembro solo puede estar asignado a UN nivel de la estructura (Regimiento, Compañía, Pelotón o Escuadra), no a varios a la vez.'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.28 on 2026-10-17 03:26
+
+from django.db import migrations, models
+
+from orbat.jerarquia import refrescar_etiquetas
+
+
+def backfill_etiquetas(apps, schema_editor):
+    refrescar_etiquetas(
+        apps.get_model('orbat', 'Compania'),
+        apps.get_model('orbat', 'Peloton'),
+        apps.get_model('orbat', 'Escuadra'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orbat', '0015_miembro_una_unidad'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='escuadra',
+            name='etiqueta',
+            field=models.CharField(blank=True, default='', editable=False, max_length=310),
+        ),
+        migrations.AddField(
+            model_name='peloton',
+            name='etiqueta',
+            field=models.CharField(blank=True, default='', editable=False, max_length=210),
+        ),
+        migrations.RunPython(backfill_etiquetas, migrations.RunPython.noop),
+    ]
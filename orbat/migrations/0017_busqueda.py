@@ -0,0 +1,25 @@
+# Generated by Django 4.2.28 on 2026-10-17 09:10
+
+from django.db import migrations
+
+from orbat.busqueda import borrar_indices, crear_indices
+
+
+def crear(apps, schema_editor):
+    crear_indices(schema_editor)
+
+
+def borrar(apps, schema_editor):
+    borrar_indices(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orbat', '0016_unidad_etiqueta'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear, borrar),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 4.2.28 on 2026-10-17 04:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orbat', '0017_busqueda'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='claveidempotencia',
+            name='orbat_idempotencia_unica',
+        ),
+        migrations.AddField(
+            model_name='claveidempotencia',
+            name='titular',
+            field=models.CharField(blank=True, default='', max_length=50),
+        ),
+        migrations.AddConstraint(
+            model_name='claveidempotencia',
+            constraint=models.UniqueConstraint(fields=('endpoint', 'titular', 'clave'), name='orbat_idempotencia_unica'),
+        ),
+    ]
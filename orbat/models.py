@@ -1,9 +1,81 @@
-from django.db import models
+from collections import defaultdict
+
+from django.db import models, transaction
 from django.contrib.auth.models import User
-from django.core.exceptions import ValidationError
+from django.utils import timezone
+from django.db.models import Case, F, Q, Value, When
+from django.db.models.lookups import Exact
+from django.db.models.functions import Concat, Substr
+
+from .jerarquia import refrescar_etiquetas, segmentos_ruta
+
+
+# Ruta materializada de la jerarquía
+class UnidadBase(models.Model):
+    """Mantiene `ruta`, el camino materializado de la unidad (ej. 'R1/C3/P7/').
+
+    "Todo lo que cuelga de X, a cualquier profundidad" es un único
+    `ruta__startswith=X.ruta`, resuelto por el índice de la columna.
+    """
+    PREFIJO = ''
+    CAMPO_PADRE = None
+    CAMPOS_DERIVADOS = ('ruta', 'efectivos_activos', 'efectivos_total', 'etiqueta')
+    # Si el nombre de la unidad forma parte de las etiquetas de su subárbol
+    NOMBRE_EN_ETIQUETAS = True
+
+    ruta = models.CharField(max_length=100, blank=True, default='', editable=False, db_index=True)
+    # Contadores desnormalizados de todo el subárbol (ver ajustar_contadores)
+    efectivos_activos = models.IntegerField(default=0, editable=False, verbose_name="Efectivos activos")
+    efectivos_total = models.IntegerField(default=0, editable=False, verbose_name="Efectivos totales")
+
+    class Meta:
+        abstract = True
+
+    def calcular_ruta(self):
+        # Se lee la ruta del padre de la BD: la instancia cacheada puede estar desfasada
+        ruta_padre = ''
+        if self.CAMPO_PADRE:
+            field = self._meta.get_field(self.CAMPO_PADRE)
+            ruta_padre = field.related_model.objects.filter(
+                pk=getattr(self, field.attname)
+            ).values_list('ruta', flat=True).first() or ''
+        return f"{ruta_padre}{self.PREFIJO}{self.pk}/"
+
+    def save(self, *args, **kwargs):
+        # Los campos derivados sólo se escriben con UPDATEs dirigidos: una
+        # instancia en memoria no debe pisar contadores ni rutas más nuevos.
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            kwargs['update_fields'] = [
+                f.name for f in self._meta.concrete_fields
+                if not f.primary_key and f.name not in self.CAMPOS_DERIVADOS
+            ]
+        update_fields = kwargs.get('update_fields')
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            vieja = type(self).objects.select_for_update().filter(pk=self.pk).values_list('ruta', flat=True).get()
+            self.ruta = self.calcular_ruta()
+            if self.ruta != vieja:
+                type(self).objects.filter(pk=self.pk).update(ruta=self.ruta)
+                if vieja:
+                    reubicar_subarbol(self, vieja, self.ruta)
+            if self.NOMBRE_EN_ETIQUETAS and (update_fields is None or {'nombre', self.CAMPO_PADRE} & set(update_fields)):
+                # Nombre o padre nuevos: etiquetas de toda la rama en bloque
+                refrescar_etiquetas(Compania, Peloton, Escuadra, self.ruta)
+                if hasattr(self, 'etiqueta'):
+                    self.etiqueta = type(self).objects.filter(pk=self.pk).values_list('etiqueta', flat=True).get()
+
+    def miembros_subordinados(self):
+        """Miembros asignados a esta unidad o a cualquiera de sus subordinadas."""
+        if not self.ruta:
+            return Miembro.objects.none()
+        return Miembro.objects.filter(ruta__startswith=self.ruta)
+
 
 # Nivel 1: Regimiento
-class Regimiento(models.Model):
+class Regimiento(UnidadBase):
+    PREFIJO = 'R'
+    NOMBRE_EN_ETIQUETAS = False
+
     nombre = models.CharField(max_length=100, default="75th Ranger Regiment")
     descripcion = models.TextField(blank=True, verbose_name="Misión / Historia")
     comandante = models.CharField(
@@ -20,15 +92,16 @@ class Regimiento(models.Model):
         return self.nombre
     
     def total_efectivos(self):
-        # Cuenta miembros activos del regimiento y su estructura subordinada
-        return Miembro.objects.filter(
-            models.Q(escuadra__peloton__compania__regimiento=self) | 
-            models.Q(regimiento=self),
-            activo=True
-        ).distinct().count()
+        # Miembros activos del regimiento y su estructura subordinada: el
+        # contador de la fila (ver ajustar_contadores), leído por pk sin COUNT.
+        # Para todas las unidades a la vez, ver strength.py.
+        return type(self).objects.filter(pk=self.pk).values_list('efectivos_activos', flat=True).first() or 0
 
 # Nivel 2: Compañía
-class Compania(models.Model):
+class Compania(UnidadBase):
+    PREFIJO = 'C'
+    CAMPO_PADRE = 'regimiento'
+
     nombre = models.CharField(max_length=100, help_text="Ej: Alpha Company")
     regimiento = models.ForeignKey(
         Regimiento, 
@@ -49,23 +122,32 @@ class Compania(models.Model):
         return f"Cía. {self.nombre}"
 
 # Nivel 3: Pelotón
-class Peloton(models.Model):
+class Peloton(UnidadBase):
+    PREFIJO = 'P'
+    CAMPO_PADRE = 'compania'
+
     nombre = models.CharField(max_length=100, help_text="Ej: 1er Pelotón")
     compania = models.ForeignKey(
         Compania, 
         on_delete=models.CASCADE, 
         related_name="pelotones"
     )
+    # "Compañía | Pelotón", derivada al guardar (ver refrescar_etiquetas)
+    etiqueta = models.CharField(max_length=210, blank=True, default='', editable=False)
 
     class Meta:
         verbose_name = "3. Pelotón"
         verbose_name_plural = "3. Pelotones"
 
     def __str__(self):
-        return f"{self.nombre} [{self.compania.nombre}]"
+        return self.etiqueta or self.nombre
 
 # Nivel 4: Escuadra
-class Escuadra(models.Model):
+class Escuadra(UnidadBase):
+    PREFIJO = 'E'
+    CAMPO_PADRE = 'peloton'
+    CAMPOS_DERIVADOS = UnidadBase.CAMPOS_DERIVADOS + ('version',)
+
     nombre = models.CharField(max_length=100, help_text="Ej: Escuadra 1-1")
     peloton = models.ForeignKey(
         Peloton, 
@@ -77,13 +159,21 @@ class Escuadra(models.Model):
         blank=True, 
         help_text="Ej: Viking 1-1"
     )
+    capacidad = models.PositiveSmallIntegerField(
+        default=5,
+        help_text="Plazas de la escuadra (ej: 4 para un fireteam, 3 para una tripulación)"
+    )
+    # Control de concurrencia optimista: sube con cada cambio en su plantilla
+    version = models.PositiveIntegerField(default=0, editable=False)
+    # "Compañía | Pelotón | Escuadra", derivada al guardar (ver refrescar_etiquetas)
+    etiqueta = models.CharField(max_length=310, blank=True, default='', editable=False)
 
     class Meta:
         verbose_name = "4. Escuadra"
         verbose_name_plural = "4. Escuadras"
 
     def __str__(self):
-        return f"{self.peloton.compania.nombre} | {self.nombre}"
+        return self.etiqueta or self.nombre
 
 # Catálogo académico
 class Rango(models.TextChoices):
@@ -115,6 +205,20 @@ class Rango(models.TextChoices):
     PV2 = 'PV2', 'Soldado (PV2)'
     PV1 = 'PV1', 'Recluta (PV1)'
 
+# Antigüedad de cada rango (mayor = más antiguo), en el orden de Rango. Los
+# códigos no ordenan bien como texto ('SGT' > 'COL').
+ANTIGUEDAD_RANGO = {rango.value: len(Rango) - i for i, rango in enumerate(Rango)}
+
+
+def antiguedad_por_rango(rango=F('rango')):
+    """Expresión SQL que traduce un código de rango (o expresión) a su antigüedad."""
+    return Case(
+        *(When(Exact(rango, codigo), then=Value(orden)) for codigo, orden in ANTIGUEDAD_RANGO.items()),
+        default=Value(0),
+        output_field=models.PositiveSmallIntegerField(),
+    )
+
+
 class Curso(models.Model):
     sigla = models.CharField(max_length=10)
     nombre = models.CharField(max_length=200)
@@ -123,8 +227,82 @@ class Curso(models.Model):
     def __str__(self):
         return f"[{self.sigla}] {self.nombre}"
 
+class MiembroQuerySet(models.QuerySet):
+    # `antiguedad` acompaña a `rango` también en las escrituras masivas
+    def update(self, **kwargs):
+        if 'rango' in kwargs and 'antiguedad' not in kwargs:
+            rango = kwargs['rango']
+            if hasattr(rango, 'resolve_expression'):
+                kwargs['antiguedad'] = antiguedad_por_rango(rango)
+            else:
+                kwargs['antiguedad'] = ANTIGUEDAD_RANGO.get(rango, 0)
+        return super().update(**kwargs)
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        for obj in objs:
+            obj.antiguedad = ANTIGUEDAD_RANGO.get(obj.rango, 0)
+        return super().bulk_create(objs, *args, **kwargs)
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        if 'rango' in fields:
+            objs = list(objs)
+            for obj in objs:
+                obj.antiguedad = ANTIGUEDAD_RANGO.get(obj.rango, 0)
+            fields = [*fields, 'antiguedad']
+        return super().bulk_update(objs, fields, *args, **kwargs)
+
+    def bajo_unidad(self, unidad):
+        """Miembros de `unidad` y de todas sus subordinadas (un solo lookup indexado)."""
+        if not unidad.ruta:
+            return self.none()
+        return self.filter(ruta__startswith=unidad.ruta)
+
+    def refrescar_rutas(self):
+        """Recalcula `ruta` desde las FKs de unidad (tras borrados o updates masivos).
+
+        Devuelve cuántos miembros cambiaron de ruta; los contadores de las
+        unidades se ajustan en la misma transacción.
+        """
+        cambiados, movimientos = [], []
+        for miembro in self.select_related('regimiento', 'compania', 'peloton', 'escuadra'):
+            nueva = miembro.calcular_ruta()
+            if nueva != miembro.ruta:
+                movimientos += [(miembro.ruta, -miembro.activo, -1), (nueva, miembro.activo, 1)]
+                miembro.ruta = nueva
+                cambiados.append(miembro)
+        with transaction.atomic():
+            self.model.objects.bulk_update(cambiados, ['ruta'], batch_size=500)
+            ajustar_contadores(movimientos)
+        return len(cambiados)
+
+    def set_activo(self, activo):
+        """`update(activo=...)` que mantiene los contadores de las unidades."""
+        with transaction.atomic():
+            cambiar = list(self.exclude(activo=activo).select_for_update().values_list('pk', 'ruta'))
+            updated = self.model.objects.filter(pk__in=[pk for pk, _ in cambiar]).update(activo=activo)
+            signo = 1 if activo else -1
+            ajustar_contadores((ruta, signo, 0) for _, ruta in cambiar)
+        return updated
+
+
 # Personal
+CAMPOS_UNIDAD_MIEMBRO = ('regimiento', 'compania', 'peloton', 'escuadra')
+
+
+def _a_lo_sumo_una(campos):
+    """Q que se cumple si a lo sumo uno de `campos` tiene valor."""
+    nulos = {f'{campo}__isnull': True for campo in campos}
+    condicion = Q(**nulos)
+    for campo in campos:
+        condicion |= Q(**{**nulos, f'{campo}__isnull': False})
+    return condicion
+
+
 class Miembro(models.Model):
+    CAMPOS_UNIDAD = CAMPOS_UNIDAD_MIEMBRO
+    CAMPOS_DERIVADOS = ('version',)
+
     # Identidad y sistema
     usuario = models.OneToOneField(User, on_delete=models.SET_NULL, null=True, blank=True)
     nombre_milsim = models.CharField(max_length=100, verbose_name="Nick", unique=True)
@@ -133,6 +311,8 @@ class Miembro(models.Model):
         choices=Rango.choices, 
         default=Rango.PV1
     )
+    # Derivada de `rango` al guardar; ordena el personal por índice
+    antiguedad = models.PositiveSmallIntegerField(default=ANTIGUEDAD_RANGO[Rango.PV1], editable=False)
     rol = models.CharField(max_length=100, default="Fusilero")
     
     # Asignación en la estructura (HQ o escuadra)
@@ -140,6 +320,10 @@ class Miembro(models.Model):
     compania = models.ForeignKey(Compania, on_delete=models.SET_NULL, null=True, blank=True)
     peloton = models.ForeignKey(Peloton, on_delete=models.SET_NULL, null=True, blank=True)
     escuadra = models.ForeignKey(Escuadra, on_delete=models.SET_NULL, null=True, blank=True)
+    # Ruta de la unidad efectiva (la más específica); derivada, ver UnidadBase
+    ruta = models.CharField(max_length=100, blank=True, default='', editable=False, db_index=True)
+    # Control de concurrencia optimista: sube con cada traslado (ver transfers.py)
+    version = models.PositiveIntegerField(default=0, editable=False)
     
     # Estado y datos extra
     activo = models.BooleanField(default=True)
@@ -149,27 +333,248 @@ class Miembro(models.Model):
     cursos = models.ManyToManyField(Curso, blank=True)
     notas_admin = models.TextField(blank=True, null=True, verbose_name="Notas de Administración")
 
+    objects = MiembroQuerySet.as_manager()
+
     class Meta:
         verbose_name = "Operador"
         verbose_name_plural = "5. Personal"
-        ordering = ['-rango', 'nombre_milsim']
-
-    def clean(self):
-        super().clean()
-        # Solo se puede asignar a UN nivel jerárquico
-        niveles = [
-            ('regimiento', self.regimiento),
-            ('compania', self.compania),
-            ('peloton', self.peloton),
-            ('escuadra', self.escuadra),
+        ordering = ['-antiguedad', 'nombre_milsim']
+        indexes = [
+            models.Index(fields=['-antiguedad', 'nombre_milsim'], name='orbat_miembro_antig_nombre'),
+            # Filtros por unidad + activo: tablero, traslados, HQ del ORBAT y efectivos
+            models.Index(fields=['escuadra', 'activo'], name='orbat_miembro_sqd_activo'),
+            models.Index(fields=['peloton', 'activo'], name='orbat_miembro_plt_activo'),
+            models.Index(fields=['compania', 'activo'], name='orbat_miembro_cia_activo'),
+            models.Index(fields=['regimiento', 'activo'], name='orbat_miembro_reg_activo'),
+        ]
+        constraints = [
+            # Sólo se guarda la unidad efectiva; la jerarquía superior se
+            # deriva de ella (ver `jerarquia()` y `ruta`)
+            models.CheckConstraint(
+                check=_a_lo_sumo_una(CAMPOS_UNIDAD_MIEMBRO),
+                name='orbat_miembro_una_unidad',
+                violation_error_message=(
+                    "Un miembro solo puede estar asignado a UN nivel de la estructura "
+                    "(Regimiento, Compañía, Pelotón o Escuadra), no a varios a la vez."
+                ),
+            ),
         ]
-        asignados = [nombre for nombre, valor in niveles if valor is not None]
-        if len(asignados) > 1:
-            raise ValidationError(
-                "Un miembro solo puede estar asignado a UN nivel de la estructura "
-                "(Regimiento, Compañía, Pelotón o Escuadra), no a varios a la vez. "
-                f"Actualmente asignado a: {', '.join(asignados)}."
+
+    @property
+    def unidad(self):
+        """Unidad efectiva: la asignación más específica."""
+        return self.escuadra or self.peloton or self.compania or self.regimiento
+
+    def jerarquia(self):
+        """(regimiento, compania, peloton, escuadra) derivados de la unidad efectiva."""
+        escuadra = self.escuadra
+        peloton = escuadra.peloton if escuadra else self.peloton
+        compania = peloton.compania if peloton else self.compania
+        regimiento = compania.regimiento if compania else self.regimiento
+        return regimiento, compania, peloton, escuadra
+
+    def calcular_ruta(self):
+        unidad = self.unidad
+        return unidad.ruta if unidad else ''
+
+    def save(self, *args, **kwargs):
+        # `version` sólo se escribe con UPDATEs dirigidos, como en UnidadBase
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            kwargs['update_fields'] = [
+                f.name for f in self._meta.concrete_fields
+                if not f.primary_key and f.name not in self.CAMPOS_DERIVADOS
+            ]
+        self.antiguedad = ANTIGUEDAD_RANGO.get(self.rango, 0)
+        if kwargs.get('update_fields') is not None and 'rango' in kwargs['update_fields']:
+            kwargs['update_fields'] = {*kwargs['update_fields'], 'antiguedad'}
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or set(update_fields) & set(self.CAMPOS_UNIDAD):
+            self.ruta = self.calcular_ruta()
+            if update_fields is not None:
+                update_fields = kwargs['update_fields'] = {*update_fields, 'ruta'}
+
+        with transaction.atomic():
+            # Estado de la fila leído con candado y no al cargar la instancia:
+            # una instancia vieja (formulario del admin, shell) no conoce los
+            # traslados que ocurrieron desde entonces
+            anterior = None if self._state.adding else (
+                type(self).objects.select_for_update().filter(pk=self.pk).values_list('ruta', 'activo').first()
             )
+            super().save(*args, **kwargs)
+            actual = (self.ruta, self.activo)
+            if anterior and update_fields is not None:
+                # Lo que no se guardó conserva el valor de la BD
+                actual = (
+                    self.ruta if 'ruta' in update_fields else anterior[0],
+                    self.activo if 'activo' in update_fields else anterior[1],
+                )
+            if actual != anterior:
+                movimientos = [(actual[0], actual[1], 1)]
+                if anterior:
+                    movimientos.append((anterior[0], -anterior[1], -1))
+                ajustar_contadores(movimientos)
+            if anterior and actual[0] != anterior[0]:
+                # Cambió de unidad: invalida la versión que tenga cualquier tablero
+                type(self).objects.filter(pk=self.pk).update(version=F('version') + 1)
+
+    def __str__(self):
+        return f"[{self.rango}] {self.nombre_milsim}"
+
+
+class MovimientoQuerySet(models.QuerySet):
+    def de_miembro(self, miembro):
+        """Historial de un miembro, del más reciente al más viejo.
+        Usa el índice (miembro, -fecha)."""
+        return self.filter(miembro=miembro).order_by('-fecha', '-pk')
+
+    def entradas_a(self, unidad, desde=None, hasta=None):
+        """Movimientos que entraron al subárbol de `unidad` desde fuera de él,
+        opcionalmente en [desde, hasta). Usa el índice (ruta_destino, fecha)."""
+        movimientos = self.filter(ruta_destino__startswith=unidad.ruta).exclude(
+            ruta_origen__startswith=unidad.ruta
+        )
+        if desde is not None:
+            movimientos = movimientos.filter(fecha__gte=desde)
+        if hasta is not None:
+            movimientos = movimientos.filter(fecha__lt=hasta)
+        return movimientos.order_by('-fecha', '-pk')
+
+
+class MovimientoPersonal(models.Model):
+    """Historial de traslados (solo inserción).
+
+    Origen y destino se guardan como `ruta`: así "tráfico hacia la compañía
+    X" es un filtro por prefijo sobre un índice, a cualquier profundidad, y el
+    registro sobrevive a que la unidad se borre o se reubique.
+    """
+
+    class Tipo(models.TextChoices):
+        TRASLADO = 'traslado', 'Traslado'
+        INTERCAMBIO = 'intercambio', 'Intercambio'
+
+    miembro = models.ForeignKey(
+        Miembro, on_delete=models.SET_NULL, null=True, related_name='movimientos'
+    )
+    ruta_origen = models.CharField(max_length=100, blank=True, default='')
+    ruta_destino = models.CharField(max_length=100, blank=True, default='')
+    tipo = models.CharField(max_length=12, choices=Tipo.choices, default=Tipo.TRASLADO)
+    actor = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    fecha = models.DateTimeField(default=timezone.now)
+
+    objects = MovimientoQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = "Movimiento de personal"
+        verbose_name_plural = "Movimientos de personal"
+        indexes = [
+            models.Index(fields=['miembro', '-fecha'], name='orbat_mov_miembro_fecha'),
+            # varchar_pattern_ops: el prefijo (LIKE 'R1/C3/%') usa el índice en PostgreSQL
+            models.Index(
+                fields=['ruta_destino', 'fecha'], name='orbat_mov_destino_fecha',
+                opclasses=['varchar_pattern_ops', 'timestamptz_ops'],
+            ),
+        ]
 
     def __str__(self):
-        return f"[{self.rango}] {self.nombre_milsim}"
\ No newline at end of file
+        return f"{self.miembro_id}: {self.ruta_origen or '-'} -> {self.ruta_destino or '-'}"
+
+
+class ClaveIdempotencia(models.Model):
+    """Respuesta guardada de una petición con cabecera ``Idempotency-Key``.
+
+    `status` 0 marca una petición en curso. Las filas vencen a los
+    ORBAT_IDEMPOTENCY_TTL segundos (ver `purge_idempotency_keys`).
+    """
+    clave = models.CharField(max_length=255)
+    endpoint = models.CharField(max_length=100)
+    # Quién usó la clave ("u<pk>", "s<sesión>" o vacío si es anónimo): la
+    # misma clave de otro usuario es otra petición
+    titular = models.CharField(max_length=50, blank=True, default='')
+    # Digest del cuerpo: la misma clave con otro cuerpo es un error del cliente
+    huella = models.CharField(max_length=32)
+    status = models.PositiveSmallIntegerField(default=0)
+    respuesta = models.TextField(blank=True, default='')
+    creada = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        verbose_name = "Clave de idempotencia"
+        verbose_name_plural = "Claves de idempotencia"
+        constraints = [
+            models.UniqueConstraint(fields=['endpoint', 'titular', 'clave'], name='orbat_idempotencia_unica'),
+        ]
+
+    def __str__(self):
+        return f"{self.endpoint} {self.clave}"
+
+
+NIVELES = {'R': Regimiento, 'C': Compania, 'P': Peloton, 'E': Escuadra}
+
+
+class EscuadraLlena(Exception):
+    """Un incremento con cupo no encontró plazas libres en `escuadras`."""
+
+    def __init__(self, escuadras):
+        super().__init__(f"Escuadras sin plazas: {sorted(escuadras)}")
+        self.escuadras = escuadras
+
+
+def ajustar_contadores(movimientos, con_cupo=False, versionar=True):
+    """Aplica deltas de efectivos a cada unidad de cada ruta.
+
+    `movimientos` son tuplas (ruta, delta_activos, delta_total). Los deltas
+    se acumulan por unidad, así que en un traslado los ancestros comunes se
+    compensan y no se escriben. Las unidades se actualizan en orden fijo
+    (nivel, pk) para no provocar deadlocks entre transacciones concurrentes.
+
+    Las escuadras tocadas suben su `version`, salvo con ``versionar=False``
+    (quien llama ya la subió, ej. `transferir_optimista`).
+    """
+    deltas = defaultdict(lambda: [0, 0])
+    for ruta, delta_activos, delta_total in movimientos:
+        for prefijo, pk in segmentos_ruta(ruta):
+            delta = deltas[(prefijo, pk)]
+            delta[0] += int(delta_activos)
+            delta[1] += delta_total
+
+    grupos = defaultdict(list)
+    for prefijo, pk in sorted(deltas, key=lambda clave: ('RCPE'.index(clave[0]), clave[1])):
+        delta_activos, delta_total = deltas[(prefijo, pk)]
+        if delta_activos or delta_total:
+            grupos[(prefijo, delta_activos, delta_total)].append(pk)
+    for (prefijo, delta_activos, delta_total), pks in grupos.items():
+        cambios = {
+            'efectivos_activos': F('efectivos_activos') + delta_activos,
+            'efectivos_total': F('efectivos_total') + delta_total,
+        }
+        filas = NIVELES[prefijo].objects.filter(pk__in=pks)
+        if prefijo == 'E':
+            if versionar:
+                cambios['version'] = F('version') + 1
+            if con_cupo and delta_total > 0:
+                # Incremento guardado fila a fila para saber cuál no tenía plazas
+                llenas = [
+                    pk for pk in pks
+                    if not Escuadra.objects.filter(
+                        pk=pk, efectivos_total__lte=F('capacidad') - delta_total
+                    ).update(**cambios)
+                ]
+                if llenas:
+                    raise EscuadraLlena(llenas)
+                continue
+        filas.update(**cambios)
+
+
+def reubicar_subarbol(unidad, vieja, nueva):
+    """Reescribe el prefijo `vieja` por `nueva` en todo el subárbol (unidades y
+    miembros) y traspasa los efectivos de `unidad` a sus nuevos ancestros."""
+    resto = Substr('ruta', len(vieja) + 1)
+    for model in (Compania, Peloton, Escuadra, Miembro):
+        model.objects.filter(ruta__startswith=vieja).update(
+            ruta=Concat(models.Value(nueva), resto, output_field=models.CharField())
+        )
+
+    propio = len(f"{unidad.PREFIJO}{unidad.pk}/")
+    activos, total = type(unidad).objects.filter(pk=unidad.pk).values_list(
+        'efectivos_activos', 'efectivos_total'
+    ).get()
+    ajustar_contadores([(vieja[:-propio], -activos, -total), (nueva[:-propio], activos, total)])
\ No newline at end of file
@@ -0,0 +1,180 @@
+"""
+Conteos aproximados para listados de tablas grandes.
+
+El paginador de Django hace ``COUNT(*)`` en cada página, y el changelist del
+admin hace otro sin filtros para "mostrar todos". Con tablas de años de
+auditoría ese conteo domina el tiempo de la página.
+
+Por encima de ORBAT_APPROX_COUNT_THRESHOLD filas en la tabla:
+
+- PostgreSQL: la estimación del planificador (``EXPLAIN``) para el queryset
+  filtrado; el tamaño de la tabla sale de ``pg_class.reltuples``.
+- Otros motores (SQLite): el ``COUNT`` exacto, cacheado
+  ORBAT_APPROX_COUNT_TTL segundos. El tamaño de la tabla sale de
+  ``sqlite_stat1`` (tras ``ANALYZE``) o de un ``COUNT`` cacheado
+  ORBAT_TABLE_SIZE_TTL segundos.
+
+Por debajo del umbral se cuenta como siempre.
+
+Un conteo aproximado puede quedarse corto o pasarse: el paginador lo
+corrige con las filas de la página pedida (ver `ConteoAproximadoPaginator`).
+"""
+
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import EmptyPage, PageNotAnInteger, Paginator
+from django.db import DatabaseError, connections
+from django.utils.functional import cached_property
+from django.utils.translation import gettext_lazy as _
+
+
+def _conteo_cacheado(queryset):
+    sql, params = queryset.order_by().query.sql_with_params()
+    huella = hashlib.blake2b(f"{queryset.db}|{sql}|{params!r}".encode(), digest_size=16).hexdigest()
+    clave = f'orbat:conteo:{huella}'
+    total = cache.get(clave)
+    if total is None:
+        total = queryset.count()
+        cache.set(clave, total, settings.ORBAT_APPROX_COUNT_TTL)
+    return total
+
+
+def _estimacion_postgres(queryset):
+    sql, params = queryset.order_by().query.sql_with_params()
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+def _estadistica_sqlite(conexion, tabla):
+    """Filas según ``sqlite_stat1`` (primer número de `stat`), o None si la
+    tabla nunca se analizó."""
+    try:
+        with conexion.cursor() as cursor:
+            cursor.execute('SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1', [tabla])
+            fila = cursor.fetchone()
+    except DatabaseError:
+        # Sin ANALYZE no existe sqlite_stat1
+        return None
+    return int(fila[0].split()[0]) if fila else None
+
+
+def filas_tabla(model, using='default'):
+    """Filas de la tabla de `model`: estadística del planificador en
+    PostgreSQL (si la tabla ya fue analizada); en el resto, ``sqlite_stat1``
+    o un COUNT, cacheados ORBAT_TABLE_SIZE_TTL segundos."""
+    conexion = connections[using]
+    tabla = model._meta.db_table
+    if conexion.vendor == 'postgresql':
+        with conexion.cursor() as cursor:
+            cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', [tabla])
+            fila = cursor.fetchone()
+        # Negativo: nunca analizada, tamaño desconocido
+        if fila and fila[0] >= 0:
+            return fila[0]
+    # Sólo decide si la tabla es grande: vale por más tiempo que los conteos
+    clave = f'orbat:filas:{using}:{tabla}'
+    total = cache.get(clave)
+    if total is None:
+        if conexion.vendor == 'sqlite':
+            total = _estadistica_sqlite(conexion, tabla)
+        if total is None:
+            total = model._default_manager.using(using).count()
+        cache.set(clave, total, settings.ORBAT_TABLE_SIZE_TTL)
+    return total
+
+
+def tabla_grande(model, using='default'):
+    return filas_tabla(model, using) >= settings.ORBAT_APPROX_COUNT_THRESHOLD
+
+
+def _contar_aproximado(queryset):
+    if connections[queryset.db].vendor == 'postgresql':
+        return _estimacion_postgres(queryset)
+    return _conteo_cacheado(queryset)
+
+
+def contar(queryset):
+    """COUNT exacto en tablas chicas; aproximado sobre el umbral."""
+    if not tabla_grande(queryset.model, queryset.db):
+        return queryset.count()
+    return _contar_aproximado(queryset)
+
+
+class ConteoAproximadoPaginator(Paginator):
+    """Paginador con `contar`. Con un conteo aproximado, `page` lee una fila
+    más que la página: el total nunca queda por debajo de las filas vistas,
+    es exacto en la última página, y una página más allá del final real
+    cuenta de verdad (`get_page` devuelve entonces la última)."""
+
+    @cached_property
+    def aproximado(self):
+        return hasattr(self.object_list, 'query') and tabla_grande(self.object_list.model, self.object_list.db)
+
+    @cached_property
+    def count(self):
+        if not self.aproximado:
+            return super().count
+        total = _contar_aproximado(self.object_list)
+        limite = self.per_page + self.orphans
+        if total <= limite:
+            # Si la estimación cabe en una página, se comprueba con un LIMIT
+            total = len(self.object_list[:limite + 1])
+        return total
+
+    def _corregir_count(self, total):
+        self.count = total
+        self.__dict__.pop('num_pages', None)
+
+    def validate_number(self, number):
+        if not self.aproximado:
+            return super().validate_number(number)
+        # Sin tope superior: lo comprueba `page` con las filas
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger(_("That page number is not an integer"))
+        if number < 1:
+            raise EmptyPage(_("That page number is less than 1"))
+        return number
+
+    def page(self, number):
+        if not self.aproximado:
+            return super().page(number)
+        number = self.validate_number(number)
+        inicio = (number - 1) * self.per_page
+        limite = self.per_page + self.orphans
+        filas = list(self.object_list[inicio:inicio + limite + 1])
+        if not filas and number > 1:
+            self._corregir_count(self.object_list.count())
+            raise EmptyPage(_("That page contains no results"))
+        if len(filas) > limite:
+            # Quedan filas después de esta página
+            self._corregir_count(max(self.count, inicio + len(filas)))
+            filas = filas[:self.per_page]
+        else:
+            self._corregir_count(inicio + len(filas))
+        return self._get_page(filas, number, self)
+
+    def get_page(self, number):
+        try:
+            return super().get_page(number)
+        except EmptyPage:
+            # Más allá del final real: `page` ya dejó el conteo exacto
+            return self.page(self.num_pages)
+
+
+class ConteoAproximadoAdminMixin:
+    """Para ModelAdmin: paginador aproximado y, en tablas grandes, sin el
+    segundo COUNT del total sin filtros."""
+    paginator = ConteoAproximadoPaginator
+
+    @property
+    def show_full_result_count(self):
+        return not tabla_grande(self.model)
@@ -1,9 +1,66 @@
 from django.contrib.admin.models import LogEntry
 from django.core.exceptions import PermissionDenied
-from django.db.models.signals import pre_delete
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
 from django.dispatch import receiver
 
+from .cache import bump_orbat_version
+from .models import Compania, Curso, Escuadra, Miembro, MovimientoPersonal, Peloton, Regimiento, ajustar_contadores
+
 
 @receiver(pre_delete, sender=LogEntry)
 def prevent_logentry_delete(sender, instance, **kwargs):
     raise PermissionDenied("Los logs de auditoría no se pueden eliminar.")
+
+
+@receiver(pre_delete, sender=MovimientoPersonal)
+def prevent_movimiento_delete(sender, instance, **kwargs):
+    raise PermissionDenied("El historial de movimientos no se puede eliminar.")
+
+
+# Cualquier cambio en la estructura o el personal invalida el ORBAT cacheado.
+# Se incrementa la versión al confirmar la transacción para que ningún lector
+# cachee el árbol viejo bajo la versión nueva.
+ORBAT_MODELS = (Regimiento, Compania, Peloton, Escuadra, Miembro, Curso)
+
+
+def invalidate_orbat_cache(sender, **kwargs):
+    transaction.on_commit(bump_orbat_version)
+
+
+for _model in ORBAT_MODELS:
+    post_save.connect(invalidate_orbat_cache, sender=_model, dispatch_uid=f'orbat_cache_save_{_model.__name__}')
+    post_delete.connect(invalidate_orbat_cache, sender=_model, dispatch_uid=f'orbat_cache_delete_{_model.__name__}')
+
+m2m_changed.connect(invalidate_orbat_cache, sender=Miembro.cursos.through, dispatch_uid='orbat_cache_m2m_cursos')
+
+
+# Al borrar una unidad, las FKs de sus miembros pasan a NULL (SET_NULL) sin
+# pasar por Miembro.save(): se recalcula su ruta una vez terminado el borrado.
+UNIDAD_MODELS = (Regimiento, Compania, Peloton, Escuadra)
+
+
+def recordar_miembros_afectados(sender, instance, **kwargs):
+    # La ruta en memoria puede estar desfasada si un ancestro se reubicó
+    ruta = sender.objects.filter(pk=instance.pk).values_list('ruta', flat=True).first()
+    if ruta:
+        instance._miembros_afectados = list(
+            Miembro.objects.filter(ruta__startswith=ruta).values_list('pk', flat=True)
+        )
+
+
+def refrescar_miembros_afectados(sender, instance, **kwargs):
+    ids = getattr(instance, '_miembros_afectados', None)
+    if ids:
+        Miembro.objects.filter(pk__in=ids).refrescar_rutas()
+
+
+for _model in UNIDAD_MODELS:
+    pre_delete.connect(recordar_miembros_afectados, sender=_model, dispatch_uid=f'orbat_ruta_pre_delete_{_model.__name__}')
+    post_delete.connect(refrescar_miembros_afectados, sender=_model, dispatch_uid=f'orbat_ruta_post_delete_{_model.__name__}')
+
+
+# Baja de un miembro: descuenta sus efectivos en la misma transacción del borrado
+@receiver(post_delete, sender=Miembro)
+def descontar_efectivos(sender, instance, **kwargs):
+    ajustar_contadores([(instance.ruta, -instance.activo, -1)])
@@ -0,0 +1,67 @@
+"""
+Reporte de efectivos de todas las unidades.
+
+Una sola consulta agrupada sobre Miembro (ruta, rango, activo) y el reparto
+a cada ancestro por los segmentos de `ruta`, como `recalcular_contadores`.
+El resultado se cachea con la versión ORBAT (ver `cache.get_strength_report`).
+
+Forma del reporte::
+
+    {
+        'total': {'activos': 12, 'inactivos': 3, 'por_rango': {'CPT': {'activos': 1, 'inactivos': 0}, ...}},
+        'unidades': {'R1': {...}, 'C3': {...}, 'P7': {...}, 'E12': {...}},
+    }
+
+`por_rango` va ordenado de mayor a menor antigüedad.
+"""
+
+from django.db.models import Count
+
+from .jerarquia import segmentos_ruta
+from .models import ANTIGUEDAD_RANGO, Miembro
+
+
+def _vacio():
+    return {'activos': 0, 'inactivos': 0, 'por_rango': {}}
+
+
+def _sumar(efectivos, rango, activo, n):
+    clave = 'activos' if activo else 'inactivos'
+    efectivos[clave] += n
+    por_rango = efectivos['por_rango'].setdefault(rango, {'activos': 0, 'inactivos': 0})
+    por_rango[clave] += n
+
+
+def _ordenar(efectivos):
+    efectivos['por_rango'] = dict(sorted(
+        efectivos['por_rango'].items(), key=lambda item: -ANTIGUEDAD_RANGO.get(item[0], 0),
+    ))
+
+
+def clave_unidad(unidad):
+    """'R1', 'C3'... la clave de una unidad (instancia del modelo) en el reporte."""
+    return f"{unidad.PREFIJO}{unidad.pk}"
+
+
+def build_strength_report():
+    total = _vacio()
+    unidades = {}
+    filas = (
+        Miembro.objects.order_by()
+        .values('ruta', 'rango', 'activo')
+        .annotate(n=Count('pk'))
+        .values_list('ruta', 'rango', 'activo', 'n')
+    )
+    for ruta, rango, activo, n in filas:
+        _sumar(total, rango, activo, n)
+        for prefijo, pk in segmentos_ruta(ruta):
+            _sumar(unidades.setdefault(f"{prefijo}{pk}", _vacio()), rango, activo, n)
+    _ordenar(total)
+    for efectivos in unidades.values():
+        _ordenar(efectivos)
+    return {'total': total, 'unidades': unidades}
+
+
+def efectivos_de(reporte, clave):
+    """Efectivos de la unidad `clave` ('R1'...), vacíos si no tiene miembros."""
+    return reporte['unidades'].get(clave) or _vacio()
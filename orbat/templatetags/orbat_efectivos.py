@@ -0,0 +1,16 @@
+from django import template
+
+from orbat.cache import get_orbat_tree, get_strength_report
+from orbat.strength import efectivos_de
+
+register = template.Library()
+
+
+@register.simple_tag
+def efectivos_por_regimiento():
+    """Filas del panel de efectivos del dashboard, desde el reporte cacheado."""
+    reporte = get_strength_report()
+    return [
+        {'nombre': reg.nombre, **efectivos_de(reporte, f"R{reg.id}")}
+        for reg in get_orbat_tree()
+    ]
@@ -1,10 +1,28 @@
-from django.test import TestCase, Client
-from django.contrib.auth.models import User
+import hashlib
+import json
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+from django.core.management import call_command
+from django.db import IntegrityError, OperationalError, connection, transaction
+from django.db.models import QuerySet
+from django.test import AsyncRequestFactory, TestCase, TransactionTestCase, Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.contrib.auth.models import AnonymousUser, Permission, User
 from django.urls import reverse
-from django.contrib.admin.models import LogEntry, ADDITION
+from django.utils import timezone
+from django.contrib.admin.models import LogEntry, ADDITION, CHANGE
 from django.contrib.contenttypes.models import ContentType
-from django.core.exceptions import PermissionDenied
-from .models import Regimiento, Compania, Peloton, Escuadra, Miembro
+from django.core.exceptions import PermissionDenied, ValidationError
+from .cache import get_cache_stats, get_orbat_version
+from .models import Regimiento, Compania, Peloton, Escuadra, EscuadraLlena, Miembro, ClaveIdempotencia, MovimientoPersonal, Rango, ANTIGUEDAD_RANGO, ajustar_contadores
+from . import async_views
+from .management.sintetico import OrbatSintetico
+from .tree import abuild_orbat_tree, build_orbat_tree
 
 
 class ModelTests(TestCase):
@@ -166,6 +184,16 @@ class AuditLogTests(TestCase):
 		self.assertEqual(response.status_code, 200)
 		self.assertContains(response, 'Auditoría de cambios')
 
+	def test_date_range_filters_on_action_time(self):
+		self.client.login(username='audit_staff', password='p')
+		hoy = timezone.localdate()
+		response = self.client.get(reverse('audit_log_list'), {'from': hoy.isoformat(), 'to': hoy.isoformat()})
+		self.assertContains(response, 'Regimiento Test')
+		response = self.client.get(reverse('audit_log_list'), {'to': (hoy - timedelta(days=1)).isoformat()})
+		self.assertNotContains(response, 'Regimiento Test')
+		# Fecha inválida: se ignora el filtro
+		self.assertEqual(self.client.get(reverse('audit_log_list'), {'from': '2024-13-45'}).status_code, 200)
+
 	def test_dashboard_recent_actions_is_global(self):
 		self.client.login(username='audit_staff', password='p')
 		response = self.client.get(reverse('admin:index'))
@@ -175,3 +203,1152 @@ class AuditLogTests(TestCase):
 	def test_logentry_cannot_be_deleted(self):
 		with self.assertRaises(PermissionDenied):
 			self.entry.delete()
+
+
+class OrbatCacheTests(TestCase):
+	def setUp(self):
+		cache.clear()
+		self.client = Client()
+		r = Regimiento.objects.create(nombre="R", comandante="CO")
+		c = Compania.objects.create(nombre="C", regimiento=r)
+		p = Peloton.objects.create(nombre="P", compania=c)
+		self.s1 = Escuadra.objects.create(nombre="S1", peloton=p)
+		self.s2 = Escuadra.objects.create(nombre="S2", peloton=p)
+		self.oper = Miembro.objects.create(nombre_milsim="Oper", rango="PV1", escuadra=self.s1)
+
+	def test_warm_hit_costs_zero_queries(self):
+		self.client.get('/orbat/')
+		with self.assertNumQueries(0):
+			resp = self.client.get('/orbat/')
+		self.assertContains(resp, "Oper")
+		stats = get_cache_stats()
+		self.assertEqual(stats['hits'], 1)
+		self.assertEqual(stats['misses'], 1)
+		self.assertEqual(stats['hit_ratio'], 0.5)
+
+	def test_save_bumps_version_and_refreshes_tree(self):
+		self.client.get('/orbat/')
+		version = get_orbat_version()
+		with self.captureOnCommitCallbacks(execute=True):
+			Miembro.objects.create(nombre_milsim="Nuevo", rango="PV2", escuadra=self.s2)
+		self.assertNotEqual(get_orbat_version(), version)
+		self.assertContains(self.client.get('/orbat/'), "Nuevo")
+
+	def test_transfer_bumps_version(self):
+		version = get_orbat_version()
+		with self.captureOnCommitCallbacks(execute=True):
+			resp = self.client.post(
+				reverse('transferir_personal'),
+				json.dumps({'persona_id': self.oper.id, 'escuadra_destino_id': self.s2.id}),
+				content_type='application/json',
+			)
+		self.assertEqual(resp.status_code, 200)
+		self.assertNotEqual(get_orbat_version(), version)
+
+	def test_cache_status_requires_staff(self):
+		self.assertEqual(self.client.get(reverse('orbat_cache_status')).status_code, 302)
+		User.objects.create_user(username='staff', password='p', is_staff=True)
+		self.client.login(username='staff', password='p')
+		resp = self.client.get(reverse('orbat_cache_status'))
+		self.assertEqual(resp.status_code, 200)
+		self.assertIn('hit_ratio', resp.json())
+
+
+class OrbatTreeTests(TestCase):
+	def _crear_regimiento(self, n):
+		r = Regimiento.objects.create(nombre=f"R{n}")
+		c = Compania.objects.create(nombre=f"C{n}", regimiento=r)
+		p = Peloton.objects.create(nombre=f"P{n}", compania=c)
+		s = Escuadra.objects.create(nombre=f"S{n}", peloton=p)
+		Miembro.objects.create(nombre_milsim=f"HQ{n}", rango="CPT", compania=c)
+		Miembro.objects.create(nombre_milsim=f"Sqd{n}", rango="PV1", escuadra=s)
+		return r
+
+	def test_query_count_is_constant(self):
+		self._crear_regimiento(1)
+		with self.assertNumQueries(5):
+			build_orbat_tree()
+		for n in range(2, 6):
+			self._crear_regimiento(n)
+		with self.assertNumQueries(5):
+			tree = build_orbat_tree()
+		self.assertEqual(len(tree), 5)
+
+	def test_members_placed_at_their_unit(self):
+		self._crear_regimiento(1)
+		reg = build_orbat_tree()[0]
+		cia = reg.companias[0]
+		plt = cia.pelotones[0]
+		self.assertEqual([m.nombre_milsim for m in cia.hq], ["HQ1"])
+		self.assertEqual(plt.hq, [])
+		self.assertEqual({m.nombre_milsim for m in plt.escuadras[0].miembros}, {"Sqd1"})
+		self.assertEqual(cia.hq[0].rango_display, "Capitán (CPT)")
+
+
+class JerarquiaRutaTests(TestCase):
+	def setUp(self):
+		self.r = Regimiento.objects.create(nombre="R")
+		self.c = Compania.objects.create(nombre="Alpha", regimiento=self.r)
+		self.c2 = Compania.objects.create(nombre="Bravo", regimiento=self.r)
+		self.p = Peloton.objects.create(nombre="1er", compania=self.c)
+		self.s = Escuadra.objects.create(nombre="1-1", peloton=self.p)
+		self.hq = Miembro.objects.create(nombre_milsim="HQ", rango="CPT", compania=self.c)
+		self.sqd = Miembro.objects.create(nombre_milsim="Sqd", rango="PV1", escuadra=self.s)
+
+	def test_rutas_are_materialized(self):
+		self.assertEqual(self.s.ruta, f"R{self.r.pk}/C{self.c.pk}/P{self.p.pk}/E{self.s.pk}/")
+		self.assertEqual(self.sqd.ruta, self.s.ruta)
+		self.assertEqual(self.hq.ruta, self.c.ruta)
+
+	def test_total_efectivos_counts_hq_staff(self):
+		Miembro.objects.create(nombre_milsim="Baja", escuadra=self.s, activo=False)
+		self.assertEqual(self.r.total_efectivos(), 2)
+		with self.assertNumQueries(1):
+			self.assertEqual(Miembro.objects.bajo_unidad(self.p).count(), 2)
+
+	def test_reparenting_rewrites_subtree(self):
+		self.p.compania = self.c2
+		self.p.save()
+		self.s.refresh_from_db()
+		self.sqd.refresh_from_db()
+		self.assertTrue(self.s.ruta.startswith(self.c2.ruta))
+		self.assertEqual(self.sqd.ruta, self.s.ruta)
+		self.assertEqual(list(Miembro.objects.bajo_unidad(self.c)), [self.hq])
+
+	def test_deleting_unit_refreshes_member_ruta(self):
+		self.s.delete()
+		self.sqd.refresh_from_db()
+		self.assertIsNone(self.sqd.escuadra)
+		self.assertEqual(self.sqd.ruta, '')
+
+	def test_rebuild_command_repairs_rutas(self):
+		Miembro.objects.filter(pk=self.sqd.pk).update(ruta='')
+		call_command('rebuild_orbat_paths', stdout=StringIO())
+		self.sqd.refresh_from_db()
+		self.assertEqual(self.sqd.ruta, self.s.ruta)
+
+
+class ContadoresEfectivosTests(TestCase):
+	def setUp(self):
+		self.r = Regimiento.objects.create(nombre="R")
+		self.c = Compania.objects.create(nombre="Alpha", regimiento=self.r)
+		self.p = Peloton.objects.create(nombre="1er", compania=self.c)
+		self.s1 = Escuadra.objects.create(nombre="1-1", peloton=self.p)
+		self.s2 = Escuadra.objects.create(nombre="1-2", peloton=self.p)
+		self.a = Miembro.objects.create(nombre_milsim="A", escuadra=self.s1)
+		self.b = Miembro.objects.create(nombre_milsim="B", compania=self.c, activo=False)
+
+	def assertEfectivos(self, unidad, activos, total):
+		unidad.refresh_from_db()
+		self.assertEqual((unidad.efectivos_activos, unidad.efectivos_total), (activos, total))
+
+	def test_create_and_activo_toggle(self):
+		self.assertEfectivos(self.r, 1, 2)
+		self.assertEfectivos(self.s1, 1, 1)
+		self.b.activo = True
+		self.b.save()
+		self.assertEfectivos(self.c, 2, 2)
+		self.assertEfectivos(self.p, 1, 1)
+
+	def test_transfer_moves_counters(self):
+		resp = self.client.post(
+			reverse('transferir_personal'),
+			json.dumps({'persona_id': self.a.id, 'escuadra_destino_id': self.s2.id}),
+			content_type='application/json',
+		)
+		self.assertEqual(resp.status_code, 200)
+		self.assertEfectivos(self.s1, 0, 0)
+		self.assertEfectivos(self.s2, 1, 1)
+		self.assertEfectivos(self.p, 1, 1)
+
+	def test_delete_and_bulk_activo(self):
+		Miembro.objects.filter(pk=self.a.pk).set_activo(False)
+		self.assertEfectivos(self.r, 0, 2)
+		self.b.delete()
+		self.assertEfectivos(self.c, 0, 1)
+
+	def test_unit_delete_and_reparent(self):
+		c2 = Compania.objects.create(nombre="Bravo", regimiento=self.r)
+		self.p.compania = c2
+		self.p.save()
+		self.assertEfectivos(self.c, 0, 1)
+		self.assertEfectivos(c2, 1, 1)
+		self.s1.delete()
+		self.assertEfectivos(c2, 0, 0)
+		self.assertEfectivos(self.r, 0, 1)
+
+	def test_repair_command(self):
+		Regimiento.objects.filter(pk=self.r.pk).update(efectivos_activos=99, efectivos_total=99)
+		call_command('rebuild_orbat_counters', stdout=StringIO())
+		self.assertEfectivos(self.r, 1, 2)
+
+
+class OrbatFragmentCacheTests(TestCase):
+	def setUp(self):
+		cache.clear()
+		r = Regimiento.objects.create(nombre="R")
+		c = Compania.objects.create(nombre="C", regimiento=r)
+		p = Peloton.objects.create(nombre="P", compania=c)
+		self.s1 = Escuadra.objects.create(nombre="S1", peloton=p)
+		self.s2 = Escuadra.objects.create(nombre="S2", peloton=p)
+		self.s3 = Escuadra.objects.create(nombre="S3", peloton=p)
+		self.oper = Miembro.objects.create(nombre_milsim="Oper", escuadra=self.s1)
+		Miembro.objects.create(nombre_milsim="Quieto", escuadra=self.s3)
+
+	def _stamps(self):
+		plt = build_orbat_tree()[0].companias[0].pelotones[0]
+		return plt.stamp, {e.id: e.stamp for e in plt.escuadras}
+
+	def test_transfer_only_restamps_affected_branches(self):
+		self.client.get('/orbat/')
+		plt_antes, antes = self._stamps()
+		key = make_template_fragment_key('orbat_escuadra', [self.s3.id, antes[self.s3.id]])
+		self.assertIsNotNone(cache.get(key))
+
+		with self.captureOnCommitCallbacks(execute=True):
+			self.client.post(
+				reverse('transferir_personal'),
+				json.dumps({'persona_id': self.oper.id, 'escuadra_destino_id': self.s2.id}),
+				content_type='application/json',
+			)
+		plt_despues, despues = self._stamps()
+		self.assertNotEqual(plt_antes, plt_despues)
+		self.assertNotEqual(antes[self.s1.id], despues[self.s1.id])
+		self.assertNotEqual(antes[self.s2.id], despues[self.s2.id])
+		self.assertEqual(antes[self.s3.id], despues[self.s3.id])
+
+		resp = self.client.get('/orbat/')
+		self.assertContains(resp, "Oper")
+		self.assertContains(resp, "Quieto")
+
+
+class OrbatApiTests(TestCase):
+	def setUp(self):
+		cache.clear()
+		r = Regimiento.objects.create(nombre="R")
+		c = Compania.objects.create(nombre="C", regimiento=r)
+		p = Peloton.objects.create(nombre="P", compania=c)
+		self.s = Escuadra.objects.create(nombre="S", peloton=p)
+		Miembro.objects.create(nombre_milsim="Activo", escuadra=self.s)
+		Miembro.objects.create(nombre_milsim="Baja", escuadra=self.s, activo=False)
+
+	def test_full_tree_and_not_modified(self):
+		resp = self.client.get(reverse('orbat_api'))
+		self.assertEqual(resp.status_code, 200)
+		sqd = resp.json()['regimientos'][0]['companias'][0]['pelotones'][0]['escuadras'][0]
+		self.assertEqual([m['nombre_milsim'] for m in sqd['miembros']], ["Activo"])
+		etag = resp['ETag']
+		self.assertFalse(etag.startswith('W/'))
+
+		with self.assertNumQueries(0):
+			resp = self.client.get(reverse('orbat_api'), HTTP_IF_NONE_MATCH=etag)
+		self.assertEqual(resp.status_code, 304)
+
+		with self.captureOnCommitCallbacks(execute=True):
+			Miembro.objects.create(nombre_milsim="Nuevo", escuadra=self.s)
+		resp = self.client.get(reverse('orbat_api'), HTTP_IF_NONE_MATCH=etag)
+		self.assertEqual(resp.status_code, 200)
+		self.assertNotEqual(resp['ETag'], etag)
+
+	def test_subtree_and_inactive_filters(self):
+		resp = self.client.get(reverse('orbat_api'), {'escuadra': self.s.id, 'inactivos': '1'})
+		self.assertEqual(resp.status_code, 200)
+		self.assertEqual(len(resp.json()['escuadra']['miembros']), 2)
+		self.assertNotEqual(resp['ETag'], self.client.get(reverse('orbat_api'))['ETag'])
+		self.assertEqual(self.client.get(reverse('orbat_api'), {'escuadra': 999}).status_code, 404)
+		self.assertEqual(self.client.get(reverse('orbat_api'), {'escuadra': 'x'}).status_code, 400)
+
+
+class OrbatColapsadoTests(TestCase):
+	def setUp(self):
+		cache.clear()
+		r = Regimiento.objects.create(nombre="R")
+		self.c = Compania.objects.create(nombre="Cia Alfa", regimiento=r)
+		self.p = Peloton.objects.create(nombre="Peloton Uno", compania=self.c)
+		s = Escuadra.objects.create(nombre="Escuadra Lobo", peloton=self.p)
+		Miembro.objects.create(nombre_milsim="Activo", escuadra=s)
+		Miembro.objects.create(nombre_milsim="Baja", escuadra=s, activo=False)
+
+	def test_collapsed_page_carries_only_top_levels(self):
+		resp = self.client.get(reverse('orbat_visual'), {'modo': 'colapsado'})
+		self.assertContains(resp, "Cia Alfa")
+		self.assertContains(resp, "1 / 2 efectivos")
+		self.assertNotContains(resp, "Peloton Uno")
+		self.assertContains(resp, reverse('orbat_subarbol', args=['compania', self.c.id]))
+		self.assertContains(self.client.get(reverse('orbat_visual')), "Escuadra Lobo")
+
+	def test_subtree_endpoint_html_and_json(self):
+		resp = self.client.get(reverse('orbat_subarbol', args=['compania', self.c.id]))
+		self.assertContains(resp, "Peloton Uno")
+		self.assertNotContains(resp, "Escuadra Lobo")
+		self.assertContains(resp, reverse('orbat_subarbol', args=['peloton', self.p.id]))
+
+		resp = self.client.get(reverse('orbat_subarbol', args=['peloton', self.p.id]), {'format': 'json'})
+		data = resp.json()['peloton']
+		self.assertEqual(data['efectivos_activos'], 1)
+		self.assertEqual([m['nombre_milsim'] for m in data['escuadras'][0]['miembros']], ["Activo"])
+		with self.assertNumQueries(0):
+			resp = self.client.get(reverse('orbat_subarbol', args=['peloton', self.p.id]), {'format': 'json'}, HTTP_IF_NONE_MATCH=resp['ETag'])
+		self.assertEqual(resp.status_code, 304)
+
+		self.assertEqual(self.client.get(reverse('orbat_subarbol', args=['peloton', 999])).status_code, 404)
+		self.assertEqual(self.client.get(reverse('orbat_subarbol', args=['escuadra', 1])).status_code, 404)
+
+
+class EscuadrasDashboardTests(TestCase):
+	def setUp(self):
+		r = Regimiento.objects.create(nombre="R")
+		self.cias = [Compania.objects.create(nombre=f"Cia{i}", regimiento=r) for i in range(2)]
+		for cia in self.cias:
+			p = Peloton.objects.create(nombre="P", compania=cia)
+			for i in range(5):
+				s = Escuadra.objects.create(nombre=f"S{i}", peloton=p)
+				Miembro.objects.create(nombre_milsim=f"{cia.nombre}-{i}", escuadra=s)
+				Miembro.objects.create(nombre_milsim=f"Baja-{cia.nombre}-{i}", escuadra=s, activo=False)
+
+	def test_board_query_count_is_constant(self):
+		with self.assertNumQueries(2):
+			resp = self.client.get(reverse('escuadras_dashboard'))
+		escuadras = resp.context['escuadras']
+		self.assertEqual(len(escuadras), 10)
+		self.assertEqual(escuadras[0]['nombre'], "Cia0 | P | S0")
+		self.assertEqual([m['nombre_milsim'] for m in escuadras[0]['miembros']], ["Cia0-0"])
+
+	def test_board_filters(self):
+		resp = self.client.get(reverse('escuadras_dashboard'), {'compania': self.cias[1].id})
+		self.assertEqual({e['nombre'].split(' | ')[0] for e in resp.context['escuadras']}, {"Cia1"})
+		self.assertEqual(self.client.get(reverse('escuadras_dashboard'), {'peloton': 'x'}).status_code, 400)
+
+
+class TransferenciaLoteTests(TestCase):
+	def setUp(self):
+		r = Regimiento.objects.create(nombre="R")
+		c = Compania.objects.create(nombre="C", regimiento=r)
+		p = Peloton.objects.create(nombre="P", compania=c)
+		self.s1 = Escuadra.objects.create(nombre="S1", peloton=p)
+		self.s2 = Escuadra.objects.create(nombre="S2", peloton=p)
+		self.llenos = [Miembro.objects.create(nombre_milsim=f"Lleno{i}", escuadra=self.s2) for i in range(5)]
+		self.a = Miembro.objects.create(nombre_milsim="A", escuadra=self.s1)
+		self.b = Miembro.objects.create(nombre_milsim="B", escuadra=self.s1)
+		self.oficial = User.objects.create_user(username='oficial', password='p')
+		self.oficial.user_permissions.add(Permission.objects.get(codename='change_miembro'))
+		self.client.force_login(self.oficial)
+
+	def _lote(self, movimientos, client=None):
+		return (client or self.client).post(
+			reverse('transferir_personal_lote'),
+			json.dumps({'movimientos': movimientos}),
+			content_type='application/json',
+		)
+
+	def test_idempotency_key_is_scoped_to_the_user(self):
+		otro = User.objects.create_user(username='oficial2')
+		otro.user_permissions.add(Permission.objects.get(codename='change_miembro'))
+		otro_client = Client()
+		otro_client.force_login(otro)
+		cuerpo = json.dumps({'movimientos': [{'persona_id': self.a.id, 'escuadra_destino_id': self.s1.id}]})
+		respuestas = [
+			client.post(reverse('transferir_personal_lote'), cuerpo, content_type='application/json', HTTP_IDEMPOTENCY_KEY='compartida')
+			for client in (self.client, otro_client)
+		]
+		self.assertEqual([r.status_code for r in respuestas], [200, 200])
+		self.assertNotIn('Idempotent-Replayed', respuestas[1])
+		self.assertEqual(ClaveIdempotencia.objects.filter(clave='compartida').count(), 2)
+		# Cada usuario reproduce sólo su propia respuesta
+		repetida = otro_client.post(reverse('transferir_personal_lote'), cuerpo, content_type='application/json', HTTP_IDEMPOTENCY_KEY='compartida')
+		self.assertEqual(repetida['Idempotent-Replayed'], 'true')
+
+	def test_requires_login_permission_and_csrf(self):
+		movimientos = [{'persona_id': self.a.id, 'escuadra_destino_id': self.s2.id}]
+		self.assertEqual(self._lote(movimientos, Client()).status_code, 401)
+		sin_permiso = Client()
+		sin_permiso.force_login(User.objects.create_user(username='recluta'))
+		self.assertEqual(self._lote(movimientos, sin_permiso).json()['error'], 'permission_denied')
+		con_csrf = Client(enforce_csrf_checks=True)
+		con_csrf.force_login(self.oficial)
+		self.assertEqual(self._lote(movimientos, con_csrf).status_code, 403)
+		self.assertFalse(MovimientoPersonal.objects.exists())
+
+	def test_capacity_checked_against_final_state(self):
+		# Mover a S2 (lleno) es válido si otro sale de S2 en el mismo lote
+		resp = self._lote([
+			{'persona_id': self.a.id, 'escuadra_destino_id': self.s2.id},
+			{'persona_id': self.llenos[0].id, 'escuadra_destino_id': self.s1.id},
+		])
+		self.assertEqual(resp.status_code, 200)
+		self.assertEqual([r['status'] for r in resp.json()['resultados']], ['moved', 'moved'])
+		self.a.refresh_from_db()
+		self.assertEqual(self.a.escuadra_id, self.s2.id)
+		self.s2.refresh_from_db()
+		self.assertEqual(self.s2.efectivos_total, 5)
+
+	def test_all_or_nothing(self):
+		resp = self._lote([
+			{'persona_id': self.b.id, 'escuadra_destino_id': self.s2.id},
+			{'persona_id': 999, 'escuadra_destino_id': self.s1.id},
+		])
+		self.assertEqual(resp.status_code, 409)
+		resultados = resp.json()['resultados']
+		self.assertEqual(resultados[0]['error'], 'destination_full')
+		self.assertEqual(resultados[1]['error'], 'persona_not_found')
+		self.b.refresh_from_db()
+		self.assertEqual(self.b.escuadra_id, self.s1.id)
+
+	def test_swap_and_single_endpoint_compat(self):
+		resp = self._lote([{
+			'persona_id': self.a.id, 'escuadra_destino_id': self.s2.id,
+			'persona_a_reemplazar_id': self.llenos[1].id,
+		}])
+		self.assertEqual(resp.json()['resultados'][0]['status'], 'swapped')
+		self.llenos[1].refresh_from_db()
+		self.assertEqual(self.llenos[1].escuadra_id, self.s1.id)
+
+		resp = self.client.post(
+			reverse('transferir_personal'),
+			json.dumps({'persona_id': self.b.id, 'escuadra_destino_id': self.s2.id}),
+			content_type='application/json',
+		)
+		self.assertEqual(resp.status_code, 409)
+		self.assertEqual(len(resp.json()['miembros']), 5)
+
+
+class TransferenciaOptimistaTests(TestCase):
+	def setUp(self):
+		r = Regimiento.objects.create(nombre="R")
+		c = Compania.objects.create(nombre="C", regimiento=r)
+		p = Peloton.objects.create(nombre="P", compania=c)
+		self.s1 = Escuadra.objects.create(nombre="S1", peloton=p)
+		self.s2 = Escuadra.objects.create(nombre="S2", peloton=p)
+		self.a = Miembro.objects.create(nombre_milsim="A", escuadra=self.s1)
+
+	def _mover(self, **extra):
+		return self.client.post(
+			reverse('transferir_personal'),
+			json.dumps({'persona_id': self.a.id, 'escuadra_destino_id': self.s2.id, **extra}),
+			content_type='application/json',
+		)
+
+	def test_stale_version_is_rejected_without_changes(self):
+		self.s2.refresh_from_db()
+		resp = self._mover(version=self.a.version, escuadra_destino_version=self.s2.version + 1)
+		self.assertEqual(resp.status_code, 409)
+		self.assertEqual(resp.json()['error'], 'stale_version')
+		self.a.refresh_from_db()
+		self.assertEqual(self.a.escuadra_id, self.s1.id)
+
+	def test_move_bumps_versions_and_counters(self):
+		self.s2.refresh_from_db()
+		resp = self._mover(version=self.a.version, escuadra_destino_version=self.s2.version)
+		self.assertEqual(resp.status_code, 200)
+		versiones = resp.json()['versiones']
+		self.a.refresh_from_db()
+		self.assertEqual(self.a.ruta, Escuadra.objects.get(pk=self.s2.pk).ruta)
+		self.assertEqual(versiones['miembros'][str(self.a.id)], self.a.version)
+		self.assertGreater(self.a.version, 0)
+		self.assertEqual(Escuadra.objects.get(pk=self.s2.pk).efectivos_total, 1)
+		# La versión vieja ya no sirve
+		self.assertEqual(self._mover(version=0).json()['error'], 'stale_version')
+
+	def test_move_bumps_each_squad_version_once(self):
+		antes = dict(Escuadra.objects.values_list('pk', 'version'))
+		self.assertEqual(self._mover().status_code, 200)
+		despues = dict(Escuadra.objects.values_list('pk', 'version'))
+		self.assertEqual({pk: despues[pk] - antes[pk] for pk in antes}, {self.s1.pk: 1, self.s2.pk: 1})
+
+	def test_move_returns_origin_squad_version(self):
+		b = Miembro.objects.create(nombre_milsim="B", escuadra=self.s2)
+		versiones = self._mover().json()['versiones']['escuadras']
+		self.assertEqual(versiones[str(self.s1.id)], Escuadra.objects.get(pk=self.s1.pk).version)
+		# Volver a soltar en la columna de origen con las versiones devueltas
+		resp = self.client.post(
+			reverse('transferir_personal'),
+			json.dumps({
+				'persona_id': b.id, 'escuadra_destino_id': self.s1.id,
+				'version': b.version, 'escuadra_destino_version': versiones[str(self.s1.id)],
+			}),
+			content_type='application/json',
+		)
+		self.assertEqual(resp.status_code, 200)
+
+	@override_settings(ORBAT_TRANSFER_MODE='bloqueo')
+	def test_locking_mode_also_bumps_version(self):
+		self.assertEqual(self._mover().status_code, 200)
+		self.a.refresh_from_db()
+		self.assertEqual(self.a.version, 1)
+
+	def test_benchmark_command_runs(self):
+		out = StringIO()
+		call_command('benchmark_transfers', workers=1, traslados=5, seed=1, stdout=out)
+		self.assertIn('optimista', out.getvalue())
+		self.assertFalse(Regimiento.objects.filter(nombre__startswith='BENCH').exists())
+
+	def test_synthetic_orbat_cleanup_purges_its_idempotency_keys(self):
+		orbat = OrbatSintetico(1, 1)
+		ClaveIdempotencia.objects.create(endpoint='/x/', clave=orbat.clave_idempotencia(), huella='h')
+		ClaveIdempotencia.objects.create(endpoint='/x/', clave='ajena', huella='h')
+		orbat.borrar()
+		self.assertEqual(list(ClaveIdempotencia.objects.values_list('clave', flat=True)), ['ajena'])
+		self.assertFalse(Miembro.objects.filter(pk__in=orbat.miembros).exists())
+
+
+class CapacidadEscuadraTests(TestCase):
+	def setUp(self):
+		r = Regimiento.objects.create(nombre="R")
+		c = Compania.objects.create(nombre="C", regimiento=r)
+		p = Peloton.objects.create(nombre="P", compania=c)
+		self.s1 = Escuadra.objects.create(nombre="S1", peloton=p)
+		self.crew = Escuadra.objects.create(nombre="Tripulación", peloton=p, capacidad=2)
+		self.a = Miembro.objects.create(nombre_milsim="A", escuadra=self.s1)
+		self.b = Miembro.objects.create(nombre_milsim="B", escuadra=self.s1)
+		self.c = Miembro.objects.create(nombre_milsim="C", escuadra=self.s1)
+
+	def _mover(self, miembro):
+		return self.client.post(
+			reverse('transferir_personal'),
+			json.dumps({'persona_id': miembro.id, 'escuadra_destino_id': self.crew.id}),
+			content_type='application/json',
+		)
+
+	def test_capacity_field_is_enforced(self):
+		self.assertEqual(self._mover(self.a).status_code, 200)
+		self.assertEqual(self._mover(self.b).status_code, 200)
+		resp = self._mover(self.c)
+		self.assertEqual(resp.status_code, 409)
+		self.assertEqual(resp.json()['error'], 'destination_full')
+		self.crew.refresh_from_db()
+		self.assertEqual(self.crew.efectivos_total, 2)
+
+	def test_guarded_increment_rejects_full_squad(self):
+		Escuadra.objects.filter(pk=self.crew.pk).update(efectivos_total=2)
+		with self.assertRaises(EscuadraLlena) as ctx:
+			ajustar_contadores([(self.crew.ruta, 1, 1)], con_cupo=True)
+		self.assertEqual(ctx.exception.escuadras, [self.crew.pk])
+		# Sin cupo (altas administrativas) el contador sube igual
+		ajustar_contadores([(self.crew.ruta, 1, 1)])
+		self.crew.refresh_from_db()
+		self.assertEqual(self.crew.efectivos_total, 3)
+
+	@override_settings(ORBAT_TRANSFER_MODE='bloqueo')
+	def test_locking_path_uses_capacity(self):
+		self.assertEqual(self._mover(self.a).status_code, 200)
+		self.assertEqual(self._mover(self.b).status_code, 200)
+		self.assertEqual(self._mover(self.c).status_code, 409)
+
+
+class IdempotenciaTests(TestCase):
+	def setUp(self):
+		r = Regimiento.objects.create(nombre="R")
+		c = Compania.objects.create(nombre="C", regimiento=r)
+		p = Peloton.objects.create(nombre="P", compania=c)
+		self.s1 = Escuadra.objects.create(nombre="S1", peloton=p)
+		self.s2 = Escuadra.objects.create(nombre="S2", peloton=p)
+		self.a = Miembro.objects.create(nombre_milsim="A", escuadra=self.s1)
+
+	def _mover(self, destino, clave='k-1'):
+		return self.client.post(
+			reverse('transferir_personal'),
+			json.dumps({'persona_id': self.a.id, 'escuadra_destino_id': destino.id}),
+			content_type='application/json',
+			HTTP_IDEMPOTENCY_KEY=clave,
+		)
+
+	def test_replay_returns_stored_response_without_touching_members(self):
+		primera = self._mover(self.s2)
+		self.assertEqual(primera.status_code, 200)
+		with CaptureQueriesContext(connection) as consultas:
+			repetida = self._mover(self.s2)
+		self.assertFalse([q for q in consultas.captured_queries if 'orbat_miembro' in q['sql']])
+		self.assertEqual(repetida.status_code, 200)
+		self.assertEqual(repetida['Idempotent-Replayed'], 'true')
+		self.assertEqual(repetida.json(), primera.json())
+		# Misma clave con otro cuerpo
+		self.assertEqual(self._mover(self.s1).status_code, 422)
+		self.a.refresh_from_db()
+		self.assertEqual(self.a.escuadra_id, self.s2.id)
+
+	def test_expired_keys_are_purged(self):
+		self._mover(self.s2)
+		ClaveIdempotencia.objects.update(creada=timezone.now() - timedelta(days=2))
+		out = StringIO()
+		call_command('purge_idempotency_keys', stdout=out)
+		self.assertIn('1', out.getvalue())
+		self.assertFalse(ClaveIdempotencia.objects.exists())
+
+	def test_abandoned_reservation_is_taken_over_after_lease(self):
+		cuerpo = json.dumps({'persona_id': self.a.id, 'escuadra_destino_id': self.s2.id}).encode()
+		huella = hashlib.blake2b(cuerpo, digest_size=16).hexdigest()
+		registro = ClaveIdempotencia.objects.create(endpoint=reverse('transferir_personal'), clave='k-1', huella=huella)
+		self.assertEqual(self._mover(self.s2).status_code, 409)
+		ClaveIdempotencia.objects.filter(pk=registro.pk).update(creada=timezone.now() - timedelta(minutes=5))
+		self.assertEqual(self._mover(self.s2).status_code, 200)
+		self.assertEqual(ClaveIdempotencia.objects.get().status, 200)
+
+	def test_lost_race_conflict_is_not_replayed(self):
+		cuerpo = json.dumps({'persona_id': self.a.id, 'escuadra_destino_id': self.s2.id, 'version': 7})
+		mover = lambda: self.client.post(
+			reverse('transferir_personal'), cuerpo, content_type='application/json', HTTP_IDEMPOTENCY_KEY='k-2',
+		)
+		self.assertEqual(mover().json()['error'], 'stale_version')
+		self.assertFalse(ClaveIdempotencia.objects.exists())
+		Miembro.objects.filter(pk=self.a.pk).update(version=7)
+		self.assertEqual(mover().status_code, 200)
+
+	def test_key_write_failure_returns_json_db_error(self):
+		update = QuerySet.update
+
+		def bloqueada(qs, **kwargs):
+			if qs.model is ClaveIdempotencia:
+				raise OperationalError('database is locked')
+			return update(qs, **kwargs)
+
+		with mock.patch.object(QuerySet, 'update', bloqueada):
+			resp = self._mover(self.s2)
+		self.assertEqual(resp.status_code, 500)
+		self.assertEqual(resp.json()['error'], 'db_error')
+		self.a.refresh_from_db()
+		self.assertEqual(self.a.escuadra_id, self.s1.id)
+		self.assertFalse(ClaveIdempotencia.objects.exists())
+
+
+class MovimientoPersonalTests(TestCase):
+	def setUp(self):
+		r = Regimiento.objects.create(nombre="R")
+		self.c1 = Compania.objects.create(nombre="C1", regimiento=r)
+		self.c2 = Compania.objects.create(nombre="C2", regimiento=r)
+		p1 = Peloton.objects.create(nombre="P1", compania=self.c1)
+		p2 = Peloton.objects.create(nombre="P2", compania=self.c2)
+		self.s1 = Escuadra.objects.create(nombre="S1", peloton=p1)
+		self.s1b = Escuadra.objects.create(nombre="S1b", peloton=p1)
+		self.s2 = Escuadra.objects.create(nombre="S2", peloton=p2)
+		self.a = Miembro.objects.create(nombre_milsim="A", escuadra=self.s1)
+		self.b = Miembro.objects.create(nombre_milsim="B", escuadra=self.s1)
+		self.user = User.objects.create_user(username='oficial', password='p')
+		self.user.user_permissions.add(Permission.objects.get(codename='change_miembro'))
+
+	def test_single_transfer_records_actor_and_rutas(self):
+		self.client.login(username='oficial', password='p')
+		self.client.post(
+			reverse('transferir_personal'),
+			json.dumps({'persona_id': self.a.id, 'escuadra_destino_id': self.s2.id}),
+			content_type='application/json',
+		)
+		mov = MovimientoPersonal.objects.de_miembro(self.a).get()
+		self.assertEqual((mov.ruta_origen, mov.ruta_destino), (self.s1.ruta, self.s2.ruta))
+		self.assertEqual(mov.actor, self.user)
+		with self.assertRaises(PermissionDenied):
+			mov.delete()
+
+	def test_batch_bulk_creates_and_traffic_query(self):
+		self.client.force_login(self.user)
+		resp = self.client.post(
+			reverse('transferir_personal_lote'),
+			json.dumps({'movimientos': [
+				{'persona_id': self.a.id, 'escuadra_destino_id': self.s2.id},
+				{'persona_id': self.b.id, 'escuadra_destino_id': self.s1b.id},
+			]}),
+			content_type='application/json',
+		)
+		self.assertEqual(resp.status_code, 200)
+		self.assertEqual(set(MovimientoPersonal.objects.values_list('actor', flat=True)), {self.user.id})
+		# B se movió dentro de C1: no es tráfico de entrada a C1
+		self.assertEqual(list(MovimientoPersonal.objects.entradas_a(self.c2).values_list('miembro', flat=True)), [self.a.id])
+		self.assertFalse(MovimientoPersonal.objects.entradas_a(self.c1).exists())
+		manana = timezone.now() + timedelta(days=1)
+		self.assertFalse(MovimientoPersonal.objects.entradas_a(self.c2, desde=manana).exists())
+
+
+class AsyncViewsTests(TestCase):
+	def setUp(self):
+		r = Regimiento.objects.create(nombre="R")
+		p = Peloton.objects.create(nombre="P", compania=Compania.objects.create(nombre="C", regimiento=r))
+		self.s = Escuadra.objects.create(nombre="S", peloton=p)
+		Miembro.objects.create(nombre_milsim="Async-1", escuadra=self.s)
+		self.staff = User.objects.create_user(username='staff_async', password='p', is_staff=True)
+		self.factory = AsyncRequestFactory()
+
+	async def test_async_tree_matches_sync(self):
+		arbol = await abuild_orbat_tree()
+		self.assertEqual(arbol, await sync_to_async(build_orbat_tree)())
+		self.assertEqual(arbol[0].efectivos_activos, 1)
+
+	async def test_async_board(self):
+		resp = await async_views.escuadras_dashboard(self.factory.get('/orbat/board/', {'peloton': self.s.peloton_id}))
+		self.assertContains(resp, "Async-1")
+		resp = await async_views.escuadras_dashboard(self.factory.get('/orbat/board/', {'peloton': 'x'}))
+		self.assertEqual(resp.status_code, 400)
+
+	async def test_async_audit_list_requires_staff(self):
+		request = self.factory.get('/admin/auditoria/')
+		request.user = AnonymousUser()
+		resp = await async_views.audit_log_list(request)
+		self.assertEqual(resp.status_code, 302)
+		request = self.factory.get('/admin/auditoria/')
+		request.user = self.staff
+		resp = await async_views.audit_log_list(request)
+		self.assertEqual(resp.status_code, 200)
+
+	async def test_async_middleware_blocks_password_change(self):
+		await sync_to_async(self.client.force_login)(self.staff)
+		self.async_client.cookies = self.client.cookies
+		resp = await self.async_client.get(reverse('admin:password_change'))
+		self.assertRedirects(resp, reverse('admin:index'), fetch_redirect_response=False)
+
+
+class AsyncTransferenciaTests(TransactionTestCase):
+	async def test_async_transfer_runs_sync_view_off_thread(self):
+		def datos():
+			r = Regimiento.objects.create(nombre="R")
+			p = Peloton.objects.create(nombre="P", compania=Compania.objects.create(nombre="C", regimiento=r))
+			s1 = Escuadra.objects.create(nombre="S1", peloton=p)
+			s2 = Escuadra.objects.create(nombre="S2", peloton=p)
+			return Miembro.objects.create(nombre_milsim="A", escuadra=s1), s2
+
+		a, s2 = await sync_to_async(datos)()
+		request = AsyncRequestFactory().post(
+			'/api/transferir_personal/',
+			json.dumps({'persona_id': a.id, 'escuadra_destino_id': s2.id}),
+			content_type='application/json',
+		)
+		request.user = AnonymousUser()
+		resp = await async_views.transferir_personal(request)
+		self.assertEqual(resp.status_code, 200)
+		self.assertEqual((await Miembro.objects.aget(pk=a.id)).escuadra_id, s2.id)
+		self.assertTrue(async_views.transferir_personal.csrf_exempt)
+
+
+class AntiguedadRangoTests(TestCase):
+	def test_roster_orders_by_seniority_not_code(self):
+		for nick, rango in (("Sargento", Rango.SGT), ("Coronel", Rango.COL), ("Cabo", Rango.CPL), ("Alferez", Rango.LT2)):
+			Miembro.objects.create(nombre_milsim=nick, rango=rango)
+		self.assertEqual(list(Miembro.objects.values_list('nombre_milsim', flat=True)), ["Coronel", "Alferez", "Sargento", "Cabo"])
+
+	def test_save_and_bulk_paths_keep_antiguedad(self):
+		m = Miembro.objects.create(nombre_milsim="A")
+		m.rango = Rango.CPT
+		m.save(update_fields=['rango'])
+		self.assertEqual(Miembro.objects.get(pk=m.pk).antiguedad, ANTIGUEDAD_RANGO['CPT'])
+
+		Miembro.objects.filter(pk=m.pk).update(rango=Rango.MAJ)
+		self.assertEqual(Miembro.objects.get(pk=m.pk).antiguedad, ANTIGUEDAD_RANGO['MAJ'])
+
+		b, = Miembro.objects.bulk_create([Miembro(nombre_milsim="B", rango=Rango.SFC)])
+		b = Miembro.objects.get(nombre_milsim="B")
+		self.assertEqual(b.antiguedad, ANTIGUEDAD_RANGO['SFC'])
+		b.rango = Rango.COL
+		Miembro.objects.bulk_update([b], ['rango'])
+		self.assertEqual(Miembro.objects.get(pk=b.pk).antiguedad, ANTIGUEDAD_RANGO['COL'])
+
+
+class ExplainHotQueriesTests(TestCase):
+	def test_detects_sequential_scans_per_backend(self):
+		from .management.commands.explain_hot_queries import escaneos_secuenciales
+		self.assertEqual(escaneos_secuenciales('sqlite', "3 0 0 SCAN orbat_miembro"), ['orbat_miembro'])
+		self.assertEqual(escaneos_secuenciales('sqlite', "4 0 0 SCAN orbat_miembro USING INDEX orbat_miembro_antig_nombre"), [])
+		self.assertEqual(escaneos_secuenciales('postgresql', "Seq Scan on orbat_miembro  (cost=0.00..1.01)"), ['orbat_miembro'])
+
+	def test_command_explains_every_hot_query(self):
+		out = StringIO()
+		call_command('explain_hot_queries', stdout=out)
+		self.assertIn('tablero: miembros activos', out.getvalue())
+		self.assertIn('Listo.', out.getvalue())
+
+
+class UnaUnidadTests(TestCase):
+	def setUp(self):
+		r = Regimiento.objects.create(nombre="R")
+		self.c = Compania.objects.create(nombre="C", regimiento=r)
+		self.p = Peloton.objects.create(nombre="P", compania=self.c)
+		self.s1 = Escuadra.objects.create(nombre="S1", peloton=self.p)
+		self.s2 = Escuadra.objects.create(nombre="S2", peloton=self.p)
+
+	def test_db_rejects_more_than_one_unit(self):
+		m = Miembro.objects.create(nombre_milsim="A", escuadra=self.s1)
+		with self.assertRaises(IntegrityError), transaction.atomic():
+			Miembro.objects.filter(pk=m.pk).update(peloton=self.p)
+		m.peloton = self.p
+		with self.assertRaises(ValidationError):
+			m.full_clean()
+
+	def test_transfer_sets_only_escuadra_and_derives_ancestry(self):
+		hq = Miembro.objects.create(nombre_milsim="HQ", peloton=self.p)
+		for modo in ('bloqueo', 'optimista'):
+			destino = self.s1 if modo == 'bloqueo' else self.s2
+			with override_settings(ORBAT_TRANSFER_MODE=modo):
+				resp = self.client.post(
+					reverse('transferir_personal'),
+					json.dumps({'persona_id': hq.id, 'escuadra_destino_id': destino.id}),
+					content_type='application/json',
+				)
+			self.assertEqual(resp.status_code, 200)
+			hq.refresh_from_db()
+			self.assertEqual((hq.escuadra_id, hq.peloton_id, hq.compania_id, hq.regimiento_id), (destino.id, None, None, None))
+			self.assertEqual(hq.ruta, destino.ruta)
+		self.assertEqual(hq.jerarquia(), (self.c.regimiento, self.c, self.p, self.s2))
+
+
+class EtiquetaUnidadTests(TestCase):
+	def setUp(self):
+		r = Regimiento.objects.create(nombre="R")
+		self.c = Compania.objects.create(nombre="Alpha", regimiento=r)
+		self.c2 = Compania.objects.create(nombre="Bravo", regimiento=r)
+		self.p = Peloton.objects.create(nombre="1er Pelotón", compania=self.c)
+		self.s = Escuadra.objects.create(nombre="Escuadra 1-1", peloton=self.p)
+
+	def test_label_is_stored_and_str_needs_no_query(self):
+		self.assertEqual(self.s.etiqueta, "Alpha | 1er Pelotón | Escuadra 1-1")
+		s = Escuadra.objects.get(pk=self.s.pk)
+		p = Peloton.objects.get(pk=self.p.pk)
+		with self.assertNumQueries(0):
+			self.assertEqual(str(s), "Alpha | 1er Pelotón | Escuadra 1-1")
+			self.assertEqual(str(p), "Alpha | 1er Pelotón")
+
+	def test_parent_rename_and_move_refresh_branch_in_bulk(self):
+		self.c.nombre = "Alfa"
+		with self.assertNumQueries(7):
+			self.c.save()
+		self.assertEqual(Escuadra.objects.get(pk=self.s.pk).etiqueta, "Alfa | 1er Pelotón | Escuadra 1-1")
+		self.p.compania = self.c2
+		self.p.save()
+		self.assertEqual(self.p.etiqueta, "Bravo | 1er Pelotón")
+		self.assertEqual(Escuadra.objects.get(pk=self.s.pk).etiqueta, "Bravo | 1er Pelotón | Escuadra 1-1")
+
+
+class ReporteEfectivosTests(TestCase):
+	def setUp(self):
+		cache.clear()
+		self.r = Regimiento.objects.create(nombre="R")
+		self.r2 = Regimiento.objects.create(nombre="R2")
+		c = Compania.objects.create(nombre="C", regimiento=self.r)
+		self.s = Escuadra.objects.create(nombre="S", peloton=Peloton.objects.create(nombre="P", compania=c))
+		Miembro.objects.create(nombre_milsim="HQ", rango="CPT", compania=c)
+		Miembro.objects.create(nombre_milsim="A", rango="SGT", escuadra=self.s)
+		Miembro.objects.create(nombre_milsim="B", rango="PV1", escuadra=self.s)
+		Miembro.objects.create(nombre_milsim="Baja", rango="PV1", escuadra=self.s, activo=False)
+		Miembro.objects.create(nombre_milsim="Otro", rango="PV1", regimiento=self.r2)
+
+	def test_one_grouped_query_for_every_unit(self):
+		from .strength import build_strength_report
+		with self.assertNumQueries(1):
+			reporte = build_strength_report()
+		self.assertEqual(reporte['total']['activos'], 4)
+		regimiento = reporte['unidades'][f"R{self.r.pk}"]
+		self.assertEqual((regimiento['activos'], regimiento['inactivos']), (3, 1))
+		self.assertEqual(list(regimiento['por_rango']), ['CPT', 'SGT', 'PV1'])
+		self.assertEqual(reporte['unidades'][f"E{self.s.pk}"]['por_rango']['PV1'], {'activos': 1, 'inactivos': 1})
+
+	def test_api_serves_cached_report(self):
+		resp = self.client.get(reverse('orbat_strength_api'))
+		self.assertEqual(resp.status_code, 200)
+		data = resp.json()
+		self.assertEqual([r['activos'] for r in data['regimientos']], [3, 1])
+		self.assertEqual(data['regimientos'][0]['companias'][0]['pelotones'][0]['escuadras'][0]['inactivos'], 1)
+		with self.assertNumQueries(0):
+			self.client.get(reverse('orbat_strength_api'))
+		self.assertEqual(self.client.get(reverse('orbat_strength_api'), HTTP_IF_NONE_MATCH=resp['ETag']).status_code, 304)
+
+	def test_admin_changelist_and_dashboard_show_report(self):
+		User.objects.create_superuser(username='jefe', password='p')
+		self.client.login(username='jefe', password='p')
+		resp = self.client.get(reverse('admin:orbat_escuadra_changelist'))
+		self.assertContains(resp, '1 SGT · 1 PV1')
+		self.assertContains(self.client.get(reverse('admin:index')), 'id="efectivos-module"')
+
+
+class MiembroChangelistTests(TestCase):
+	def setUp(self):
+		cache.clear()
+		self.r = Regimiento.objects.create(nombre="R")
+		self.c = Compania.objects.create(nombre="C", regimiento=self.r)
+		self.p = Peloton.objects.create(nombre="P", compania=self.c)
+		User.objects.create_superuser(username='jefe', password='p')
+		self.client.login(username='jefe', password='p')
+
+	def _poblar(self, desde, hasta):
+		for i in range(desde, hasta):
+			s = Escuadra.objects.create(nombre=f"S{i}", peloton=self.p, capacidad=10)
+			usuario = User.objects.create_user(username=f"op{i}")
+			Miembro.objects.create(nombre_milsim=f"Sqd{i}", escuadra=s, usuario=usuario)
+			Miembro.objects.create(nombre_milsim=f"HQP{i}", peloton=self.p)
+			Miembro.objects.create(nombre_milsim=f"HQC{i}", compania=self.c)
+			Miembro.objects.create(nombre_milsim=f"HQR{i}", regimiento=self.r)
+
+	def _consultas(self):
+		cache.clear()
+		with CaptureQueriesContext(connection) as ctx:
+			resp = self.client.get(reverse('admin:orbat_miembro_changelist'))
+		self.assertEqual(resp.status_code, 200)
+		return len(ctx), resp
+
+	def test_query_count_does_not_grow_with_rows_or_page_size(self):
+		self._poblar(0, 2)
+		base, _ = self._consultas()
+		self._poblar(2, 150)
+		self.assertEqual(self._consultas()[0], base)
+		from django.contrib import admin as django_admin
+		with mock.patch.object(django_admin.site._registry[Miembro], 'list_per_page', 500):
+			consultas, resp = self._consultas()
+		self.assertEqual(consultas, base)
+		self.assertContains(resp, "C | P | S149")
+		self.assertContains(resp, "HQ C | P")
+
+
+class ConteoAproximadoTests(TestCase):
+	def setUp(self):
+		cache.clear()
+		for i in range(3):
+			Miembro.objects.create(nombre_milsim=f"M{i}")
+
+	def test_small_table_counts_exactly(self):
+		from .paginacion import ConteoAproximadoPaginator
+		paginator = ConteoAproximadoPaginator(Miembro.objects.all(), 2)
+		self.assertEqual(paginator.count, 3)
+		Miembro.objects.create(nombre_milsim="M3")
+		self.assertEqual(ConteoAproximadoPaginator(Miembro.objects.all(), 2).count, 4)
+
+	@override_settings(ORBAT_APPROX_COUNT_THRESHOLD=2)
+	def test_large_table_reuses_cached_count_and_skips_full_count(self):
+		from .paginacion import ConteoAproximadoPaginator
+		qs = Miembro.objects.filter(activo=True)
+		self.assertEqual(ConteoAproximadoPaginator(qs, 2).count, 3)
+		Miembro.objects.create(nombre_milsim="M3")
+		with self.assertNumQueries(0):
+			self.assertEqual(ConteoAproximadoPaginator(qs.order_by('pk'), 2).count, 3)
+		User.objects.create_superuser(username='jefe', password='p')
+		self.client.login(username='jefe', password='p')
+		resp = self.client.get(reverse('admin:orbat_miembro_changelist'))
+		self.assertFalse(resp.context['cl'].show_full_result_count)
+
+	@override_settings(ORBAT_APPROX_COUNT_THRESHOLD=2)
+	def test_table_size_cached_apart_from_counts(self):
+		from .paginacion import ConteoAproximadoPaginator, filas_tabla
+		self.assertEqual(ConteoAproximadoPaginator(Miembro.objects.filter(activo=True), 2).count, 3)
+		# Otro filtro: sólo su propio COUNT, el tamaño de la tabla ya está cacheado
+		with self.assertNumQueries(1):
+			self.assertEqual(ConteoAproximadoPaginator(Miembro.objects.filter(rol="Fusilero"), 2).count, 3)
+		cache.clear()
+		with connection.cursor() as cursor:
+			cursor.execute('ANALYZE orbat_miembro')
+		with self.assertNumQueries(1):
+			self.assertEqual(filas_tabla(Miembro), 3)
+
+	@override_settings(ORBAT_APPROX_COUNT_THRESHOLD=2)
+	def test_pages_correct_a_wrong_estimate(self):
+		from .paginacion import ConteoAproximadoPaginator
+		for i in range(3, 5):
+			Miembro.objects.create(nombre_milsim=f"M{i}")
+		qs = Miembro.objects.order_by('pk')
+		with mock.patch('orbat.paginacion._contar_aproximado', return_value=1):
+			paginator = ConteoAproximadoPaginator(qs, 2)
+			# Una estimación que cabe en una página se comprueba
+			self.assertEqual(paginator.count, 3)
+			pagina = paginator.page(2)
+			self.assertTrue(pagina.has_next())
+			self.assertEqual(paginator.count, 5)
+			pagina = paginator.page(3)
+			self.assertEqual([m.nombre_milsim for m in pagina], ["M4"])
+			self.assertFalse(pagina.has_next())
+		with mock.patch('orbat.paginacion._contar_aproximado', return_value=100):
+			paginator = ConteoAproximadoPaginator(qs, 2)
+			self.assertEqual(paginator.num_pages, 50)
+			self.assertEqual(paginator.get_page(40).number, 3)
+			self.assertEqual(paginator.count, 5)
+
+
+class BusquedaTests(TestCase):
+	def setUp(self):
+		self.r = Regimiento.objects.create(nombre="R")
+		self.c = Compania.objects.create(nombre="Alpha", regimiento=self.r)
+		self.p = Peloton.objects.create(nombre="1er", compania=self.c)
+		self.s = Escuadra.objects.create(nombre="Bravo", peloton=self.p)
+		self.usuario = User.objects.create_user(username="jperez", first_name="Juan")
+		self.largo = Miembro.objects.create(nombre_milsim="Ghostrider", usuario=self.usuario)
+		self.corto = Miembro.objects.create(nombre_milsim="Ghost")
+		Miembro.objects.create(nombre_milsim="Viper")
+
+	def test_prefix_ranking_and_user_fields(self):
+		from .busqueda import buscar
+		# FTS5 (SQLite) y el icontains de los motores sin índice dan lo mismo
+		for fts in (True, False):
+			with mock.patch('orbat.busqueda._fts_disponible', return_value=fts):
+				self.assertEqual(list(buscar(Miembro.objects.all(), "gho")), [self.corto, self.largo])
+				self.assertEqual(list(buscar(Miembro.objects.all(), "juan")), [self.largo])
+				self.assertEqual(list(buscar(Escuadra.objects.all(), "alpha bra")), [self.s])
+				self.assertEqual(list(buscar(Escuadra.objects.all(), "charlie")), [])
+		self.usuario.first_name = "Pedro"
+		self.usuario.save()
+		self.assertEqual(list(buscar(Miembro.objects.all(), "juan")), [])
+
+	def test_substrings_and_short_words_match_icontains(self):
+		from .busqueda import buscar
+		herrera = Miembro.objects.create(nombre_milsim="Herrera")
+		for fts in (True, False):
+			with mock.patch('orbat.busqueda._fts_disponible', return_value=fts):
+				self.assertEqual(list(buscar(Miembro.objects.all(), "rrer")), [herrera])
+				self.assertEqual(list(buscar(Miembro.objects.all(), "HOST")), [self.corto, self.largo])
+				# Menos de 3 caracteres: sin índice trigram, por icontains
+				self.assertEqual(list(buscar(Miembro.objects.all(), "ip")), [Miembro.objects.get(nombre_milsim="Viper")])
+				self.assertEqual(list(buscar(Miembro.objects.all(), "gh der")), [self.largo])
+
+	def test_admin_changelist_keeps_ranking(self):
+		Miembro.objects.create(nombre_milsim="Aghost")
+		User.objects.create_superuser(username='jefe', password='p')
+		self.client.login(username='jefe', password='p')
+		url = reverse('admin:orbat_miembro_changelist')
+		resp = self.client.get(url, {'q': 'ghost'})
+		self.assertEqual([m.nombre_milsim for m in resp.context['cl'].result_list], ["Ghost", "Ghostrider", "Aghost"])
+		# Orden elegido por columna: manda sobre la relevancia
+		columna = resp.context['cl'].list_display.index('nombre_milsim')
+		resp = self.client.get(url, {'q': 'ghost', 'o': str(columna)})
+		self.assertEqual([m.nombre_milsim for m in resp.context['cl'].result_list], ["Aghost", "Ghost", "Ghostrider"])
+
+	def test_admin_autocomplete_and_typeahead_api(self):
+		User.objects.create_superuser(username='jefe', password='p')
+		self.client.login(username='jefe', password='p')
+		resp = self.client.get(reverse('admin:autocomplete'), {
+			'term': 'bra', 'app_label': 'orbat', 'model_name': 'miembro', 'field_name': 'escuadra',
+		})
+		self.assertEqual([r['id'] for r in resp.json()['results']], [str(self.s.pk)])
+		resp = self.client.get(reverse('orbat_busqueda_api'), {'q': 'gho', 'tipo': 'miembro,escuadra'})
+		self.assertEqual([r['id'] for r in resp.json()['resultados']], [self.corto.pk, self.largo.pk])
+		self.assertEqual(self.client.get(reverse('orbat_busqueda_api'), {'q': 'gho', 'tipo': 'x'}).status_code, 400)
+
+
+class ExportacionCsvTests(TestCase):
+	def setUp(self):
+		r = Regimiento.objects.create(nombre="R")
+		c = Compania.objects.create(nombre="C", regimiento=r)
+		s = Escuadra.objects.create(nombre="S", peloton=Peloton.objects.create(nombre="P", compania=c))
+		self.m = Miembro.objects.create(nombre_milsim="Csv-1", escuadra=s, usuario=User.objects.create_user(username="op"))
+		self.hq = Miembro.objects.create(nombre_milsim="Csv-HQ", compania=c)
+		self.staff = User.objects.create_superuser(username='jefe', password='p')
+		LogEntry.objects.create(
+			user=self.staff, content_type=ContentType.objects.get_for_model(Miembro), object_id=str(self.m.pk),
+			object_repr="Csv-1", action_flag=CHANGE, change_message="cambio",
+		)
+
+	def test_members_export_streams_hierarchy_from_ruta(self):
+		self.client.login(username='jefe', password='p')
+		resp = self.client.post(reverse('admin:orbat_miembro_changelist'), {
+			'action': 'export_members_csv', '_selected_action': [self.m.pk, self.hq.pk],
+		})
+		self.assertTrue(resp.streaming)
+		lineas = b''.join(resp.streaming_content).decode().splitlines()
+		self.assertEqual(lineas[0], 'rango,nombre_milsim,rol,usuario,regimiento,compania,peloton,escuadra,activo')
+		self.assertIn('Csv-1,Fusilero,op,R,C,P,S,True', lineas[1] + lineas[2])
+		self.assertIn('Csv-HQ,Fusilero,,R,C,,,True', lineas[1] + lineas[2])
+
+	async def test_async_audit_export_streams_async_iterator(self):
+		request = AsyncRequestFactory().get('/admin/auditoria/', {'export': 'csv'})
+		request.user = self.staff
+		resp = await async_views.audit_log_list(request)
+		self.assertTrue(resp.is_async)
+		lineas = b''.join([parte async for parte in resp]).decode().splitlines()
+		self.assertEqual(len(lineas), 2)
+		self.assertIn('jefe,Modificado,miembro,Csv-1,cambio', lineas[1])
+
+	def test_benchmark_measures_single_export(self):
+		out = StringIO()
+		call_command('benchmark_csv_export', medir='miembros:streaming', stdout=out)
+		metricas = json.loads(out.getvalue())
+		self.assertGreater(metricas['bytes'], 0)
+		self.assertLessEqual(metricas['ttfb_ms'], metricas['total_ms'])
+
+
+class ReasignacionMasivaTests(TestCase):
+	def setUp(self):
+		cache.clear()
+		self.r = Regimiento.objects.create(nombre="R")
+		self.c = Compania.objects.create(nombre="C", regimiento=self.r)
+		self.p1 = Peloton.objects.create(nombre="P1", compania=self.c)
+		self.p2 = Peloton.objects.create(nombre="P2", compania=self.c)
+		self.s1 = Escuadra.objects.create(nombre="S1", peloton=self.p1, capacidad=50)
+		self.s2 = Escuadra.objects.create(nombre="S2", peloton=self.p2, capacidad=3)
+		self.jefe = User.objects.create_superuser(username='jefe', password='p')
+
+	def _poblar(self, n, **unidad):
+		return [Miembro.objects.create(nombre_milsim=f"Rs{Miembro.objects.count()}", **unidad).pk for _ in range(n)]
+
+	def test_set_based_move_keeps_fks_counters_and_history(self):
+		from .transfers import reasignar
+		pocos = self._poblar(2, escuadra=self.s1)
+		muchos = self._poblar(20, escuadra=self.s1)
+		with CaptureQueriesContext(connection) as pocos_ctx:
+			self.assertEqual(reasignar(Miembro.objects.filter(pk__in=pocos), self.p2, actor=self.jefe), 2)
+		with CaptureQueriesContext(connection) as muchos_ctx:
+			self.assertEqual(reasignar(Miembro.objects.filter(pk__in=muchos + pocos), self.p2, actor=self.jefe), 20)
+		self.assertEqual(len(pocos_ctx), len(muchos_ctx))
+		movidos = Miembro.objects.filter(pk__in=muchos)
+		self.assertEqual(set(movidos.values_list('peloton_id', 'escuadra_id', 'compania_id', 'regimiento_id', 'ruta')),
+			{(self.p2.pk, None, None, None, self.p2.ruta)})
+		for unidad, activos in ((self.s1, 0), (self.p1, 0), (self.p2, 22), (self.c, 22)):
+			unidad.refresh_from_db()
+			self.assertEqual(unidad.efectivos_activos, activos)
+		self.assertEqual(MovimientoPersonal.objects.count(), 22)
+		self.assertEqual(LogEntry.objects.filter(action_flag=CHANGE, change_message__startswith="Reasignado").count(), 22)
+
+	def test_squad_capacity_rejects_whole_selection(self):
+		from .transfers import reasignar
+		self._poblar(1, escuadra=self.s2)
+		ids = self._poblar(3, peloton=self.p1)
+		with self.assertRaises(EscuadraLlena):
+			reasignar(Miembro.objects.filter(pk__in=ids), self.s2, actor=self.jefe)
+		self.assertEqual(Miembro.objects.filter(pk__in=ids, peloton=self.p1).count(), 3)
+		self.s2.refresh_from_db()
+		self.assertEqual(self.s2.efectivos_total, 1)
+		self.assertFalse(MovimientoPersonal.objects.exists())
+
+	def test_admin_action_asks_for_unit_then_moves(self):
+		ids = self._poblar(3, peloton=self.p1)
+		self.client.login(username='jefe', password='p')
+		datos = {'action': 'reasignar_unidad', '_selected_action': ids}
+		resp = self.client.post(reverse('admin:orbat_miembro_changelist'), datos)
+		self.assertContains(resp, 'Reasignar 3 miembros')
+		resp = self.client.post(reverse('admin:orbat_miembro_changelist'), {**datos, 'aplicar': '1', 'unidad': f"E{self.s1.pk}"})
+		self.assertEqual(resp.status_code, 302)
+		self.assertEqual(Miembro.objects.filter(escuadra=self.s1).count(), 3)
+
+
+class InstanciaViejaTests(TestCase):
+	def setUp(self):
+		r = Regimiento.objects.create(nombre="R")
+		self.cc = Compania.objects.create(nombre="CC", regimiento=r)
+		p = Peloton.objects.create(nombre="P", compania=self.cc)
+		self.a = Escuadra.objects.create(nombre="A", peloton=p)
+		self.b = Escuadra.objects.create(nombre="B", peloton=p)
+		self.x = Miembro.objects.create(nombre_milsim="X", escuadra=self.a)
+
+	def test_stale_instance_save_after_concurrent_move_keeps_counters(self):
+		from .jerarquia import recalcular_contadores
+		vieja = Miembro.objects.get(pk=self.x.pk)
+		fresca = Miembro.objects.get(pk=self.x.pk)
+		fresca.escuadra = self.b
+		fresca.save()
+		vieja.escuadra = None
+		vieja.compania = self.cc
+		vieja.save()
+		for unidad, total in ((self.a, 0), (self.b, 0), (self.cc, 1)):
+			unidad.refresh_from_db()
+			self.assertEqual(unidad.efectivos_total, total)
+		self.assertEqual(recalcular_contadores(Regimiento, Compania, Peloton, Escuadra, Miembro), 0)
+
+	def test_capacity_guard_holds_after_stale_save(self):
+		from .transfers import LoteRechazado, transferir_lote, transferir_optimista
+		self.a.capacidad = 2
+		self.a.save()
+		Miembro.objects.create(nombre_milsim="Y", escuadra=self.a)
+		z = Miembro.objects.create(nombre_milsim="Z", peloton=self.a.peloton)
+		vieja = Miembro.objects.get(pk=self.x.pk)
+		fresca = Miembro.objects.get(pk=self.x.pk)
+		fresca.escuadra = self.b
+		fresca.save()
+		# Guardar la instancia vieja (como un formulario del admin) devuelve X a A
+		vieja.rol = "Médico"
+		vieja.save()
+		self.a.refresh_from_db()
+		self.assertEqual(self.a.efectivos_total, 2)
+		mov = {'persona_id': z.pk, 'escuadra_destino_id': self.a.pk}
+		with self.assertRaises(LoteRechazado) as ctx:
+			transferir_optimista(mov)
+		self.assertEqual(ctx.exception.resultados[0]['error'], 'destination_full')
+		with self.assertRaises(LoteRechazado):
+			transferir_lote([mov])
@@ -0,0 +1,346 @@
+"""
+Traslados de personal entre escuadras.
+
+Un lote de movimientos se aplica todo o nada dentro de una transacción:
+
+1. Se bloquean las escuadras involucradas (destinos y orígenes) y después
+   los miembros nombrados, siempre en orden de pk. Dos lotes que se solapan
+   piden los mismos candados en el mismo orden y no pueden interbloquearse.
+2. Los movimientos se simulan en memoria, en el orden recibido.
+3. La capacidad (`Escuadra.capacidad`) se valida sobre el estado final del
+   lote con los contadores `efectivos_total` de las escuadras bloqueadas, así
+   un intercambio en dos pasos no falla por el estado intermedio y no hace
+   falta contar ni bloquear a los demás miembros.
+4. Sólo si todo es válido se guardan los miembros que cambiaron y su
+   `MovimientoPersonal` (un `bulk_create` en la misma transacción).
+
+Para un solo movimiento hay además un camino optimista
+(`transferir_optimista`): sin `select_for_update`, con UPDATEs condicionados
+a la `version` leída de Miembro y Escuadra y con la plaza reservada por un
+incremento guardado del contador (ver `ajustar_contadores`). Si otro
+traslado se adelantó, falla enseguida con `stale_version` (o
+`destination_full`) en vez de esperar un candado. La vista individual elige
+el modo con el setting ORBAT_TRANSFER_MODE.
+
+Para mover a muchos a la vez a una misma unidad (acción del admin) está
+`reasignar`, con sentencias por conjunto en lugar de una fila por miembro.
+"""
+
+from collections import Counter
+
+from django.contrib.admin.models import CHANGE, LogEntry
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.db.models import F
+
+from .cache import bump_orbat_version
+from .models import Escuadra, EscuadraLlena, Miembro, MovimientoPersonal, ajustar_contadores
+
+# Código de error por movimiento -> status HTTP del lote
+ERRORES = {
+    'invalid_move': 400,
+    'persona_a_reemplazar_not_in_destination': 400,
+    'persona_not_found': 404,
+    'escuadra_not_found': 404,
+    'destination_full': 409,
+    'concurrent_change': 409,
+    'stale_version': 409,
+}
+
+
+class LoteRechazado(Exception):
+    """El lote no se aplicó. `resultados` lleva el detalle por movimiento."""
+
+    def __init__(self, resultados):
+        super().__init__('batch_rejected')
+        self.resultados = resultados
+        primero = next(r['error'] for r in resultados if 'error' in r)
+        self.status = ERRORES[primero]
+
+
+def _id(valor):
+    try:
+        return int(valor) if valor not in (None, '') else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _pedido(mov):
+    if not isinstance(mov, dict):
+        return None, None, None
+    return _id(mov.get('persona_id')), _id(mov.get('escuadra_destino_id')), _id(mov.get('persona_a_reemplazar_id'))
+
+
+def _rechazar(error):
+    raise LoteRechazado([{'indice': 0, 'error': error}])
+
+
+def _movimiento(miembro_id, ruta_origen, ruta_destino, intercambio, actor):
+    return MovimientoPersonal(
+        miembro_id=miembro_id,
+        ruta_origen=ruta_origen,
+        ruta_destino=ruta_destino,
+        tipo=MovimientoPersonal.Tipo.INTERCAMBIO if intercambio else MovimientoPersonal.Tipo.TRASLADO,
+        actor=actor if actor is not None and actor.is_authenticated else None,
+    )
+
+
+def _asignar(miembro, escuadra):
+    # Sólo la unidad efectiva (restricción orbat_miembro_una_unidad); sin
+    # escuadra conserva el regimiento, como el HQ
+    miembro.escuadra = escuadra
+    miembro.peloton = miembro.compania = None
+    if escuadra is not None:
+        miembro.regimiento = None
+
+
+def transferir_lote(movimientos, actor=None):
+    """Aplica una lista de movimientos ``{persona_id, escuadra_destino_id,
+    persona_a_reemplazar_id?}``.
+
+    Como en la transferencia individual, `persona_a_reemplazar_id` sólo se
+    usa si el destino está lleno en ese punto del lote: entonces B pasa a la
+    escuadra de origen de A.
+
+    `actor` (usuario o None) queda registrado en el historial.
+    Devuelve la lista de resultados por movimiento o lanza `LoteRechazado`.
+    """
+    pedidos = [_pedido(mov) for mov in movimientos]
+    nombrados = {pk for persona, _, reemplazar in pedidos for pk in (persona, reemplazar) if pk}
+
+    with transaction.atomic():
+        # Orígenes leídos sin candado; se verifican otra vez tras bloquear
+        origenes = dict(Miembro.objects.filter(pk__in=nombrados).values_list('pk', 'escuadra_id'))
+        ids_escuadras = {destino for _, destino, _ in pedidos if destino}
+        ids_escuadras |= {sqd for sqd in origenes.values() if sqd}
+        escuadras = {
+            e.pk: e for e in Escuadra.objects.select_for_update().filter(pk__in=ids_escuadras).order_by('pk')
+        }
+        miembros = {
+            m.pk: m for m in Miembro.objects.select_for_update().filter(pk__in=nombrados).order_by('pk')
+        }
+
+        estado = {pk: m.escuadra_id for pk, m in miembros.items()}
+        # Altas netas por escuadra respecto de su contador
+        netos = Counter()
+
+        def mover(pk, escuadra):
+            netos[estado[pk]] -= 1
+            netos[escuadra] += 1
+            estado[pk] = escuadra
+
+        intercambios = set()
+        resultados = []
+        for indice, (persona, destino, reemplazar) in enumerate(pedidos):
+            resultado = {'indice': indice}
+            resultados.append(resultado)
+            if not persona or not destino:
+                resultado['error'] = 'invalid_move'
+                continue
+            if persona not in miembros:
+                resultado['error'] = 'persona_not_found'
+                continue
+            if destino not in escuadras:
+                resultado['error'] = 'escuadra_not_found'
+                continue
+            if origenes.get(persona) != miembros[persona].escuadra_id:
+                resultado['error'] = 'concurrent_change'
+                continue
+
+            origen = estado[persona]
+            esc = escuadras[destino]
+            ocupacion = esc.efectivos_total + netos[destino] - (origen == destino)
+            if reemplazar and ocupacion >= esc.capacidad:
+                if estado.get(reemplazar) != destino or reemplazar == persona:
+                    resultado['error'] = 'persona_a_reemplazar_not_in_destination'
+                    continue
+                mover(persona, destino)
+                mover(reemplazar, origen)
+                intercambios.update((persona, reemplazar))
+                resultado.update({
+                    'status': 'swapped',
+                    'moved': persona,
+                    'moved_to': destino,
+                    'replaced': reemplazar,
+                    'replaced_moved_to': origen,
+                })
+            else:
+                mover(persona, destino)
+                resultado.update({'status': 'moved', 'persona_id': persona, 'origen_id': origen, 'destino_id': destino})
+
+        # Capacidad sobre el estado final: sólo cuentan escuadras que crecieron
+        llenas = {
+            sqd for sqd, neto in netos.items()
+            if sqd and neto > 0 and escuadras[sqd].efectivos_total + neto > escuadras[sqd].capacidad
+        }
+        for indice, (_, destino, _) in enumerate(pedidos):
+            if 'error' not in resultados[indice] and destino in llenas:
+                resultados[indice] = {'indice': indice, 'error': 'destination_full'}
+
+        if any('error' in r for r in resultados):
+            raise LoteRechazado(resultados)
+
+        historial = []
+        for pk, miembro in miembros.items():
+            if estado[pk] != miembro.escuadra_id:
+                ruta_origen = miembro.ruta
+                _asignar(miembro, escuadras.get(estado[pk]))
+                miembro.save(update_fields=Miembro.CAMPOS_UNIDAD)
+                historial.append(_movimiento(pk, ruta_origen, miembro.ruta, pk in intercambios, actor))
+        MovimientoPersonal.objects.bulk_create(historial)
+        transaction.on_commit(bump_orbat_version)
+
+    return resultados
+
+
+def versiones_actuales(miembro_ids, escuadra_ids):
+    """Versiones vigentes para que el tablero las actualice tras un traslado."""
+    return {
+        'miembros': dict(Miembro.objects.filter(pk__in=miembro_ids).values_list('pk', 'version')),
+        'escuadras': dict(Escuadra.objects.filter(pk__in=escuadra_ids).values_list('pk', 'version')),
+    }
+
+
+def transferir_optimista(mov, actor=None):
+    """Un traslado (o intercambio) sin candados de lectura.
+
+    Acepta las claves opcionales `version`, `escuadra_destino_version` y
+    `persona_a_reemplazar_version` que el tablero devuelve tal cual las
+    leyó; si no vienen, se usan las leídas aquí. Cada fila se escribe con un
+    UPDATE condicionado a su versión (escuadras y luego miembros, en orden de
+    pk); si alguno no afecta filas se deshace todo con `stale_version`.
+
+    Mismas reglas y resultados que `transferir_lote` con un movimiento.
+    """
+    persona, destino, reemplazar = _pedido(mov)
+    if not persona or not destino:
+        _rechazar('invalid_move')
+
+    campos = ('pk', 'version', 'activo', 'ruta', 'escuadra_id', 'regimiento_id')
+    filas = {m['pk']: m for m in Miembro.objects.filter(pk__in={persona, reemplazar} - {None}).values(*campos)}
+    a = filas.get(persona)
+    if a is None:
+        _rechazar('persona_not_found')
+    origen = a['escuadra_id']
+    escuadras = {
+        e['pk']: e for e in Escuadra.objects.filter(pk__in={destino, origen} - {None})
+        .values('pk', 'version', 'ruta', 'efectivos_total', 'capacidad')
+    }
+    d = escuadras.get(destino)
+    if d is None:
+        _rechazar('escuadra_not_found')
+
+    esperadas = (
+        (_id(mov.get('version')), a['version']),
+        (_id(mov.get('escuadra_destino_version')), d['version']),
+    )
+    if any(enviada is not None and enviada != leida for enviada, leida in esperadas):
+        _rechazar('stale_version')
+
+    # (miembro, escuadra destino) a escribir
+    cambios = [(a, d)]
+    ocupacion = d['efectivos_total'] - (origen == destino)
+    resultado = {'indice': 0, 'status': 'moved', 'persona_id': persona, 'origen_id': origen, 'destino_id': destino}
+    if reemplazar and ocupacion >= d['capacidad']:
+        b = filas.get(reemplazar)
+        if b is None or b['escuadra_id'] != destino or reemplazar == persona:
+            _rechazar('persona_a_reemplazar_not_in_destination')
+        enviada = _id(mov.get('persona_a_reemplazar_version'))
+        if enviada is not None and enviada != b['version']:
+            _rechazar('stale_version')
+        cambios.append((b, escuadras.get(origen)))
+        resultado = {
+            'indice': 0,
+            'status': 'swapped',
+            'moved': persona,
+            'moved_to': destino,
+            'replaced': reemplazar,
+            'replaced_moved_to': origen,
+        }
+    elif ocupacion >= d['capacidad']:
+        _rechazar('destination_full')
+
+    with transaction.atomic():
+        for pk in sorted(escuadras):
+            if not Escuadra.objects.filter(pk=pk, version=escuadras[pk]['version']).update(version=F('version') + 1):
+                _rechazar('stale_version')
+        movimientos, historial = [], []
+        for fila, escuadra in sorted(cambios, key=lambda cambio: cambio[0]['pk']):
+            # Sin escuadra (intercambio con alguien del HQ) queda sólo el regimiento
+            ruta = escuadra['ruta'] if escuadra else (f"R{fila['regimiento_id']}/" if fila['regimiento_id'] else '')
+            # Sólo la unidad efectiva, como `_asignar`
+            unidad = {'escuadra_id': escuadra['pk'], 'regimiento_id': None} if escuadra else {'escuadra_id': None}
+            actualizadas = Miembro.objects.filter(
+                pk=fila['pk'], version=fila['version'], escuadra_id=fila['escuadra_id'],
+            ).update(
+                **unidad,
+                peloton_id=None,
+                compania_id=None,
+                ruta=ruta,
+                version=F('version') + 1,
+            )
+            if not actualizadas:
+                _rechazar('stale_version')
+            movimientos += [(fila['ruta'], -fila['activo'], -1), (ruta, fila['activo'], 1)]
+            historial.append(_movimiento(fila['pk'], fila['ruta'], ruta, len(cambios) > 1, actor))
+        try:
+            # La plaza se reserva con el incremento guardado, no con un COUNT;
+            # la versión de las escuadras ya la subió el UPDATE condicionado
+            ajustar_contadores(movimientos, con_cupo=True, versionar=False)
+        except EscuadraLlena:
+            _rechazar('destination_full')
+        MovimientoPersonal.objects.bulk_create(historial)
+        transaction.on_commit(bump_orbat_version)
+
+    return resultado
+
+
+# FK de Miembro para cada nivel de unidad destino
+CAMPO_NIVEL = {'R': 'regimiento_id', 'C': 'compania_id', 'P': 'peloton_id', 'E': 'escuadra_id'}
+
+
+def reasignar(queryset, unidad, actor=None):
+    """Traslada los miembros de `queryset` a `unidad` (escuadra, o HQ de
+    regimiento, compañía o pelotón) en una transacción, sea cual sea la
+    selección:
+
+    - un UPDATE de los miembros: sólo la FK del nivel destino, `ruta` y `version`;
+    - los contadores con `ajustar_contadores`: en una escuadra la plaza se
+      reserva con el incremento guardado, si no caben todos lanza
+      `EscuadraLlena` y no se aplica nada;
+    - `MovimientoPersonal` y `LogEntry` (si hay `actor`) con `bulk_create`.
+
+    Los que ya están en `unidad` se ignoran. Devuelve cuántos se movieron.
+    """
+    destino = {campo: None for campo in CAMPO_NIVEL.values()}
+    destino[CAMPO_NIVEL[unidad.PREFIJO]] = unidad.pk
+    con_actor = actor is not None and actor.is_authenticated
+
+    with transaction.atomic():
+        seleccion = Miembro.objects.filter(pk__in=queryset.values('pk')).exclude(**destino)
+        filas = list(
+            seleccion.select_for_update().order_by('pk').values_list('pk', 'rango', 'nombre_milsim', 'ruta', 'activo')
+        )
+        if not filas:
+            return 0
+        seleccion.update(**destino, ruta=unidad.ruta, version=F('version') + 1)
+        ajustar_contadores(
+            [mov for _, _, _, ruta, activo in filas for mov in ((ruta, -activo, -1), (unidad.ruta, activo, 1))],
+            con_cupo=True,
+        )
+        MovimientoPersonal.objects.bulk_create(
+            [_movimiento(pk, ruta, unidad.ruta, False, actor) for pk, _, _, ruta, _ in filas], batch_size=500,
+        )
+        if con_actor:
+            tipo = ContentType.objects.get_for_model(Miembro)
+            mensaje = f"Reasignado a {unidad}"
+            LogEntry.objects.bulk_create([
+                LogEntry(
+                    user_id=actor.pk, content_type=tipo, object_id=str(pk), object_repr=f"[{rango}] {nick}",
+                    action_flag=CHANGE, change_message=mensaje,
+                )
+                for pk, rango, nick, _, _ in filas
+            ], batch_size=500)
+        transaction.on_commit(bump_orbat_version)
+
+    return len(filas)
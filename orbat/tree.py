@@ -0,0 +1,190 @@
+"""
+Ensamblado plano del árbol ORBAT.
+
+Se hace una sola consulta ``values()`` por tabla (5 en total, sin importar
+cuántos regimientos haya) y se enlazan padres e hijos en Python con índices
+por id. El resultado son nodos livianos (dataclasses con ``__slots__``) que
+la plantilla recorre directamente y que se pueden picklear para la caché.
+
+Cada unidad lleva un ``stamp``: un digest de su contenido y de los stamps de
+sus hijos. La plantilla lo usa como clave de caché de fragmentos, de modo que
+un cambio en una escuadra sólo invalida esa escuadra y los envoltorios de sus
+ancestros; las ramas hermanas siguen saliendo de caché. En la misma pasada se
+calculan los efectivos (activos / total) de cada subárbol.
+"""
+
+import hashlib
+from dataclasses import astuple, dataclass, field
+
+from .models import Compania, Escuadra, Miembro, Peloton, Rango, Regimiento
+
+RANGO_DISPLAY = dict(Rango.choices)
+
+
+@dataclass(slots=True)
+class MiembroNodo:
+    id: int
+    nombre_milsim: str
+    rango: str
+    rango_display: str
+    rol: str
+    fecha_ingreso: object
+    activo: bool
+
+
+@dataclass(slots=True)
+class EscuadraNodo:
+    id: int
+    nombre: str
+    indicativo_radio: str
+    miembros: list = field(default_factory=list)
+    stamp: str = ''
+    efectivos_activos: int = 0
+    efectivos_total: int = 0
+
+
+@dataclass(slots=True)
+class PelotonNodo:
+    id: int
+    nombre: str
+    hq: list = field(default_factory=list)
+    escuadras: list = field(default_factory=list)
+    stamp: str = ''
+    efectivos_activos: int = 0
+    efectivos_total: int = 0
+
+
+@dataclass(slots=True)
+class CompaniaNodo:
+    id: int
+    nombre: str
+    logo: str
+    hq: list = field(default_factory=list)
+    pelotones: list = field(default_factory=list)
+    stamp: str = ''
+    efectivos_activos: int = 0
+    efectivos_total: int = 0
+
+
+@dataclass(slots=True)
+class RegimientoNodo:
+    id: int
+    nombre: str
+    comandante: str
+    hq: list = field(default_factory=list)
+    companias: list = field(default_factory=list)
+    stamp: str = ''
+    efectivos_activos: int = 0
+    efectivos_total: int = 0
+
+
+def _stamp(*partes):
+    return hashlib.blake2b(repr(partes).encode(), digest_size=8).hexdigest()
+
+
+def _totalizar(nodo, miembros, hijos):
+    nodo.efectivos_activos = sum(m.activo for m in miembros) + sum(h.efectivos_activos for h in hijos)
+    nodo.efectivos_total = len(miembros) + sum(h.efectivos_total for h in hijos)
+
+
+def _sellar(regimientos):
+    """Calcula stamps y efectivos de abajo hacia arriba."""
+    for reg in regimientos:
+        for cia in reg.companias:
+            for plt in cia.pelotones:
+                for sqd in plt.escuadras:
+                    sqd.stamp = _stamp(sqd.id, sqd.nombre, sqd.indicativo_radio, [astuple(m) for m in sqd.miembros])
+                    _totalizar(sqd, sqd.miembros, [])
+                plt.stamp = _stamp(plt.id, plt.nombre, [astuple(m) for m in plt.hq], [e.stamp for e in plt.escuadras])
+                _totalizar(plt, plt.hq, plt.escuadras)
+            cia.stamp = _stamp(cia.id, cia.nombre, cia.logo, [astuple(m) for m in cia.hq], [p.stamp for p in cia.pelotones])
+            _totalizar(cia, cia.hq, cia.pelotones)
+        reg.stamp = _stamp(reg.id, reg.nombre, reg.comandante, [astuple(m) for m in reg.hq], [c.stamp for c in reg.companias])
+        _totalizar(reg, reg.hq, reg.companias)
+
+
+def _consultas():
+    """Las 5 consultas ``values()`` del árbol, en orden de nivel."""
+    return (
+        Regimiento.objects.order_by('id').values('id', 'nombre', 'comandante'),
+        Compania.objects.order_by('id').values('id', 'nombre', 'logo', 'regimiento_id'),
+        Peloton.objects.order_by('id').values('id', 'nombre', 'compania_id'),
+        Escuadra.objects.order_by('id').values('id', 'nombre', 'indicativo_radio', 'peloton_id'),
+        Miembro.objects.values(
+            'id', 'nombre_milsim', 'rango', 'rol', 'fecha_ingreso', 'activo',
+            'regimiento_id', 'compania_id', 'peloton_id', 'escuadra_id',
+        ),
+    )
+
+
+def _ensamblar(filas_reg, filas_cia, filas_plt, filas_sqd, filas_miembros):
+    regimientos = {row['id']: RegimientoNodo(**row) for row in filas_reg}
+    companias = {}
+    for row in filas_cia:
+        padre = regimientos.get(row.pop('regimiento_id'))
+        if padre is not None:
+            companias[row['id']] = nodo = CompaniaNodo(**row)
+            padre.companias.append(nodo)
+    pelotones = {}
+    for row in filas_plt:
+        padre = companias.get(row.pop('compania_id'))
+        if padre is not None:
+            pelotones[row['id']] = nodo = PelotonNodo(**row)
+            padre.pelotones.append(nodo)
+    escuadras = {}
+    for row in filas_sqd:
+        padre = pelotones.get(row.pop('peloton_id'))
+        if padre is not None:
+            escuadras[row['id']] = nodo = EscuadraNodo(**row)
+            padre.escuadras.append(nodo)
+
+    for row in filas_miembros:
+        nodo = MiembroNodo(
+            id=row['id'],
+            nombre_milsim=row['nombre_milsim'],
+            rango=row['rango'],
+            rango_display=RANGO_DISPLAY.get(row['rango'], row['rango']),
+            rol=row['rol'],
+            fecha_ingreso=row['fecha_ingreso'],
+            activo=row['activo'],
+        )
+        # Cada miembro aparece una sola vez, en su nivel más específico
+        if row['escuadra_id'] in escuadras:
+            escuadras[row['escuadra_id']].miembros.append(nodo)
+        elif row['peloton_id'] in pelotones:
+            pelotones[row['peloton_id']].hq.append(nodo)
+        elif row['compania_id'] in companias:
+            companias[row['compania_id']].hq.append(nodo)
+        elif row['regimiento_id'] in regimientos:
+            regimientos[row['regimiento_id']].hq.append(nodo)
+
+    arbol = list(regimientos.values())
+    _sellar(arbol)
+    return arbol
+
+
+def build_orbat_tree():
+    """Construye la lista de ``RegimientoNodo`` con toda la jerarquía."""
+    return _ensamblar(*_consultas())
+
+
+async def abuild_orbat_tree():
+    """Versión async de `build_orbat_tree` sobre el ORM async (``async for``)."""
+    return _ensamblar(*[[row async for row in consulta] for consulta in _consultas()])
+
+
+HIJOS = {
+    'regimiento': ('companias', 'compania'),
+    'compania': ('pelotones', 'peloton'),
+    'peloton': ('escuadras', 'escuadra'),
+}
+
+
+def buscar_nodo(arbol, nivel, pk):
+    """Busca la unidad (nivel, pk) en el árbol de nodos, nivel por nivel."""
+    nodos, actual = arbol, 'regimiento'
+    while True:
+        if actual == nivel:
+            return next((nodo for nodo in nodos if nodo.id == pk), None)
+        atributo, actual = HIJOS[actual]
+        nodos = [hijo for nodo in nodos for hijo in getattr(nodo, atributo)]
@@ -24,13 +24,14 @@ from django.contrib.auth.models import Group
 from django.contrib.auth.password_validation import validate_password
 from django.contrib.contenttypes.models import ContentType
 from django.core.exceptions import ValidationError
-from django.core.paginator import Paginator
 from django.db.models import Q
 from django.shortcuts import get_object_or_404, redirect, render
 from django.utils.html import escape
 from django.views.decorators.csrf import csrf_protect
 from django.views.decorators.http import require_POST, require_http_methods
 
+from .paginacion import ConteoAproximadoPaginator
+
 User = get_user_model()
 logger = logging.getLogger(__name__)
 
@@ -179,7 +180,7 @@ def user_list(request):
     else:
         status_filter = ""
 
-    paginator = Paginator(users.distinct(), 25)
+    paginator = ConteoAproximadoPaginator(users.distinct(), 25)
     page_obj = paginator.get_page(request.GET.get("page", 1))
 
     context = {
@@ -1,61 +1,174 @@
+from django.conf import settings
 from django.shortcuts import render
-from django.http import JsonResponse
-from django.views.decorators.http import require_POST
+from django.http import Http404, HttpResponseBadRequest, JsonResponse
+from django.contrib.admin.views.decorators import staff_member_required
+from django.views.decorators.http import condition, require_GET, require_POST
 from django.views.decorators.csrf import csrf_exempt
-from django.db import transaction, IntegrityError, DatabaseError
+from django.db import IntegrityError, DatabaseError
+from functools import wraps
 import json
 
-from .models import Regimiento, Miembro, Escuadra
+from .api_views import JSON_COMPACTO, SERIALIZADORES, _incluir_inactivos
+from .cache import get_cache_stats, get_orbat_tree, get_orbat_version
+from .idempotency import idempotente
+from .models import Miembro, Escuadra
+from .transfers import LoteRechazado, transferir_lote, transferir_optimista, versiones_actuales
+from .tree import buscar_nodo
+
+MAX_MOVIMIENTOS_LOTE = 200
+
+
+def _permiso_api(permiso):
+    """Exige usuario autenticado con `permiso`; responde JSON 401/403.
+    Va por fuera de `idempotente` para no guardar el rechazo bajo la clave."""
+
+    def decorador(view):
+        @wraps(view)
+        def vista(request, *args, **kwargs):
+            if not request.user.is_authenticated:
+                return JsonResponse({'error': 'authentication_required'}, status=401)
+            if not request.user.has_perm(permiso):
+                return JsonResponse({'error': 'permission_denied'}, status=403)
+            return view(request, *args, **kwargs)
+        return vista
+    return decorador
+
+
+def _modo_colapsado(request):
+    modo = request.GET.get('modo')
+    if modo in ('colapsado', 'completo'):
+        return modo == 'colapsado'
+    return settings.ORBAT_COLLAPSED_DEFAULT
 
 
 def orbat_visual(request):
-    """Renderiza el ORBAT con relaciones prefeteadas para reducir consultas.
-    Acceso público — no requiere autenticación."""
+    """Renderiza el ORBAT desde la caché versionada (ver cache.py).
+    Acceso público — no requiere autenticación.
 
-    regimientos = Regimiento.objects.prefetch_related(
-        'miembro_set',
-        'companias__miembro_set',
-        'companias__pelotones__miembro_set',
-        'companias__pelotones__escuadras__miembro_set'
-    ).all()
+    Con ``?modo=colapsado`` (o ORBAT_COLLAPSED_DEFAULT) la página sólo lleva
+    regimientos y compañías con sus efectivos; pelotones y escuadras se piden
+    a `orbat_subarbol` al desplegar."""
 
     return render(request, 'orbat/visual_chart.html', {
-        'regimientos': regimientos,
+        'regimientos': get_orbat_tree(),
+        'fragment_timeout': settings.ORBAT_FRAGMENT_TIMEOUT,
+        'colapsado': _modo_colapsado(request),
         'user': request.user
     })
 
 
-def escuadras_dashboard(request):
-    """Vista que muestra el tablero de escuadras y sus miembros."""
-    escuadras = Escuadra.objects.select_related('peloton__compania').prefetch_related('miembro_set').all()
-    # Preparar datos simples para la plantilla
-    data = []
-    for e in escuadras:
-        miembros = list(e.miembro_set.filter(activo=True).values('id', 'nombre_milsim', 'rango'))
-        data.append({
-            'id': e.id,
-            'nombre': str(e),
-            'miembros': miembros,
+NIVELES_SUBARBOL = ('compania', 'peloton')
+
+
+def _subarbol_etag(request, nivel, pk):
+    formato = 'json' if request.GET.get('format') == 'json' else 'html'
+    inactivos = 'all' if _incluir_inactivos(request) else 'act'
+    return f"subarbol-{get_orbat_version()}-{nivel}{pk}-{formato}-{inactivos}"
+
+
+@require_GET
+@condition(etag_func=_subarbol_etag)
+def orbat_subarbol(request, nivel, pk):
+    """Hijos de una compañía o pelotón para el ORBAT colapsado.
+
+    Devuelve el fragmento HTML (pelotones colapsados / escuadras) o, con
+    ``?format=json``, el subárbol serializado como en la API.
+    """
+    if nivel not in NIVELES_SUBARBOL:
+        raise Http404
+    nodo = buscar_nodo(get_orbat_tree(), nivel, pk)
+    if nodo is None:
+        raise Http404
+
+    if request.GET.get('format') == 'json':
+        data = {nivel: SERIALIZADORES[nivel](nodo, _incluir_inactivos(request))}
+        response = JsonResponse(data, json_dumps_params=JSON_COMPACTO)
+    else:
+        response = render(request, 'orbat/includes/subarbol.html', {
+            'nivel': nivel,
+            'nodo': nodo,
+            'colapsado': True,
+            'fragment_timeout': settings.ORBAT_FRAGMENT_TIMEOUT,
         })
+    response['Cache-Control'] = 'no-cache'
+    return response
+
+
+@staff_member_required
+def orbat_cache_status(request):
+    """Estado de la caché del ORBAT (versión y ratio de aciertos) para staff."""
+    return JsonResponse(get_cache_stats())
+
+
+def _consultas_tablero(params):
+    """Las dos consultas ``values()`` del tablero (escuadras, miembros activos).
+    Lanza ValueError si un filtro no es numérico."""
+    escuadras = Escuadra.objects.order_by('id')
+    if 'compania' in params:
+        escuadras = escuadras.filter(peloton__compania_id=int(params['compania']))
+    if 'peloton' in params:
+        escuadras = escuadras.filter(peloton_id=int(params['peloton']))
+    miembros = Miembro.objects.filter(activo=True, escuadra_id__in=escuadras.values('id'))
+    return (
+        escuadras.values('id', 'etiqueta', 'version'),
+        miembros.values('id', 'nombre_milsim', 'rango', 'version', 'escuadra_id'),
+    )
+
+
+def _agrupar_tablero(filas_escuadras, filas_miembros):
+    data = {}
+    for e in filas_escuadras:
+        data[e['id']] = {
+            'id': e['id'],
+            'version': e['version'],
+            # Etiqueta guardada: mismo texto que Escuadra.__str__, sin joins
+            'nombre': e['etiqueta'],
+            'miembros': [],
+        }
+    for m in filas_miembros:
+        data[m.pop('escuadra_id')]['miembros'].append(m)
+    return list(data.values())
+
+
+def escuadras_dashboard(request):
+    """Vista que muestra el tablero de escuadras y sus miembros.
+
+    Filtros opcionales: ``?compania=<id>`` o ``?peloton=<id>``. Se resuelve en
+    dos consultas fijas (escuadras + miembros activos) sin importar cuántas
+    escuadras haya; los miembros se agrupan por escuadra en Python.
+    """
+    try:
+        escuadras, miembros = _consultas_tablero(request.GET)
+    except ValueError:
+        return HttpResponseBadRequest('invalid_unit_filter')
 
     return render(request, 'orbat/board.html', {
-        'escuadras': data,
+        'escuadras': _agrupar_tablero(escuadras, miembros),
     })
 
 
 @csrf_exempt
 @require_POST
+@idempotente
 def transferir_personal(request):
     """API endpoint para transferir un miembro entre escuadras.
 
     Espera JSON con: { persona_id, escuadra_destino_id, persona_a_reemplazar_id? }
 
     Reglas:
-    - Si la escuadra destino tiene < 5 miembros, mueve al miembro directamente.
-    - Si tiene 5 y no se envía `persona_a_reemplazar_id`, devuelve 409 con la lista de miembros.
+    - Si la escuadra destino tiene plazas libres (`Escuadra.capacidad`), mueve al miembro directamente.
+    - Si está llena y no se envía `persona_a_reemplazar_id`, devuelve 409 con la lista de miembros.
     - Si se envía `persona_a_reemplazar_id`, realiza un intercambio: A->destino, B->origen_de_A.
 
-    Nota: se usa `transaction.atomic()` y `select_for_update()` para evitar condiciones de carrera.
+    Claves opcionales `version`, `escuadra_destino_version` y
+    `persona_a_reemplazar_version`: las que leyó el tablero. Si no coinciden
+    con las actuales responde 409 `stale_version`. La respuesta trae las
+    versiones nuevas en `versiones`.
+
+    Acepta la cabecera ``Idempotency-Key`` (ver idempotency.py).
+
+    Nota: con ORBAT_TRANSFER_MODE='optimista' (por defecto) no se toman
+    candados; con 'bloqueo' es un lote de un movimiento (ver transfers.py).
     """
 
     try:
@@ -65,68 +178,65 @@ def transferir_personal(request):
 
     persona_id = payload.get('persona_id')
     destino_id = payload.get('escuadra_destino_id')
-    reemplazar_id = payload.get('persona_a_reemplazar_id')
 
     if not persona_id or not destino_id:
         return JsonResponse({'error': 'persona_id and escuadra_destino_id required'}, status=400)
 
     try:
-        with transaction.atomic():
-            miembro = Miembro.objects.select_for_update().select_related('escuadra').get(pk=persona_id)
-            destino = Escuadra.objects.select_for_update().select_related('peloton__compania').get(pk=destino_id)
-
-            origen_escuadra = miembro.escuadra
-
-            miembros_destino_qs = Miembro.objects.select_for_update().filter(escuadra=destino)
-            count_destino = miembros_destino_qs.count()
-
-            # Caso 1: destino con espacio
-            if count_destino < 5:
-                miembro.escuadra = destino
-                # Mantener coherencia jerárquica
-                miembro.peloton = destino.peloton
-                miembro.compania = destino.peloton.compania if destino.peloton else None
-                miembro.save(update_fields=['escuadra', 'peloton', 'compania'])
-                return JsonResponse({'status': 'moved', 'persona_id': miembro.id, 'destino_id': destino.id})
-
-            # Caso 2: destino lleno
-            if not reemplazar_id:
-                miembros_list = list(miembros_destino_qs.values('id', 'nombre_milsim', 'rango'))
-                return JsonResponse({'error': 'destination_full', 'miembros': miembros_list}, status=409)
-
-            # Caso 3: intercambio solicitado
-            try:
-                reemplazar = miembros_destino_qs.get(pk=reemplazar_id)
-            except Miembro.DoesNotExist:
-                return JsonResponse({'error': 'persona_a_reemplazar_not_in_destination'}, status=400)
-
-            # Mover A -> destino
-            miembro.escuadra = destino
-            miembro.peloton = destino.peloton
-            miembro.compania = destino.peloton.compania if destino.peloton else None
-            miembro.save(update_fields=['escuadra', 'peloton', 'compania'])
-
-            # Mover B (reemplazar) -> origen de A (puede ser None)
-            reemplazar.escuadra = origen_escuadra
-            if origen_escuadra:
-                reemplazar.peloton = origen_escuadra.peloton
-                reemplazar.compania = origen_escuadra.peloton.compania if origen_escuadra.peloton else None
-            else:
-                reemplazar.peloton = None
-                reemplazar.compania = None
-            reemplazar.save(update_fields=['escuadra', 'peloton', 'compania'])
-
-            return JsonResponse({
-                'status': 'swapped',
-                'moved': miembro.id,
-                'moved_to': destino.id,
-                'replaced': reemplazar.id,
-                'replaced_moved_to': origen_escuadra.id if origen_escuadra else None,
-            })
-
-    except Miembro.DoesNotExist:
-        return JsonResponse({'error': 'persona_not_found'}, status=404)
-    except Escuadra.DoesNotExist:
-        return JsonResponse({'error': 'escuadra_not_found'}, status=404)
+        if settings.ORBAT_TRANSFER_MODE == 'bloqueo':
+            resultado, = transferir_lote([payload], actor=request.user)
+        else:
+            resultado = transferir_optimista(payload, actor=request.user)
+    except LoteRechazado as exc:
+        error = exc.resultados[0]['error']
+        if error == 'destination_full':
+            miembros_list = list(Miembro.objects.filter(escuadra_id=destino_id).values('id', 'nombre_milsim', 'rango'))
+            return JsonResponse({'error': error, 'miembros': miembros_list}, status=409)
+        return JsonResponse({'error': error}, status=exc.status)
     except (IntegrityError, DatabaseError) as exc:
-        return JsonResponse({'error': 'db_error', 'details': str(exc)}, status=500)
\ No newline at end of file
+        return JsonResponse({'error': 'db_error', 'details': str(exc)}, status=500)
+
+    del resultado['indice']
+    resultado['versiones'] = versiones_actuales(
+        [pk for pk in (resultado.get('persona_id'), resultado.get('moved'), resultado.get('replaced')) if pk],
+        [pk for pk in (resultado.get('origen_id'), resultado.get('destino_id'), resultado.get('moved_to'), resultado.get('replaced_moved_to')) if pk],
+    )
+    return JsonResponse(resultado)
+
+
+@require_POST
+@_permiso_api('orbat.change_miembro')
+@idempotente
+def transferir_personal_lote(request):
+    """Aplica varios traslados e intercambios en una sola transacción.
+
+    Requiere sesión con el permiso ``orbat.change_miembro`` y token CSRF;
+    el usuario queda como actor de los movimientos.
+
+    Espera JSON con: { movimientos: [{ persona_id, escuadra_destino_id, persona_a_reemplazar_id? }, ...] }
+
+    Todo o nada: si algún movimiento falla (o alguna escuadra termina por
+    encima de su capacidad) no se aplica ninguno. La respuesta trae un
+    resultado por movimiento, en el mismo orden. Ver transfers.py.
+    Acepta la cabecera ``Idempotency-Key`` (ver idempotency.py).
+    """
+
+    try:
+        payload = json.loads(request.body.decode('utf-8') or '{}')
+    except json.JSONDecodeError:
+        return JsonResponse({'error': 'invalid_json'}, status=400)
+
+    movimientos = payload.get('movimientos') if isinstance(payload, dict) else None
+    if not isinstance(movimientos, list) or not movimientos:
+        return JsonResponse({'error': 'movimientos required'}, status=400)
+    if len(movimientos) > MAX_MOVIMIENTOS_LOTE:
+        return JsonResponse({'error': 'too_many_moves', 'max': MAX_MOVIMIENTOS_LOTE}, status=400)
+
+    try:
+        resultados = transferir_lote(movimientos, actor=request.user)
+    except LoteRechazado as exc:
+        return JsonResponse({'error': 'batch_rejected', 'resultados': exc.resultados}, status=exc.status)
+    except (IntegrityError, DatabaseError) as exc:
+        return JsonResponse({'error': 'db_error', 'details': str(exc)}, status=500)
+
+    return JsonResponse({'status': 'ok', 'resultados': resultados})
@@ -3,6 +3,47 @@
   const board = document.getElementById('board');
   let dragged = null;
 
+  // Versiones leídas al renderizar; el servidor responde 409 stale_version si cambiaron
+  function versionDe(selector){
+    const el = document.querySelector(selector);
+    return el && el.dataset.version !== undefined ? Number(el.dataset.version) : undefined;
+  }
+  function aplicarVersiones(versiones){
+    if(!versiones) return;
+    Object.entries(versiones.miembros || {}).forEach(([id, v])=>{
+      const el = document.querySelector(`.card[data-persona-id="${id}"]`);
+      if(el) el.dataset.version = v;
+    });
+    Object.entries(versiones.escuadras || {}).forEach(([id, v])=>{
+      const el = document.querySelector(`.cards[data-escuadra-id="${id}"]`);
+      if(el) el.dataset.version = v;
+    });
+  }
+  // Cada traslado lleva su Idempotency-Key: los reintentos por red inestable
+  // reciben la respuesta original en vez de aplicar el movimiento otra vez
+  function nuevaClave(){
+    return (window.crypto && crypto.randomUUID) ? crypto.randomUUID() : Date.now()+'-'+Math.random().toString(16).slice(2);
+  }
+  async function postTraslado(body, intentos = 3){
+    const clave = nuevaClave();
+    for(let i = 1; ; i++){
+      try{
+        return await fetch('/api/transferir_personal/',{
+          method:'POST',
+          headers:{'Content-Type':'application/json','Idempotency-Key':clave},
+          body: JSON.stringify(body)
+        });
+      }catch(err){
+        if(i >= intentos) throw err;
+        await new Promise(r=>setTimeout(r, 300 * i));
+      }
+    }
+  }
+  function tableroDesfasado(){
+    alert('El tablero cambió mientras tanto. Se recargará con los datos actuales.');
+    window.location.reload();
+  }
+
   document.addEventListener('dragstart', (e)=>{
     const card = e.target.closest('.card');
     if(!card) return;
@@ -32,21 +73,24 @@
 
       // Call backend
       try{
-        const resp = await fetch('/api/transferir_personal/',{
-          method:'POST',
-          headers:{'Content-Type':'application/json'},
-          body: JSON.stringify({persona_id: Number(personaId), escuadra_destino_id: Number(destinoId)})
+        const resp = await postTraslado({
+          persona_id: Number(personaId),
+          escuadra_destino_id: Number(destinoId),
+          version: versionDe(`.card[data-persona-id="${personaId}"]`),
+          escuadra_destino_version: versionDe(`.cards[data-escuadra-id="${destinoId}"]`)
         });
 
         if(resp.status === 200){
           // Move DOM node
           const card = document.querySelector(`.card[data-persona-id="${personaId}"]`);
           if(card) col.appendChild(card);
+          aplicarVersiones((await resp.json().catch(()=>({}))).versiones);
           return;
         }
 
         if(resp.status === 409){
           const data = await resp.json();
+          if(data.error === 'stale_version') return tableroDesfasado();
           openConflictModal(destinoId, personaId, data.miembros || []);
           return;
         }
@@ -94,10 +138,13 @@
   async function confirmSwap(reemplazarId){
     if(!currentPersona || !currentDestino) return;
     try{
-      const resp = await fetch('/api/transferir_personal/',{
-        method:'POST',
-        headers:{'Content-Type':'application/json'},
-        body: JSON.stringify({persona_id: Number(currentPersona), escuadra_destino_id: Number(currentDestino), persona_a_reemplazar_id: Number(reemplazarId)})
+      const resp = await postTraslado({
+        persona_id: Number(currentPersona),
+        escuadra_destino_id: Number(currentDestino),
+        persona_a_reemplazar_id: Number(reemplazarId),
+        version: versionDe(`.card[data-persona-id="${currentPersona}"]`),
+        escuadra_destino_version: versionDe(`.cards[data-escuadra-id="${currentDestino}"]`),
+        persona_a_reemplazar_version: versionDe(`.card[data-persona-id="${reemplazarId}"]`)
       });
 
       if(resp.status === 200){
@@ -122,11 +169,13 @@
           }
         }
 
+        aplicarVersiones(payload.versiones);
         closeModal();
         return;
       }
 
       const j = await resp.json().catch(()=>({}));
+      if(j.error === 'stale_version') return tableroDesfasado();
       alert('Error al intercambiar: '+(j.error||resp.status));
     }catch(err){
       console.error(err);